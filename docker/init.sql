@@ -3,24 +3,151 @@
 
 -- Create pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Create memories table with vector storage
+-- Range-partitioned by month on time_window; partitions are named memories_pYYYYMM
 CREATE TABLE IF NOT EXISTS memories (
-    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
     session_id VARCHAR(255),
     user_input TEXT NOT NULL,
     assistant_response TEXT NOT NULL,
-    embedding vector(4096),  -- Store 4096-dimensional vectors
     metadata JSONB DEFAULT '{}',
+    content_hash TEXT,       -- sha256(user_input || assistant_response), dedup key
+    time_window TEXT NOT NULL DEFAULT to_char(CURRENT_TIMESTAMP AT TIME ZONE 'UTC', 'YYYYMMDDHH24'),  -- UTC hour bucket YYYYMMDDHH, dedup + partition key
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
-);
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (id, time_window)
+) PARTITION BY RANGE (time_window);
+
+-- Create monthly partitions from from_date through the current month + months_ahead
+-- (no DEFAULT partition, so old months can be detached CONCURRENTLY for archival)
+CREATE OR REPLACE FUNCTION sage_ensure_memory_partitions(
+    from_date date DEFAULT (now() AT TIME ZONE 'UTC')::date,
+    months_ahead integer DEFAULT 2
+)
+RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', from_date)::date;
+    last_month date := (date_trunc('month', (now() AT TIME ZONE 'UTC')::date)
+                        + make_interval(months => months_ahead))::date;
+    partition_name text;
+    created integer := 0;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('memories') AND relkind = 'p') THEN
+        RETURN 0;
+    END IF;
+
+    WHILE month_start <= last_month LOOP
+        partition_name := 'memories_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF memories FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    to_char(month_start, 'YYYYMM'),
+                    to_char(month_start + interval '1 month', 'YYYYMM')
+                );
+                created := created + 1;
+            EXCEPTION WHEN duplicate_table THEN
+                NULL;
+            END;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+SELECT sage_ensure_memory_partitions();
 
 -- Create indexes for better performance
+CREATE UNIQUE INDEX IF NOT EXISTS idx_memories_dedup ON memories(session_id, content_hash, time_window);
 CREATE INDEX IF NOT EXISTS idx_memories_session_id ON memories(session_id);
 CREATE INDEX IF NOT EXISTS idx_memories_created_at ON memories(created_at DESC);
+
+-- Full-text search column for search_by_text / search_hybrid, maintained by trigger.
+-- CJK characters are split into single characters since the built-in parser does not segment Chinese.
+CREATE OR REPLACE FUNCTION sage_cjk_segment(input text)
+RETURNS text AS $$
+    SELECT regexp_replace(
+        input,
+        '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])',
+        ' \1 ',
+        'g'
+    )
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+CREATE OR REPLACE FUNCTION sage_search_vector(user_input text, assistant_response text)
+RETURNS tsvector AS $$
+    SELECT to_tsvector(
+        'simple'::regconfig,
+        sage_cjk_segment(left(COALESCE(user_input, ''), 200000) || ' ' || left(COALESCE(assistant_response, ''), 200000))
+    )
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION sage_derive_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := sage_search_vector(NEW.user_input, NEW.assistant_response);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_memories_search_vector
+    BEFORE INSERT OR UPDATE OF user_input, assistant_response ON memories
+    FOR EACH ROW EXECUTE FUNCTION sage_derive_search_vector();
+
+CREATE INDEX IF NOT EXISTS idx_memories_search_vector ON memories USING gin (search_vector);
+CREATE INDEX IF NOT EXISTS idx_memories_user_input_trgm ON memories USING gin (user_input gin_trgm_ops);
+CREATE INDEX IF NOT EXISTS idx_memories_assistant_response_trgm ON memories USING gin (assistant_response gin_trgm_ops);
 -- Note: For 4096 dimensions, we skip the vector index as ivfflat has a 2000 dimension limit
 -- HNSW index would work but requires more setup. Sequential scan will be used for now.
+-- Indexes created on the partitioned parent are created on every partition automatically.
+
+-- Create embeddings table, split from memories so non-vector queries never read vector pages
+-- One row per (memory, embedding model); several models can coexist during a model migration
+CREATE TABLE IF NOT EXISTS memory_embeddings (
+    memory_id UUID NOT NULL,
+    time_window TEXT NOT NULL,  -- copy of memories.time_window, joins straight to the partition key
+    model TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,  -- embedding version within the model, bumped by a re-embedding run
+    source TEXT NOT NULL DEFAULT 'api',  -- 'fallback' rows were hash-embedded during an API outage and get re-embedded
+    embedding vector NOT NULL,  -- no fixed dimension, so models of different sizes can coexist
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (memory_id, model)
+);
+
+CREATE INDEX IF NOT EXISTS idx_memory_embeddings_fallback
+ON memory_embeddings (model) WHERE source = 'fallback';
+
+-- Embedding generations: one row per model, 'building' until scripts/reembed_memories.py completes
+CREATE TABLE IF NOT EXISTS embedding_generations (
+    model TEXT PRIMARY KEY,
+    dimension INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'building' CHECK (status IN ('building', 'ready', 'retired')),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    ready_at TIMESTAMP WITH TIME ZONE
+);
+
+-- Remove embeddings of deleted memories (one set-based delete per statement)
+CREATE OR REPLACE FUNCTION sage_embeddings_on_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM memory_embeddings e
+    USING deleted_rows d
+    WHERE e.memory_id = d.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_memories_embeddings_delete AFTER DELETE ON memories
+    REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sage_embeddings_on_delete();
 
 -- Create sessions table
 CREATE TABLE IF NOT EXISTS sessions (
@@ -29,11 +156,61 @@ CREATE TABLE IF NOT EXISTS sessions (
     metadata JSONB DEFAULT '{}',
     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
     updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-    last_active TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    last_active TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    memory_count BIGINT NOT NULL DEFAULT 0,     -- maintained by trg_memories_sessions_*
+    first_memory_at TIMESTAMP WITH TIME ZONE,
+    last_memory_at TIMESTAMP WITH TIME ZONE
 );
 
 -- Create index for sessions
 CREATE INDEX IF NOT EXISTS idx_sessions_last_active ON sessions(last_active DESC);
+CREATE INDEX IF NOT EXISTS idx_sessions_last_memory_at ON sessions(last_memory_at DESC) WHERE memory_count > 0;
+CREATE INDEX IF NOT EXISTS idx_memories_session_created ON memories(session_id, created_at);
+
+-- Keep per-session memory counts and first/last timestamps in sync with memories
+-- (statement-level triggers aggregate the transition table once per INSERT/DELETE statement)
+CREATE OR REPLACE FUNCTION sage_sessions_on_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sessions AS s (id, memory_count, first_memory_at, last_memory_at, last_active)
+    SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at), MAX(created_at)
+    FROM inserted_rows
+    WHERE session_id IS NOT NULL
+    GROUP BY session_id
+    ON CONFLICT (id) DO UPDATE SET
+        memory_count = s.memory_count + EXCLUDED.memory_count,
+        first_memory_at = LEAST(s.first_memory_at, EXCLUDED.first_memory_at),
+        last_memory_at = GREATEST(s.last_memory_at, EXCLUDED.last_memory_at),
+        last_active = GREATEST(s.last_active, EXCLUDED.last_active);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sage_sessions_on_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE sessions s SET
+        memory_count = GREATEST(s.memory_count - d.removed, 0),
+        first_memory_at = (SELECT MIN(m.created_at) FROM memories m WHERE m.session_id = s.id),
+        last_memory_at = (SELECT MAX(m.created_at) FROM memories m WHERE m.session_id = s.id)
+    FROM (
+        SELECT session_id, COUNT(*) AS removed
+        FROM deleted_rows
+        WHERE session_id IS NOT NULL
+        GROUP BY session_id
+    ) d
+    WHERE s.id = d.session_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER trg_memories_sessions_insert AFTER INSERT ON memories
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sage_sessions_on_insert();
+
+CREATE TRIGGER trg_memories_sessions_delete AFTER DELETE ON memories
+    REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sage_sessions_on_delete();
 
 -- Create function to update timestamps
 CREATE OR REPLACE FUNCTION update_updated_at_column()
@@ -7,10 +7,10 @@ from typing import List, Dict, Any, Optional
 from datetime import datetime, timedelta
 from collections import Counter, defaultdict
 import re
-import json
 import logging
 
 from ..interfaces import AnalysisResult
+from ..memory.storage import record_to_memory
 
 logger = logging.getLogger(__name__)
 
@@ -399,15 +399,4 @@ class MemoryAnalyzer:
         
         results = await self.memory_manager.storage.db.fetch(query, limit)
         
-        memories = []
-        for row in results:
-            memories.append({
-                'id': str(row['id']),
-                'session_id': row['session_id'],
-                'user_input': row['user_input'],
-                'assistant_response': row['assistant_response'],
-                'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                'created_at': row['created_at'].isoformat()
-            })
-        
-        return memories
\ No newline at end of file
+        return [record_to_memory(row) for row in results]
\ No newline at end of file
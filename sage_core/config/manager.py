@@ -72,8 +72,24 @@ class ConfigManager:
                 "password": os.getenv("DB_PASSWORD", "sage123")
             },
             "embedding": {
+                "backend": os.getenv("EMBEDDING_BACKEND", "siliconflow"),  # siliconflow / local
                 "model": os.getenv("EMBEDDING_MODEL", "Qwen/Qwen3-Embedding-8B"),
-                "dimension": 4096,
+                "dimension": int(os.getenv("EMBEDDING_DIMENSION", "4096")),
+                "version": int(os.getenv("EMBEDDING_VERSION", "1")),  # 同一模型重新向量化时递增
+                "batch_size": int(os.getenv("EMBEDDING_BATCH_SIZE", "32")),  # 单次请求的最大文本条数
+                "max_batch_tokens": int(os.getenv("EMBEDDING_MAX_BATCH_TOKENS", "32768")),
+                "max_concurrency": int(os.getenv("EMBEDDING_MAX_CONCURRENCY", "4")),
+                "batch_window_ms": float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", "5")),  # 微批合并窗口
+                "reembed_interval": float(os.getenv("SAGE_REEMBED_FALLBACK_INTERVAL", "300")),  # 秒，0 为关闭
+                "cache_enabled": os.getenv("SAGE_EMBEDDING_CACHE", "true").lower() == "true",
+                "cache_path": os.getenv("SAGE_EMBEDDING_CACHE_PATH", ""),  # 默认 ~/.sage/embedding_cache.db
+                "cache_max_entries": int(os.getenv("SAGE_EMBEDDING_CACHE_MAX_ENTRIES", "20000")),
+                "cache_memory_entries": int(os.getenv("SAGE_EMBEDDING_CACHE_MEMORY_ENTRIES", "256")),
+                "local_model_path": os.getenv("EMBEDDING_LOCAL_MODEL_PATH", ""),  # 含 model.onnx 与 tokenizer.json
+                "local_model": os.getenv("EMBEDDING_LOCAL_MODEL", ""),  # 代际标识，默认 local/<目录名>
+                "local_pooling": os.getenv("EMBEDDING_LOCAL_POOLING", "cls"),
+                "local_max_length": int(os.getenv("EMBEDDING_LOCAL_MAX_LENGTH", "512")),
+                "local_threads": int(os.getenv("EMBEDDING_LOCAL_THREADS", "0")),
                 "device": "cuda" if os.getenv("USE_CUDA", "false").lower() == "true" else "cpu"
             },
             "memory": {
@@ -90,9 +106,35 @@ class ConfigManager:
                 "enable": bool(os.getenv("SAGE_ENABLE_SUMMARY", "true").lower() == "true"),
                 "fallback_on_error": True
             },
+            "reranker": {
+                "backend": os.getenv("SAGE_RERANKER_BACKEND", "siliconflow"),  # siliconflow / local / embedding
+                "fallback": [name.strip() for name in os.getenv("SAGE_RERANKER_FALLBACK", "embedding").split(",")
+                             if name.strip()],  # 主后端失败时依次尝试
+                "model": os.getenv("SAGE_RERANKER_MODEL", "Qwen/Qwen3-Reranker-8B"),
+                "local_model_path": os.getenv("SAGE_RERANKER_LOCAL_MODEL_PATH", ""),  # 含 model.onnx 与 tokenizer.json
+                "local_model": os.getenv("SAGE_RERANKER_LOCAL_MODEL", ""),  # 缓存标识，默认 local/<目录名>
+                "local_max_length": int(os.getenv("SAGE_RERANKER_LOCAL_MAX_LENGTH", "512")),
+                "local_batch_size": int(os.getenv("SAGE_RERANKER_LOCAL_BATCH_SIZE", "16")),
+                "local_threads": int(os.getenv("SAGE_RERANKER_LOCAL_THREADS", "0")),
+                "local_timeout_ms": float(os.getenv("SAGE_RERANKER_LOCAL_TIMEOUT_MS", "2000")),  # 单次打分的延迟上限
+                "embedding_timeout_ms": float(os.getenv("SAGE_RERANKER_EMBEDDING_TIMEOUT_MS", "1000")),  # 超时改用哈希向量
+                "cache_max_entries": int(os.getenv("SAGE_RERANKER_CACHE_MAX_ENTRIES", "5000")),
+                "cache_ttl_minutes": float(os.getenv("SAGE_RERANKER_CACHE_TTL_MINUTES", "30")),
+                "disk_cache": os.getenv("SAGE_RERANKER_DISK_CACHE", "true").lower() == "true",
+                "cache_path": os.getenv("SAGE_RERANKER_CACHE_PATH", "")  # 默认 ~/.sage/reranker_cache.db
+            },
             "memory_fusion": {
                 "max_results": int(os.getenv("SAGE_MAX_RESULTS", "100"))
             },
+            "vector_search": {
+                "mode": os.getenv("SAGE_VECTOR_SEARCH_MODE", "exact"),  # exact / ann / binary
+                "ann_candidates": int(os.getenv("SAGE_ANN_CANDIDATES", "200")),
+                "hnsw_ef_search": int(os.getenv("SAGE_HNSW_EF_SEARCH", "200")),
+                "binary_rescore_factor": int(os.getenv("SAGE_BINARY_RESCORE_FACTOR", "10")),
+                "hybrid_candidates": int(os.getenv("SAGE_HYBRID_CANDIDATES", "50")),  # 混合检索每路候选数
+                "rrf_k": int(os.getenv("SAGE_RRF_K", "60")),
+                "snippet_chars": int(os.getenv("SAGE_SNIPPET_CHARS", "300"))  # 精简投影的正文片段长度
+            },
             "server": {
                 "host": "0.0.0.0",
                 "port": 17800,
@@ -167,6 +209,14 @@ class ConfigManager:
         """获取AI压缩配置"""
         return self.get('ai_compression', {})
     
+    def get_reranker_config(self) -> Dict[str, Any]:
+        """获取重排配置"""
+        return self.get('reranker', {})
+    
     def get_memory_fusion_config(self) -> Dict[str, Any]:
         """获取记忆融合配置"""
-        return self.get('memory_fusion', {})
\ No newline at end of file
+        return self.get('memory_fusion', {})
+    
+    def get_vector_search_config(self) -> Dict[str, Any]:
+        """获取向量检索配置"""
+        return self.get('vector_search', {})
\ No newline at end of file
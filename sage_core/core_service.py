@@ -3,8 +3,9 @@
 """
 Sage Core Service Implementation - 核心服务实现
 """
+import asyncio
 import logging
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any
 from datetime import datetime
 
 from .interfaces import (
@@ -18,8 +19,19 @@ from .config import ConfigManager
 from .database import DatabaseConnection
 from .database.transaction import TransactionManager
 from .memory import MemoryManager, TextVectorizer
+from .memory.embedding_backends import create_embedding_backend
+from .memory.embedding_cache import create_embedding_cache
+from .memory.rerank_backends import create_rerank_backends
+from .memory.reranker import TextReranker, create_reranker_cache
 from .analysis import MemoryAnalyzer
 from .session import SessionManager
+from .utils.http import close_http_client
+from .utils.rate_limit import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    get_rate_limit_status,
+    request_priority
+)
 
 logger = logging.getLogger(__name__)
 
@@ -35,6 +47,8 @@ class SageCore(ISageService):
         self.memory_manager: Optional[MemoryManager] = None
         self.session_manager: Optional[SessionManager] = None
         self.analyzer: Optional[MemoryAnalyzer] = None
+        self.reranker: Optional[TextReranker] = None
+        self._reembed_task: Optional[asyncio.Task] = None
         self._initialized = False
     
     async def initialize(self, config: Dict[str, Any]) -> None:
@@ -69,11 +83,23 @@ class SageCore(ISageService):
             embedding_config = self.config_manager.get_embedding_config()
             vectorizer = TextVectorizer(
                 model_name=embedding_config.get('model', 'Qwen/Qwen3-Embedding-8B'),
-                device=embedding_config.get('device', 'cpu')
+                device=embedding_config.get('device', 'cpu'),
+                dimension=embedding_config.get('dimension', 4096),
+                version=embedding_config.get('version', 1),
+                batch_size=embedding_config.get('batch_size', 32),
+                max_batch_tokens=embedding_config.get('max_batch_tokens', 32768),
+                batch_window_ms=embedding_config.get('batch_window_ms', 5),
+                cache=create_embedding_cache(embedding_config),
+                backend=create_embedding_backend(embedding_config)
             )
             
-            # 初始化记忆管理器 - 传入事务管理器
-            self.memory_manager = MemoryManager(self.db_connection, vectorizer, self.transaction_manager)
+            # 初始化记忆管理器 - 传入事务管理器和向量检索配置
+            self.memory_manager = MemoryManager(
+                self.db_connection,
+                vectorizer,
+                self.transaction_manager,
+                self.config_manager.get_vector_search_config()
+            )
             await self.memory_manager.initialize()
             
             # 初始化会话管理器
@@ -82,6 +108,17 @@ class SageCore(ISageService):
             # 初始化分析器
             self.analyzer = MemoryAnalyzer(self.memory_manager)
             
+            # API 故障期间写入的降级向量，恢复后在后台重新向量化
+            reembed_interval = embedding_config.get('reembed_interval', 300)
+            if reembed_interval > 0:
+                self._reembed_task = asyncio.create_task(self._reembed_fallback_loop(reembed_interval))
+
+            # 提前创建重排器：本地交叉编码器在后台加载模型，不占用首次查询的延迟上限
+            try:
+                self._get_reranker()
+            except Exception as e:
+                logger.warning(f"重排器创建失败，首次使用时重试：{e}")
+
             self._initialized = True
             logger.info("Sage Core 服务初始化完成")
             
@@ -89,10 +126,28 @@ class SageCore(ISageService):
             logger.error(f"初始化服务失败：{e}")
             raise
     
+    async def _reembed_fallback_loop(self, interval: float) -> None:
+        """定期重新向量化降级向量"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                with request_priority(PRIORITY_BACKGROUND):
+                    await self.memory_manager.reembed_fallback()
+            except Exception as e:
+                logger.warning(f"重新向量化降级向量失败：{e}")
+    
     async def save_memory(self, content: MemoryContent) -> str:
         """保存记忆"""
         self._ensure_initialized()
-        return await self.memory_manager.save(content)
+        # 保存的向量化不阻塞交互请求
+        with request_priority(PRIORITY_BACKGROUND):
+            return await self.memory_manager.save(content)
+    
+    async def save_memories(self, contents: List[MemoryContent]) -> List[Optional[str]]:
+        """批量保存记忆"""
+        self._ensure_initialized()
+        with request_priority(PRIORITY_BACKGROUND):
+            return await self.memory_manager.save_many(contents)
     
     async def search_memory(self, query: str, options: SearchOptions) -> List[Dict[str, Any]]:
         """搜索记忆"""
@@ -140,6 +195,12 @@ class SageCore(ISageService):
     
     async def generate_prompt(self, context: str, style: str = "default") -> str:
         """生成智能提示 - 使用完整RAG功能"""
+        # 交互请求：检索、重排与压缩的 API 调用在限流队列中优先放行
+        with request_priority(PRIORITY_INTERACTIVE):
+            return await self._generate_prompt(context, style)
+    
+    async def _generate_prompt(self, context: str, style: str) -> str:
+        """生成智能提示的RAG流程"""
         import time
         start_time = time.time()
         logger.info(f"[RAG流程] 开始生成智能提示，输入上下文长度: {len(context)} 字符")
@@ -311,9 +372,7 @@ class SageCore(ISageService):
             
             # 尝试使用 Reranker 进行语义重排
             try:
-                from .memory.reranker import TextReranker
-                
-                reranker = TextReranker()
+                reranker = self._get_reranker()
                 # 从环境变量读取候选数量配置
                 import os
                 reranker_candidates = int(os.getenv('SAGE_RERANKER_CANDIDATES', '100'))
@@ -386,6 +445,18 @@ class SageCore(ISageService):
             logger.error(f"[AI压缩] 降级处理失败: {e}，耗时: {total_time:.3f}秒")
             return f"我可以帮您分析技术问题。您的查询：{query}"
     
+    def _get_reranker(self) -> TextReranker:
+        """服务内共用的重排器，首次使用时创建，分数缓存跨调用复用"""
+        if self.reranker is None:
+            reranker_config = self.config_manager.get_reranker_config()
+            backend, *fallbacks = create_rerank_backends(reranker_config, self.memory_manager.vectorizer)
+            self.reranker = TextReranker(
+                backend=backend,
+                fallbacks=fallbacks,
+                cache=create_reranker_cache(reranker_config)
+            )
+        return self.reranker
+    
     async def _simple_fallback(self, chunks: List[str], query: str, start_time: float) -> str:
         """简单降级：基础的关键词匹配"""
         import time
@@ -514,6 +585,13 @@ class SageCore(ISageService):
         else:
             raise ValueError(f"不支持的导出格式：{format}")
     
+    async def iter_export_session(self, session_id: str, format: str = "jsonl") -> AsyncIterator[bytes]:
+        """流式导出会话"""
+        self._ensure_initialized()
+        
+        async for chunk in self.memory_manager.iter_export_session(session_id, format):
+            yield chunk.encode('utf-8')
+    
     async def get_status(self) -> Dict[str, Any]:
         """获取服务状态"""
         status = {
@@ -543,11 +621,24 @@ class SageCore(ISageService):
                 status['statistics'] = stats
             except:
                 pass
+            
+            cache = self.memory_manager.vectorizer.cache
+            if cache is not None:
+                status['embedding_cache'] = cache.get_stats()
+            
+            if self.reranker is not None:
+                status['reranker'] = self.reranker.get_stats()
+            
+            status['rate_limits'] = get_rate_limit_status()
         
         return status
     
     async def cleanup(self) -> None:
         """清理资源"""
+        if self._reembed_task is not None:
+            self._reembed_task.cancel()
+            self._reembed_task = None
+        
         # 等待所有事务完成
         if self.transaction_manager:
             try:
@@ -561,6 +652,17 @@ class SageCore(ISageService):
         if self.db_connection:
             await self.db_connection.disconnect()
         
+        await close_http_client()
+        
+        if self.memory_manager:
+            await self.memory_manager.vectorizer.backend.close()
+            if self.memory_manager.vectorizer.cache is not None:
+                self.memory_manager.vectorizer.cache.close()
+        
+        if self.reranker is not None:
+            await self.reranker.close()
+            self.reranker = None
+        
         self._initialized = False
         logger.info("Sage Core 服务已清理")
     
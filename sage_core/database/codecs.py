@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Database Codecs - asyncpg 类型编解码器
+- vector：注册二进制编解码，直接收发 float32 缓冲区，避免 4096 个浮点数的文本格式化与解析
+- jsonb：注册二进制编解码，读写时直接得到/接收 Python 对象，优先使用 orjson
+"""
+import json
+import struct
+import logging
+from typing import Any
+
+import numpy as np
+import asyncpg
+
+try:
+    import orjson
+except ImportError:  # orjson 为可选依赖
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# pgvector 二进制格式：uint16 维度 + uint16 保留位 + float32[维度]（网络字节序）
+_VECTOR_HEADER = struct.Struct('>HH')
+_VECTOR_DTYPE = np.dtype('>f4')
+
+
+def encode_vector(value: Any) -> bytes:
+    """将向量编码为 pgvector 二进制格式
+
+    Args:
+        value: numpy 数组、浮点数列表，或兼容旧调用方的 '[1,2,3]' 文本
+
+    Returns:
+        二进制载荷
+    """
+    if isinstance(value, str):
+        value = json.loads(value)
+    array = np.asarray(value, dtype=_VECTOR_DTYPE)
+    if array.ndim != 1:
+        raise ValueError(f"vector 必须是一维数组，实际维度：{array.ndim}")
+    return _VECTOR_HEADER.pack(array.shape[0], 0) + array.tobytes()
+
+
+def decode_vector(data: bytes) -> np.ndarray:
+    """将 pgvector 二进制格式解码为 numpy 数组（零拷贝，只读大端视图）
+
+    Args:
+        data: 二进制载荷
+
+    Returns:
+        float32 向量
+    """
+    dim, _ = _VECTOR_HEADER.unpack_from(data)
+    return np.frombuffer(data, dtype=_VECTOR_DTYPE, count=dim, offset=_VECTOR_HEADER.size)
+
+
+async def register_vector_codec(conn: asyncpg.Connection) -> None:
+    """在连接上注册 vector 类型的二进制编解码器
+
+    Raises:
+        ValueError: 数据库中尚未安装 pgvector 扩展
+    """
+    schema = await conn.fetchval(
+        "SELECT typnamespace::regnamespace::text FROM pg_type WHERE typname = 'vector'"
+    )
+    if schema is None:
+        raise ValueError("vector 类型不存在，请先安装 pgvector 扩展")
+
+    await conn.set_type_codec(
+        'vector',
+        schema=schema,
+        encoder=encode_vector,
+        decoder=decode_vector,
+        format='binary'
+    )
+
+
+# jsonb 二进制格式：1 字节版本号 + JSON 文本
+_JSONB_VERSION = b'\x01'
+
+
+def dumps_json(value: Any) -> bytes:
+    """序列化为 UTF-8 JSON 字节串（orjson 可用时使用 orjson）"""
+    if orjson is not None:
+        return orjson.dumps(value, option=orjson.OPT_SERIALIZE_NUMPY | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(value, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
+
+def loads_json(data: Any) -> Any:
+    """反序列化 JSON（支持 bytes / memoryview / str）"""
+    if orjson is not None:
+        return orjson.loads(data)
+    if isinstance(data, memoryview):
+        data = data.tobytes()
+    return json.loads(data)
+
+
+def encode_jsonb(value: Any) -> bytes:
+    """将 Python 对象编码为 jsonb 二进制格式
+
+    str 视为已序列化的 JSON 文本原样发送，兼容仍传入 json.dumps 结果的调用方
+    """
+    if isinstance(value, str):
+        return _JSONB_VERSION + value.encode('utf-8')
+    return _JSONB_VERSION + dumps_json(value)
+
+
+def decode_jsonb(data: bytes) -> Any:
+    """将 jsonb 二进制格式解码为 Python 对象（跳过版本号，不复制载荷）"""
+    return loads_json(memoryview(data)[1:])
+
+
+async def register_jsonb_codec(conn: asyncpg.Connection) -> None:
+    """在连接上注册 jsonb 类型的二进制编解码器"""
+    await conn.set_type_codec(
+        'jsonb',
+        schema='pg_catalog',
+        encoder=encode_jsonb,
+        decoder=decode_jsonb,
+        format='binary'
+    )
@@ -8,6 +8,7 @@ import asyncpg
 from typing import Optional, Dict, Any
 import logging
 from contextlib import asynccontextmanager
+from .codecs import register_vector_codec, register_jsonb_codec
 from ..resilience import retry, circuit_breaker, DATABASE_RETRY_CONFIG, CircuitBreakerOpenError
 
 logger = logging.getLogger(__name__)
@@ -43,7 +44,8 @@ class DatabaseConnection:
                     password=self.config['password'],
                     min_size=5,
                     max_size=20,
-                    command_timeout=60
+                    command_timeout=60,
+                    init=self._init_connection
                 )
                 logger.info("数据库连接池创建成功")
                 
@@ -57,6 +59,16 @@ class DatabaseConnection:
                 logger.error(f"创建数据库连接池失败：{e}")
                 raise
     
+    async def _init_connection(self, conn: asyncpg.Connection) -> None:
+        """连接池新建连接时的初始化：注册类型编解码器"""
+        await register_jsonb_codec(conn)
+        try:
+            await register_vector_codec(conn)
+        except ValueError:
+            # 全新数据库首次连接时 pgvector 扩展尚未创建
+            await conn.execute('CREATE EXTENSION IF NOT EXISTS vector')
+            await register_vector_codec(conn)
+    
     async def disconnect(self) -> None:
         """关闭连接池"""
         async with self._lock:
@@ -110,6 +122,28 @@ class DatabaseConnection:
         async with self.acquire() as conn:
             return await conn.fetch(query, *args)
     
+    @retry(max_attempts=3, initial_delay=0.5)
+    @circuit_breaker("database_fetch", failure_threshold=5, recovery_timeout=60)
+    async def fetch_with_settings(self, settings: Dict[str, Any], query: str, *args) -> list:
+        """在设置了会话级参数的事务中查询多条记录
+        
+        参数通过 set_config(..., is_local=true) 设置，仅对本次事务生效，
+        用于 hnsw.ef_search 这类需要按查询调整的检索参数。
+        
+        Args:
+            settings: 参数名到参数值的映射
+            query: SQL查询语句
+            *args: 参数
+        
+        Returns:
+            查询结果列表
+        """
+        async with self.acquire() as conn:
+            async with conn.transaction():
+                for name, value in settings.items():
+                    await conn.execute("SELECT set_config($1, $2, true)", name, str(value))
+                return await conn.fetch(query, *args)
+    
     @retry(max_attempts=3, initial_delay=0.5)
     @circuit_breaker("database_fetchrow", failure_threshold=5, recovery_timeout=60)
     async def fetchrow(self, query: str, *args) -> Optional[asyncpg.Record]:
@@ -146,18 +180,137 @@ class DatabaseConnection:
             # 创建 pgvector 扩展
             await conn.execute('CREATE EXTENSION IF NOT EXISTS vector')
             
-            # 创建记忆表
+            # 创建记忆表（按 time_window 月度范围分区，去重唯一索引包含分区键）
+            # 未分区的存量库见 migrations/partition_memories_by_month.sql
             await conn.execute('''
                 CREATE TABLE IF NOT EXISTS memories (
-                    id UUID PRIMARY KEY DEFAULT gen_random_uuid(),
+                    id UUID NOT NULL DEFAULT gen_random_uuid(),
                     session_id TEXT,
                     user_input TEXT NOT NULL,
                     assistant_response TEXT NOT NULL,
-                    embedding vector(4096),
                     metadata JSONB DEFAULT '{}',
+                    content_hash TEXT,
+                    time_window TEXT NOT NULL DEFAULT to_char(CURRENT_TIMESTAMP AT TIME ZONE 'UTC', 'YYYYMMDDHH24'),
                     created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+                    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (id, time_window)
+                ) PARTITION BY RANGE (time_window)
+            ''')
+            
+            # 月度分区维护：当月及未来两个月（memories 未分区时为空操作）
+            await conn.execute('''
+                CREATE OR REPLACE FUNCTION sage_ensure_memory_partitions(
+                    from_date date DEFAULT (now() AT TIME ZONE 'UTC')::date,
+                    months_ahead integer DEFAULT 2
                 )
+                RETURNS integer AS $$
+                DECLARE
+                    month_start date := date_trunc('month', from_date)::date;
+                    last_month date := (date_trunc('month', (now() AT TIME ZONE 'UTC')::date)
+                                        + make_interval(months => months_ahead))::date;
+                    partition_name text;
+                    created integer := 0;
+                BEGIN
+                    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('memories') AND relkind = 'p') THEN
+                        RETURN 0;
+                    END IF;
+                    
+                    WHILE month_start <= last_month LOOP
+                        partition_name := 'memories_p' || to_char(month_start, 'YYYYMM');
+                        IF to_regclass(partition_name) IS NULL THEN
+                            BEGIN
+                                EXECUTE format(
+                                    'CREATE TABLE %I PARTITION OF memories FOR VALUES FROM (%L) TO (%L)',
+                                    partition_name,
+                                    to_char(month_start, 'YYYYMM'),
+                                    to_char(month_start + interval '1 month', 'YYYYMM')
+                                );
+                                created := created + 1;
+                            EXCEPTION WHEN duplicate_table THEN
+                                NULL;
+                            END;
+                        END IF;
+                        month_start := (month_start + interval '1 month')::date;
+                    END LOOP;
+                    
+                    RETURN created;
+                END;
+                $$ LANGUAGE plpgsql
+            ''')
+            
+            await conn.execute('SELECT sage_ensure_memory_partitions()')
+            
+            # 去重列与唯一索引（save 的 ON CONFLICT 目标）
+            # 存量数据需执行 migrations/add_content_hash_column.sql 回填
+            await conn.execute('''
+                ALTER TABLE memories
+                    ADD COLUMN IF NOT EXISTS content_hash TEXT,
+                    ADD COLUMN IF NOT EXISTS time_window TEXT
+            ''')
+            
+            await conn.execute('''
+                CREATE UNIQUE INDEX IF NOT EXISTS idx_memories_dedup 
+                ON memories(session_id, content_hash, time_window)
+            ''')
+            
+            # 全文检索列及其维护触发器（search_by_text 依赖）
+            # 存量回填见 migrations/add_text_search.sql
+            await conn.execute(r'''
+                CREATE OR REPLACE FUNCTION sage_cjk_segment(input text)
+                RETURNS text AS $$
+                    SELECT regexp_replace(
+                        input,
+                        '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])',
+                        ' \1 ',
+                        'g'
+                    )
+                $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+            ''')
+            
+            await conn.execute('''
+                CREATE OR REPLACE FUNCTION sage_search_vector(user_input text, assistant_response text)
+                RETURNS tsvector AS $$
+                    SELECT to_tsvector(
+                        'simple'::regconfig,
+                        sage_cjk_segment(left(COALESCE(user_input, ''), 200000) || ' ' || left(COALESCE(assistant_response, ''), 200000))
+                    )
+                $$ LANGUAGE sql IMMUTABLE PARALLEL SAFE
+            ''')
+            
+            await conn.execute('ALTER TABLE memories ADD COLUMN IF NOT EXISTS search_vector tsvector')
+            
+            await conn.execute('''
+                CREATE OR REPLACE FUNCTION sage_derive_search_vector()
+                RETURNS TRIGGER AS $$
+                BEGIN
+                    NEW.search_vector := sage_search_vector(NEW.user_input, NEW.assistant_response);
+                    RETURN NEW;
+                END;
+                $$ LANGUAGE plpgsql
+            ''')
+            
+            await conn.execute('''
+                CREATE OR REPLACE TRIGGER trg_memories_search_vector
+                    BEFORE INSERT OR UPDATE OF user_input, assistant_response ON memories
+                    FOR EACH ROW EXECUTE FUNCTION sage_derive_search_vector()
+            ''')
+            
+            # 全文与 pg_trgm 索引：建在分区父表上，自动应用到现有及之后创建的分区
+            # 存量数据较多时先用 scripts/build_memory_indexes.py 不阻塞写入地创建，这里即为空操作
+            await conn.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_memories_search_vector
+                ON memories USING gin (search_vector)
+            ''')
+            
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_memories_user_input_trgm
+                ON memories USING gin (user_input gin_trgm_ops)
+            ''')
+            
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_memories_assistant_response_trgm
+                ON memories USING gin (assistant_response gin_trgm_ops)
             ''')
             
             # 创建索引
@@ -171,16 +324,193 @@ class DatabaseConnection:
                 ON memories(created_at DESC)
             ''')
             
-            # Note: For 4096 dimensions, we skip the vector index as ivfflat has a 2000 dimension limit
-            # HNSW index would work but requires more setup. Sequential scan will be used for now.
-            # await conn.execute('''
-            #     CREATE INDEX IF NOT EXISTS idx_memories_embedding 
-            #     ON memories USING ivfflat (embedding vector_cosine_ops)
-            #     WITH (lists = 100)
-            # ''')
+            await self._initialize_session_stats(conn)
+            
+            # 向量表：与 memories 纵向拆分，按 (memory_id, model) 存储
+            # 存量向量的复制见 migrations/add_memory_embeddings.sql
+            # embedding 不限定维度，不同维度的模型可以同时存在（见 migrations/add_embedding_generations.sql）
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS memory_embeddings (
+                    memory_id UUID NOT NULL,
+                    time_window TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    source TEXT NOT NULL DEFAULT 'api',
+                    embedding vector NOT NULL,
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (memory_id, model)
+                )
+            ''')
+            
+            await conn.execute('''
+                ALTER TABLE memory_embeddings ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1
+            ''')
+            
+            # source：api 为模型向量，fallback 为 API 故障时的降级向量，待 API 恢复后重新向量化
+            await conn.execute('''
+                ALTER TABLE memory_embeddings ADD COLUMN IF NOT EXISTS source TEXT NOT NULL DEFAULT 'api'
+            ''')
+            
+            await conn.execute('''
+                CREATE INDEX IF NOT EXISTS idx_memory_embeddings_fallback
+                ON memory_embeddings (model) WHERE source = 'fallback'
+            ''')
+            
+            # 向量代际：每个模型一行，status 为 building 时表示重新向量化尚未完成
+            await conn.execute('''
+                CREATE TABLE IF NOT EXISTS embedding_generations (
+                    model TEXT PRIMARY KEY,
+                    dimension INTEGER NOT NULL,
+                    version INTEGER NOT NULL DEFAULT 1,
+                    status TEXT NOT NULL DEFAULT 'building'
+                        CHECK (status IN ('building', 'ready', 'retired')),
+                    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                    ready_at TIMESTAMP WITH TIME ZONE
+                )
+            ''')
+            
+            await conn.execute('''
+                CREATE OR REPLACE FUNCTION sage_embeddings_on_delete()
+                RETURNS TRIGGER AS $$
+                BEGIN
+                    DELETE FROM memory_embeddings e
+                    USING deleted_rows d
+                    WHERE e.memory_id = d.id;
+                    RETURN NULL;
+                END;
+                $$ LANGUAGE plpgsql
+            ''')
+            
+            await conn.execute('''
+                CREATE OR REPLACE TRIGGER trg_memories_embeddings_delete
+                    AFTER DELETE ON memories
+                    REFERENCING OLD TABLE AS deleted_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION sage_embeddings_on_delete()
+            ''')
+            
+            # Note: For 4096 dimensions, we skip the vector index as ivfflat/hnsw have a 2000 dimension limit.
+            # The exact search path uses a sequential scan. For a faster path, apply
+            # migrations/add_ann_embedding.sql (mode "ann") or
+            # migrations/add_binary_embedding.sql (mode "binary") and set vector_search.mode.
             
             logger.info("数据库模式初始化完成")
     
+    async def _initialize_session_stats(self, conn: asyncpg.Connection) -> None:
+        """初始化 sessions 统计表及其维护触发器
+        
+        memories 上的语句级触发器按 session_id 聚合每条 INSERT / DELETE 语句的转换表，
+        维护记忆数与首末时间。首次安装触发器时在同一事务内回填存量数据，
+        与 migrations/add_session_stats.sql 等价。
+        """
+        await conn.execute('''
+            CREATE TABLE IF NOT EXISTS sessions (
+                id TEXT PRIMARY KEY,
+                name TEXT,
+                metadata JSONB DEFAULT '{}',
+                created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+                last_active TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        
+        await conn.execute('''
+            ALTER TABLE sessions
+                ADD COLUMN IF NOT EXISTS memory_count BIGINT NOT NULL DEFAULT 0,
+                ADD COLUMN IF NOT EXISTS first_memory_at TIMESTAMP WITH TIME ZONE,
+                ADD COLUMN IF NOT EXISTS last_memory_at TIMESTAMP WITH TIME ZONE
+        ''')
+        
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_sessions_last_memory_at
+            ON sessions(last_memory_at DESC) WHERE memory_count > 0
+        ''')
+        
+        await conn.execute('''
+            CREATE INDEX IF NOT EXISTS idx_memories_session_created
+            ON memories(session_id, created_at)
+        ''')
+        
+        await conn.execute('''
+            CREATE OR REPLACE FUNCTION sage_sessions_on_insert()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                INSERT INTO sessions AS s (id, memory_count, first_memory_at, last_memory_at, last_active)
+                SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at), MAX(created_at)
+                FROM inserted_rows
+                WHERE session_id IS NOT NULL
+                GROUP BY session_id
+                ON CONFLICT (id) DO UPDATE SET
+                    memory_count = s.memory_count + EXCLUDED.memory_count,
+                    first_memory_at = LEAST(s.first_memory_at, EXCLUDED.first_memory_at),
+                    last_memory_at = GREATEST(s.last_memory_at, EXCLUDED.last_memory_at),
+                    last_active = GREATEST(s.last_active, EXCLUDED.last_active);
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        
+        await conn.execute('''
+            CREATE OR REPLACE FUNCTION sage_sessions_on_delete()
+            RETURNS TRIGGER AS $$
+            BEGIN
+                UPDATE sessions s SET
+                    memory_count = GREATEST(s.memory_count - d.removed, 0),
+                    first_memory_at = (SELECT MIN(m.created_at) FROM memories m WHERE m.session_id = s.id),
+                    last_memory_at = (SELECT MAX(m.created_at) FROM memories m WHERE m.session_id = s.id)
+                FROM (
+                    SELECT session_id, COUNT(*) AS removed
+                    FROM deleted_rows
+                    WHERE session_id IS NOT NULL
+                    GROUP BY session_id
+                ) d
+                WHERE s.id = d.session_id;
+                RETURN NULL;
+            END;
+            $$ LANGUAGE plpgsql
+        ''')
+        
+        installed = await conn.fetchval('''
+            SELECT EXISTS (
+                SELECT 1 FROM pg_trigger
+                WHERE tgrelid = 'memories'::regclass AND tgname = 'trg_memories_sessions_insert'
+            )
+        ''')
+        if installed:
+            return
+        
+        async with conn.transaction():
+            # 锁住写入，保证回填与触发器生效之间不漏计
+            await conn.execute('LOCK TABLE memories IN SHARE ROW EXCLUSIVE MODE')
+            
+            await conn.execute('''
+                CREATE OR REPLACE TRIGGER trg_memories_sessions_insert
+                    AFTER INSERT ON memories
+                    REFERENCING NEW TABLE AS inserted_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION sage_sessions_on_insert()
+            ''')
+            
+            await conn.execute('''
+                CREATE OR REPLACE TRIGGER trg_memories_sessions_delete
+                    AFTER DELETE ON memories
+                    REFERENCING OLD TABLE AS deleted_rows
+                    FOR EACH STATEMENT EXECUTE FUNCTION sage_sessions_on_delete()
+            ''')
+            
+            await conn.execute('''
+                INSERT INTO sessions AS s (id, memory_count, first_memory_at, last_memory_at, last_active)
+                SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at), MAX(created_at)
+                FROM memories
+                WHERE session_id IS NOT NULL
+                GROUP BY session_id
+                ON CONFLICT (id) DO UPDATE SET
+                    memory_count = EXCLUDED.memory_count,
+                    first_memory_at = EXCLUDED.first_memory_at,
+                    last_memory_at = EXCLUDED.last_memory_at,
+                    last_active = GREATEST(s.last_active, EXCLUDED.last_active)
+            ''')
+        
+        logger.info("会话统计触发器已安装并完成回填")
+    
     async def close(self) -> None:
         """关闭连接池"""
         async with self._lock:
@@ -0,0 +1,37 @@
+-- 为 4096 维 embedding 增加降维 ANN 检索列
+-- pgvector 的 HNSW/IVFFlat 索引最多支持 2000 维，无法直接索引 memories.embedding。
+-- Qwen3-Embedding 为 Matryoshka 训练的模型，前 N 维截断后重新归一化仍保持较好的语义排序，
+-- 因此在截断后的 1024 维列上建立 HNSW 索引用于召回候选，再用完整 embedding 精排。
+--
+-- 依赖 pgvector >= 0.7.0（subvector / l2_normalize）
+-- 维度 1024 需与 sage_core/memory/storage.py 的 ANN_DIMENSION 保持一致
+-- 向量存放在 memory_embeddings（见 add_memory_embeddings.sql），派生列与索引同样建在该表上
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/add_ann_embedding.sql
+-- 存量数据回填：python scripts/backfill_embedding_columns.py --column ann
+
+-- 1. 降维列
+ALTER TABLE memory_embeddings ADD COLUMN IF NOT EXISTS embedding_ann vector(1024);
+
+-- 2. 写入/更新 embedding 时自动维护降维列，保存路径无需改动
+CREATE OR REPLACE FUNCTION sage_derive_embedding_ann()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- 不足 1024 维的模型不参与 ANN 召回
+    IF NEW.embedding IS NULL OR vector_dims(NEW.embedding) < 1024 THEN
+        NEW.embedding_ann := NULL;
+    ELSE
+        NEW.embedding_ann := l2_normalize(subvector(NEW.embedding, 1, 1024))::vector(1024);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_memory_embeddings_embedding_ann ON memory_embeddings;
+CREATE TRIGGER trg_memory_embeddings_embedding_ann
+    BEFORE INSERT OR UPDATE OF embedding ON memory_embeddings
+    FOR EACH ROW EXECUTE FUNCTION sage_derive_embedding_ann();
+
+-- 3. HNSW 索引（CONCURRENTLY 不阻塞写入，不能在事务块中执行）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memory_embeddings_ann
+ON memory_embeddings USING hnsw (embedding_ann vector_cosine_ops)
+WITH (m = 16, ef_construction = 64);
@@ -0,0 +1,31 @@
+-- 为 embedding 增加二值量化列（sign bit），用于低带宽的候选预筛选
+-- 每个 4096 维 float32 向量（16KB）压缩为 4096 bit（512 字节），
+-- 检索时先按 Hamming 距离在二值列上取 N×k 个候选，再用完整 embedding 精确重排。
+-- 二值列不受 HNSW/IVFFlat 2000 维上限影响。
+--
+-- 依赖 pgvector >= 0.7.0（binary_quantize / <~> Hamming 距离）
+-- 向量存放在 memory_embeddings（见 add_memory_embeddings.sql），派生列与索引同样建在该表上
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/add_binary_embedding.sql
+-- 存量数据回填：python scripts/backfill_embedding_columns.py --column bin
+
+-- 1. 二值量化列
+ALTER TABLE memory_embeddings ADD COLUMN IF NOT EXISTS embedding_bin bit(4096);
+
+-- 2. 写入/更新 embedding 时自动维护二值列
+CREATE OR REPLACE FUNCTION sage_derive_embedding_bin()
+RETURNS TRIGGER AS $$
+BEGIN
+    -- 二值列固定 4096 bit，其他维度的模型不参与二值预筛
+    IF NEW.embedding IS NULL OR vector_dims(NEW.embedding) <> 4096 THEN
+        NEW.embedding_bin := NULL;
+    ELSE
+        NEW.embedding_bin := binary_quantize(NEW.embedding)::bit(4096);
+    END IF;
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_memory_embeddings_embedding_bin ON memory_embeddings;
+CREATE TRIGGER trg_memory_embeddings_embedding_bin
+    BEFORE INSERT OR UPDATE OF embedding ON memory_embeddings
+    FOR EACH ROW EXECUTE FUNCTION sage_derive_embedding_bin();
@@ -0,0 +1,53 @@
+-- 将去重键从 metadata JSONB 提升为独立列，并以唯一索引保证会话内去重
+-- 保存路径改为单条 INSERT ... ON CONFLICT (session_id, content_hash, time_window)，
+-- 不再需要先 SELECT metadata->>'content_hash' OR metadata->>'time_aware_hash' 再 INSERT。
+--
+-- content_hash = sha256(user_input || assistant_response)，time_window = UTC 小时桶 YYYYMMDDHH
+-- 存量重复记录中每组仅最早一条写入 content_hash，其余保持 NULL（NULL 不参与唯一约束）
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/add_content_hash_column.sql
+
+-- 1. 去重列
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS content_hash TEXT;
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS time_window TEXT;
+
+-- 2. 回填时间窗口（与 MemoryStorage.save 中的计算方式一致）
+UPDATE memories
+SET time_window = to_char(created_at AT TIME ZONE 'UTC', 'YYYYMMDDHH24')
+WHERE time_window IS NULL;
+
+-- 3. 回填内容哈希，每个 (session_id, content_hash, time_window) 组只保留最早的一条
+WITH ranked AS (
+    SELECT id,
+           session_id,
+           time_window,
+           encode(sha256(convert_to(COALESCE(user_input, '') || COALESCE(assistant_response, ''), 'UTF8')), 'hex') AS hash,
+           ROW_NUMBER() OVER (
+               PARTITION BY session_id,
+                            encode(sha256(convert_to(COALESCE(user_input, '') || COALESCE(assistant_response, ''), 'UTF8')), 'hex'),
+                            time_window
+               ORDER BY created_at, id
+           ) AS rn
+    FROM memories
+    WHERE content_hash IS NULL AND session_id IS NOT NULL
+)
+UPDATE memories m
+SET content_hash = r.hash
+FROM ranked r
+WHERE m.id = r.id
+  AND r.rn = 1
+  AND NOT EXISTS (
+      SELECT 1 FROM memories e
+      WHERE e.session_id = r.session_id
+        AND e.content_hash = r.hash
+        AND e.time_window = r.time_window
+  );
+
+-- 4. 会话内去重唯一索引（ON CONFLICT 的冲突目标）
+CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS idx_memories_dedup
+ON memories (session_id, content_hash, time_window);
+
+-- 5. 旧的 JSONB 表达式索引不再被查询使用
+DROP INDEX CONCURRENTLY IF EXISTS idx_memories_content_hash;
+DROP INDEX CONCURRENTLY IF EXISTS idx_memories_session_content_hash;
+
+ANALYZE memories;
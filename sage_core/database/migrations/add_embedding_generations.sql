@@ -0,0 +1,39 @@
+-- 向量代际：允许多个 embedding 模型（及同一模型的多个版本）同时存在，支持在线切换模型
+-- memory_embeddings.embedding 去掉固定维度，每行记录 model / version；
+-- embedding_generations 记录每个模型的维度、版本与状态（building / ready / retired）。
+--
+-- 切换模型的流程：
+--   1. 保持 EMBEDDING_MODEL 为旧模型（检索继续读旧代际），运行
+--      python scripts/reembed_memories.py --model <新模型> --dimension <维度>
+--      分批、限速地为全部记忆生成新代际向量，完成后新代际标记为 ready
+--   2. 将 EMBEDDING_MODEL / EMBEDDING_DIMENSION 改为新模型并重启服务，
+--      再运行一次 reembed_memories.py 补齐切换窗口内写入的记忆
+--   3. 确认无误后 python scripts/reembed_memories.py --retire <旧模型> 分批删除旧代际
+--
+-- 已启用 ann / binary 模式的部署请重新执行 add_ann_embedding.sql / add_binary_embedding.sql，
+-- 使派生列触发器跳过维度不匹配的模型。
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/add_embedding_generations.sql
+
+-- 1. 去掉固定维度（只修改类型修饰符，不重写表）并增加版本列
+ALTER TABLE memory_embeddings ALTER COLUMN embedding TYPE vector;
+ALTER TABLE memory_embeddings ADD COLUMN IF NOT EXISTS version INTEGER NOT NULL DEFAULT 1;
+
+-- 2. 代际表
+CREATE TABLE IF NOT EXISTS embedding_generations (
+    model TEXT PRIMARY KEY,
+    dimension INTEGER NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    status TEXT NOT NULL DEFAULT 'building'
+        CHECK (status IN ('building', 'ready', 'retired')),
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    ready_at TIMESTAMP WITH TIME ZONE
+);
+
+-- 3. 已有的模型登记为 ready
+INSERT INTO embedding_generations (model, dimension, status, ready_at)
+SELECT g.model,
+       (SELECT vector_dims(e.embedding) FROM memory_embeddings e WHERE e.model = g.model LIMIT 1),
+       'ready',
+       CURRENT_TIMESTAMP
+FROM (SELECT DISTINCT model FROM memory_embeddings) g
+ON CONFLICT (model) DO NOTHING;
@@ -0,0 +1,88 @@
+-- 将 4096 维 embedding 从 memories 拆分到 memory_embeddings（按 记忆ID + 模型名 存储）
+-- 最近记忆、文本检索、会话列表、分析等非向量查询只读 memories，不再接触向量数据；
+-- 同一条记忆可同时保存多个模型的向量，便于切换 embedding 模型时新旧并存。
+--
+-- 顺序：先升级代码（服务启动时会创建 memory_embeddings 及其删除触发器，并按 EMBEDDING_MODEL
+-- 复制 memories.embedding 中尚未复制的存量向量，迁移前历史记忆仍可被向量检索），再执行本迁移。
+-- 存量向量按默认模型 Qwen/Qwen3-Embedding-8B 复制，EMBEDDING_MODEL 不同时请先修改第 3 步的模型名。
+-- 启用了 ann / binary 检索模式时，迁移后重新执行 add_ann_embedding.sql / add_binary_embedding.sql
+-- 并运行 backfill_embedding_columns.py 回填派生列。
+-- memories 中删除的向量列在 VACUUM FULL（或 pg_repack）后释放空间。
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/add_memory_embeddings.sql
+
+-- 1. 向量表
+CREATE TABLE IF NOT EXISTS memory_embeddings (
+    memory_id UUID NOT NULL,
+    time_window TEXT NOT NULL,
+    model TEXT NOT NULL,
+    version INTEGER NOT NULL DEFAULT 1,
+    embedding vector NOT NULL,
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    PRIMARY KEY (memory_id, model)
+);
+
+-- 2. 删除记忆时一并删除其向量（语句级触发器，每条 DELETE 语句按转换表集合删除一次）
+CREATE OR REPLACE FUNCTION sage_embeddings_on_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    DELETE FROM memory_embeddings e
+    USING deleted_rows d
+    WHERE e.memory_id = d.id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE TRIGGER trg_memories_embeddings_delete
+    AFTER DELETE ON memories
+    REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sage_embeddings_on_delete();
+
+-- 3. 复制存量向量（可重复执行，已复制的记录跳过）
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'memories' AND column_name = 'embedding'
+    ) THEN
+        INSERT INTO memory_embeddings (memory_id, time_window, model, embedding, created_at)
+        SELECT id,
+               COALESCE(time_window, to_char(created_at AT TIME ZONE 'UTC', 'YYYYMMDDHH24')),
+               'Qwen/Qwen3-Embedding-8B',
+               embedding,
+               created_at
+        FROM memories
+        WHERE embedding IS NOT NULL
+        ON CONFLICT (memory_id, model) DO NOTHING;
+    END IF;
+END;
+$$;
+
+-- 4. 全部复制完成后删除 memories 上的向量列及其派生列、触发器
+DO $$
+BEGIN
+    IF NOT EXISTS (
+        SELECT 1 FROM information_schema.columns
+        WHERE table_name = 'memories' AND column_name = 'embedding'
+    ) THEN
+        RETURN;
+    END IF;
+
+    IF EXISTS (
+        SELECT 1 FROM memories m
+        WHERE m.embedding IS NOT NULL
+          AND NOT EXISTS (SELECT 1 FROM memory_embeddings e WHERE e.memory_id = m.id)
+    ) THEN
+        RAISE NOTICE '仍有未复制的向量，保留 memories.embedding，请重新执行本迁移';
+        RETURN;
+    END IF;
+
+    DROP TRIGGER IF EXISTS trg_memories_embedding_ann ON memories;
+    DROP TRIGGER IF EXISTS trg_memories_embedding_bin ON memories;
+    ALTER TABLE memories
+        DROP COLUMN IF EXISTS embedding_ann,
+        DROP COLUMN IF EXISTS embedding_bin,
+        DROP COLUMN embedding;
+END;
+$$;
+
+ANALYZE memory_embeddings;
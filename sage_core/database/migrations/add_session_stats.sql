@@ -0,0 +1,101 @@
+-- 由 memories 上的触发器维护 sessions 表的记忆数与首末时间
+-- list_sessions / get_statistics / sage://sessions/list 直接读取 sessions（O(会话数)），
+-- 不再对整张 memories 做 GROUP BY session_id / COUNT(DISTINCT session_id)。
+--
+-- 触发器为语句级并使用转换表：每条 INSERT / DELETE 语句按 session_id 聚合后只更新一次 sessions，
+-- save_many 的 COPY + INSERT ... SELECT 同样只触发一次。
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/add_session_stats.sql
+
+-- 1. sessions 表（docker/init.sql 已创建时只补充统计列）
+CREATE TABLE IF NOT EXISTS sessions (
+    id TEXT PRIMARY KEY,
+    name TEXT,
+    metadata JSONB DEFAULT '{}',
+    created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+    last_active TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+);
+
+ALTER TABLE sessions
+    ADD COLUMN IF NOT EXISTS memory_count BIGINT NOT NULL DEFAULT 0,
+    ADD COLUMN IF NOT EXISTS first_memory_at TIMESTAMP WITH TIME ZONE,
+    ADD COLUMN IF NOT EXISTS last_memory_at TIMESTAMP WITH TIME ZONE;
+
+-- list_sessions 按最近记忆时间分页
+CREATE INDEX IF NOT EXISTS idx_sessions_last_memory_at
+ON sessions(last_memory_at DESC) WHERE memory_count > 0;
+
+-- 删除后重新计算首末时间（MIN/MAX 走索引两端）
+CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_memories_session_created
+ON memories(session_id, created_at);
+
+-- 2. 触发器函数
+CREATE OR REPLACE FUNCTION sage_sessions_on_insert()
+RETURNS TRIGGER AS $$
+BEGIN
+    INSERT INTO sessions AS s (id, memory_count, first_memory_at, last_memory_at, last_active)
+    SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at), MAX(created_at)
+    FROM inserted_rows
+    WHERE session_id IS NOT NULL
+    GROUP BY session_id
+    ON CONFLICT (id) DO UPDATE SET
+        memory_count = s.memory_count + EXCLUDED.memory_count,
+        first_memory_at = LEAST(s.first_memory_at, EXCLUDED.first_memory_at),
+        last_memory_at = GREATEST(s.last_memory_at, EXCLUDED.last_memory_at),
+        last_active = GREATEST(s.last_active, EXCLUDED.last_active);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+CREATE OR REPLACE FUNCTION sage_sessions_on_delete()
+RETURNS TRIGGER AS $$
+BEGIN
+    UPDATE sessions s SET
+        memory_count = GREATEST(s.memory_count - d.removed, 0),
+        first_memory_at = (SELECT MIN(m.created_at) FROM memories m WHERE m.session_id = s.id),
+        last_memory_at = (SELECT MAX(m.created_at) FROM memories m WHERE m.session_id = s.id)
+    FROM (
+        SELECT session_id, COUNT(*) AS removed
+        FROM deleted_rows
+        WHERE session_id IS NOT NULL
+        GROUP BY session_id
+    ) d
+    WHERE s.id = d.session_id;
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 3. 安装触发器并回填（同一事务内锁住写入，避免回填与触发器之间漏计）
+BEGIN;
+
+LOCK TABLE memories IN SHARE ROW EXCLUSIVE MODE;
+
+CREATE OR REPLACE TRIGGER trg_memories_sessions_insert
+    AFTER INSERT ON memories
+    REFERENCING NEW TABLE AS inserted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sage_sessions_on_insert();
+
+CREATE OR REPLACE TRIGGER trg_memories_sessions_delete
+    AFTER DELETE ON memories
+    REFERENCING OLD TABLE AS deleted_rows
+    FOR EACH STATEMENT EXECUTE FUNCTION sage_sessions_on_delete();
+
+INSERT INTO sessions AS s (id, memory_count, first_memory_at, last_memory_at, last_active)
+SELECT session_id, COUNT(*), MIN(created_at), MAX(created_at), MAX(created_at)
+FROM memories
+WHERE session_id IS NOT NULL
+GROUP BY session_id
+ON CONFLICT (id) DO UPDATE SET
+    memory_count = EXCLUDED.memory_count,
+    first_memory_at = EXCLUDED.first_memory_at,
+    last_memory_at = EXCLUDED.last_memory_at,
+    last_active = GREATEST(s.last_active, EXCLUDED.last_active);
+
+-- 已无记忆的会话清零
+UPDATE sessions s SET memory_count = 0, first_memory_at = NULL, last_memory_at = NULL
+WHERE s.memory_count <> 0
+  AND NOT EXISTS (SELECT 1 FROM memories m WHERE m.session_id = s.id);
+
+COMMIT;
+
+ANALYZE sessions;
@@ -0,0 +1,51 @@
+-- 为 search_by_text 增加全文检索列与三元组索引，替代 ILIKE '%q%' 的全表扫描
+-- PostgreSQL 内置解析器不对中文分词，这里在建立 tsvector 前把每个 CJK 字符用空格隔开（单字切分），
+-- 查询端将中文词转换为相邻单字的短语查询（'数' <-> '据' <-> '库'），与 MemoryStorage._to_websearch_query 对应。
+-- pg_trgm 索引用于保留子串匹配语义（代码标识符、短词等 tsvector 切分不理想的情况）。
+--
+-- search_vector 与派生向量列一样由触发器维护（避免添加 STORED 生成列时重写整张表）
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/add_text_search.sql（索引见第 3 步）
+-- 存量数据回填：python scripts/backfill_embedding_columns.py --column tsv
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+-- 1. CJK 单字切分
+CREATE OR REPLACE FUNCTION sage_cjk_segment(input text)
+RETURNS text AS $$
+    SELECT regexp_replace(
+        input,
+        '([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])',
+        ' \1 ',
+        'g'
+    )
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+-- 2. 全文检索向量（单列截断到 200K 字符，避免超过 tsvector 1MB 上限）
+CREATE OR REPLACE FUNCTION sage_search_vector(user_input text, assistant_response text)
+RETURNS tsvector AS $$
+    SELECT to_tsvector(
+        'simple'::regconfig,
+        sage_cjk_segment(left(COALESCE(user_input, ''), 200000) || ' ' || left(COALESCE(assistant_response, ''), 200000))
+    )
+$$ LANGUAGE sql IMMUTABLE PARALLEL SAFE;
+
+ALTER TABLE memories ADD COLUMN IF NOT EXISTS search_vector tsvector;
+
+CREATE OR REPLACE FUNCTION sage_derive_search_vector()
+RETURNS TRIGGER AS $$
+BEGIN
+    NEW.search_vector := sage_search_vector(NEW.user_input, NEW.assistant_response);
+    RETURN NEW;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS trg_memories_search_vector ON memories;
+CREATE TRIGGER trg_memories_search_vector
+    BEFORE INSERT OR UPDATE OF user_input, assistant_response ON memories
+    FOR EACH ROW EXECUTE FUNCTION sage_derive_search_vector();
+
+-- 3. 索引
+-- 分区表不支持 CREATE INDEX CONCURRENTLY，需先在父表 ON ONLY 建索引、逐个分区并发建索引后再挂接，
+-- 这里无法逐个分区动态执行，由脚本完成（memories 未分区时同样适用）：
+--     python scripts/build_memory_indexes.py
+-- 服务启动时也会以阻塞方式创建同名索引（见 DatabaseConnection._initialize_schema），存量数据较多时请先执行脚本。
@@ -0,0 +1,132 @@
+-- 将 memories 转换为按月范围分区的分区表（分区键 time_window，UTC 小时桶 YYYYMMDDHH）
+-- 去重唯一索引 (session_id, content_hash, time_window) 本身包含分区键，可直接作为分区表的唯一索引；
+-- 主键改为 (id, time_window)。分区命名 memories_pYYYYMM，范围 [YYYYMM, 下月YYYYMM)。
+-- 父表上的索引（含 HNSW 向量索引）与触发器会自动应用到之后创建的每个分区。
+--
+-- 不创建 DEFAULT 分区：这样旧分区可以用 DETACH PARTITION ... CONCURRENTLY 归档，
+-- 新月份分区由 sage_ensure_memory_partitions() 提前创建（服务启动时以及每月首次写入时调用）。
+-- 归档：python scripts/archive_memory_partitions.py --keep-months 12
+--
+-- 转换在单个事务内完成：期间 memories 只读（EXCLUSIVE 锁），数据量大时请在维护窗口执行。
+-- 原表保留为 memories_unpartitioned，确认无误后手动 DROP TABLE memories_unpartitioned。
+-- 执行：python scripts/run_migration.py sage_core/database/migrations/partition_memories_by_month.sql
+
+-- 1. 分区维护函数（memories 尚未分区时不做任何事）
+CREATE OR REPLACE FUNCTION sage_ensure_memory_partitions(
+    from_date date DEFAULT (now() AT TIME ZONE 'UTC')::date,
+    months_ahead integer DEFAULT 2
+)
+RETURNS integer AS $$
+DECLARE
+    month_start date := date_trunc('month', from_date)::date;
+    last_month date := (date_trunc('month', (now() AT TIME ZONE 'UTC')::date)
+                        + make_interval(months => months_ahead))::date;
+    partition_name text;
+    created integer := 0;
+BEGIN
+    IF NOT EXISTS (SELECT 1 FROM pg_class WHERE oid = to_regclass('memories') AND relkind = 'p') THEN
+        RETURN 0;
+    END IF;
+
+    WHILE month_start <= last_month LOOP
+        partition_name := 'memories_p' || to_char(month_start, 'YYYYMM');
+        IF to_regclass(partition_name) IS NULL THEN
+            BEGIN
+                EXECUTE format(
+                    'CREATE TABLE %I PARTITION OF memories FOR VALUES FROM (%L) TO (%L)',
+                    partition_name,
+                    to_char(month_start, 'YYYYMM'),
+                    to_char(month_start + interval '1 month', 'YYYYMM')
+                );
+                created := created + 1;
+            EXCEPTION WHEN duplicate_table THEN
+                -- 其他进程并发创建了同一分区
+                NULL;
+            END;
+        END IF;
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+
+    RETURN created;
+END;
+$$ LANGUAGE plpgsql;
+
+-- 2. 转换（单事务）
+BEGIN;
+
+LOCK TABLE memories IN EXCLUSIVE MODE;
+
+-- 分区键不能为空：补齐历史数据的时间窗口
+UPDATE memories
+SET time_window = to_char(created_at AT TIME ZONE 'UTC', 'YYYYMMDDHH24')
+WHERE time_window IS NULL;
+
+-- 记录原表的索引、触发器和依赖视图定义，转换后在分区表上重建
+CREATE TEMP TABLE sage_memories_ddl ON COMMIT DROP AS
+SELECT 1 AS step, c.relname::text AS name, pg_get_indexdef(i.indexrelid) AS ddl
+FROM pg_index i
+JOIN pg_class c ON c.oid = i.indexrelid
+WHERE i.indrelid = 'memories'::regclass AND NOT i.indisprimary
+UNION ALL
+SELECT 2, t.tgname::text, pg_get_triggerdef(t.oid)
+FROM pg_trigger t
+WHERE t.tgrelid = 'memories'::regclass AND NOT t.tgisinternal
+UNION ALL
+SELECT DISTINCT 3, v.oid::regclass::text,
+       'CREATE OR REPLACE VIEW ' || v.oid::regclass::text || ' AS ' || pg_get_viewdef(v.oid)
+FROM pg_depend d
+JOIN pg_rewrite r ON r.oid = d.objid
+JOIN pg_class v ON v.oid = r.ev_class
+WHERE d.classid = 'pg_rewrite'::regclass
+  AND d.refobjid = 'memories'::regclass
+  AND v.relkind = 'v';
+
+ALTER TABLE memories RENAME TO memories_unpartitioned;
+ALTER TABLE memories_unpartitioned RENAME CONSTRAINT memories_pkey TO memories_unpartitioned_pkey;
+
+-- 原表索引改名以释放名称，触发器移除（避免对旧表的写入继续维护 sessions 统计）
+DO $$
+DECLARE
+    r record;
+BEGIN
+    FOR r IN SELECT name FROM sage_memories_ddl WHERE step = 1 LOOP
+        EXECUTE format('ALTER INDEX %I RENAME TO %I', r.name, left(r.name, 50) || '_unpart');
+    END LOOP;
+    FOR r IN SELECT name FROM sage_memories_ddl WHERE step = 2 LOOP
+        EXECUTE format('DROP TRIGGER %I ON memories_unpartitioned', r.name);
+    END LOOP;
+END;
+$$;
+
+CREATE TABLE memories (
+    LIKE memories_unpartitioned INCLUDING DEFAULTS INCLUDING STORAGE INCLUDING COMMENTS
+) PARTITION BY RANGE (time_window);
+
+ALTER TABLE memories
+    ALTER COLUMN time_window SET NOT NULL,
+    ALTER COLUMN time_window SET DEFAULT to_char(CURRENT_TIMESTAMP AT TIME ZONE 'UTC', 'YYYYMMDDHH24');
+
+-- 覆盖全部历史月份及未来两个月
+SELECT sage_ensure_memory_partitions(
+    COALESCE(to_date(left(MIN(time_window), 6), 'YYYYMM'), (now() AT TIME ZONE 'UTC')::date)
+)
+FROM memories_unpartitioned;
+
+-- 先搬数据再建索引和触发器：批量构建索引更快，且不会重复计入 sessions 统计
+INSERT INTO memories SELECT * FROM memories_unpartitioned;
+
+ALTER TABLE memories ADD PRIMARY KEY (id, time_window);
+
+DO $$
+DECLARE
+    r record;
+BEGIN
+    FOR r IN SELECT ddl FROM sage_memories_ddl ORDER BY step, name LOOP
+        EXECUTE r.ddl;
+    END LOOP;
+END;
+$$;
+
+COMMIT;
+
+ANALYZE memories;
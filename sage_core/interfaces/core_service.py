@@ -4,7 +4,7 @@
 Sage Core Service Interface - 核心服务接口定义
 """
 from abc import ABC, abstractmethod
-from typing import Dict, List, Optional, Any
+from typing import AsyncIterator, Dict, List, Optional, Any
 from dataclasses import dataclass
 from datetime import datetime
 
@@ -30,6 +30,7 @@ class SearchOptions:
     session_id: Optional[str] = None
     date_from: Optional[datetime] = None
     date_to: Optional[datetime] = None
+    lean: bool = False  # 只返回正文片段与精简元数据，完整正文通过 get_many 获取
 
 
 @dataclass
@@ -75,6 +76,18 @@ class ISageService(ABC):
         """
         pass
     
+    @abstractmethod
+    async def save_memories(self, contents: List[MemoryContent]) -> List[Optional[str]]:
+        """批量保存记忆
+        
+        Args:
+            contents: 记忆内容列表
+            
+        Returns:
+            与输入一一对应的记忆ID，重复记录返回已存在的ID
+        """
+        pass
+    
     @abstractmethod
     async def search_memory(self, query: str, options: SearchOptions) -> List[Dict[str, Any]]:
         """搜索记忆
@@ -154,6 +167,19 @@ class ISageService(ABC):
         """
         pass
     
+    @abstractmethod
+    def iter_export_session(self, session_id: str, format: str = "jsonl") -> AsyncIterator[bytes]:
+        """流式导出会话（异步生成器，内存占用与会话大小无关）
+        
+        Args:
+            session_id: 会话ID
+            format: 导出格式 (jsonl, markdown)
+            
+        Yields:
+            导出数据块
+        """
+        pass
+    
     @abstractmethod
     async def get_status(self) -> Dict[str, Any]:
         """获取服务状态
@@ -96,9 +96,14 @@ class IMemoryProvider(ABC):
         pass
     
     @abstractmethod
-    async def list_sessions(self) -> List[Dict[str, Any]]:
-        """列出所有会话
+    async def list_sessions(self, limit: Optional[int] = None,
+                          offset: int = 0) -> List[Dict[str, Any]]:
+        """列出会话（按最近活跃时间倒序）
         
+        Args:
+            limit: 每页数量，None 表示不限
+            offset: 偏移量
+            
         Returns:
             会话列表
         """
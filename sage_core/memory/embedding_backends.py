@@ -0,0 +1,262 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Embedding Backends - 向量化后端
+TextVectorizer 负责分块、缓存、单飞与批量调度，一批文本的实际向量化交给后端：
+- siliconflow：SiliconFlow 云端 API（默认）
+- local：本地 CPU 推理（量化 ONNX 小模型，线程池执行），输出投影到配置的维度，无需外网
+按部署通过 EMBEDDING_BACKEND 选择，其他后端可用 register_embedding_backend 注册。
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Type
+
+import numpy as np
+
+from ..utils.http import get_http_client
+from ..utils.rate_limit import get_rate_limiter
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:  # 本地后端的可选依赖
+    onnxruntime = None
+    Tokenizer = None
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingBackend:
+    """向量化后端基类"""
+
+    # 向量来源，写入 memory_embeddings.source
+    source = 'api'
+
+    def __init__(self, model_name: str, dimension: int):
+        """初始化后端
+
+        Args:
+            model_name: 模型名称，同时作为 memory_embeddings 中的代际标识
+            dimension: 输出维度
+        """
+        self.model_name = model_name
+        self.dimension = dimension
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'EmbeddingBackend':
+        """按 embedding 配置创建后端"""
+        raise NotImplementedError
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        """向量化一批文本，返回 (len(texts), dimension) 数组；失败时抛出异常"""
+        raise NotImplementedError
+
+    async def close(self) -> None:
+        """释放后端资源"""
+
+
+class SiliconFlowBackend(EmbeddingBackend):
+    """SiliconFlow 云端 API 后端"""
+
+    source = 'api'
+
+    def __init__(self, model_name: str = "Qwen/Qwen3-Embedding-8B", dimension: int = 4096,
+                 api_key: Optional[str] = None, base_url: str = "https://api.siliconflow.cn/v1"):
+        super().__init__(model_name, dimension)
+        self.api_key = api_key or os.getenv('SILICONFLOW_API_KEY')
+        if not self.api_key:
+            raise ValueError("SILICONFLOW_API_KEY 环境变量未设置")
+        self.base_url = base_url
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'SiliconFlowBackend':
+        return cls(
+            model_name=config.get('model', 'Qwen/Qwen3-Embedding-8B'),
+            dimension=config.get('dimension', 4096)
+        )
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+        data = {
+            "model": self.model_name,
+            "input": texts,
+            "encoding_format": "float"
+        }
+
+        # 与重排、文本生成共用进程内的 SiliconFlow 限流（见 utils/rate_limit.py）
+        async with get_rate_limiter('embeddings').limit() as limiter:
+            response = await get_http_client().post(
+                f"{self.base_url}/embeddings",
+                headers=headers,
+                json=data,
+                timeout=30
+            )
+            limiter.record(response)
+        response.raise_for_status()
+
+        result = response.json()
+        # 按 index 对齐，不依赖返回顺序
+        items = sorted(result['data'], key=lambda item: item.get('index', 0))
+        if len(items) != len(texts):
+            raise ValueError(f"请求 {len(texts)} 条，但返回 {len(items)} 条向量")
+        return np.array([item['embedding'] for item in items], dtype=np.float32)
+
+
+class LocalOnnxBackend(EmbeddingBackend):
+    """本地 CPU 后端 - ONNX Runtime 推理
+
+    model_path 目录下需有 model.onnx（推荐量化版本，如 bge-small-zh 的 int8 导出）与 tokenizer.json。
+    推理在专用线程池中执行，不阻塞事件循环；模型输出维度与配置不同时，
+    用固定种子的高斯随机投影映射到配置的维度，各进程得到相同的投影矩阵。
+    """
+
+    source = 'local'
+
+    def __init__(self, model_path: str, dimension: int = 4096, model_name: Optional[str] = None,
+                 pooling: str = 'cls', max_length: int = 512, threads: int = 0,
+                 workers: int = 2, device: str = 'cpu', projection_seed: int = 0):
+        """初始化本地后端
+
+        Args:
+            model_path: 模型目录（model.onnx + tokenizer.json）
+            dimension: 输出维度
+            model_name: 代际标识（默认 local/<目录名>），与云端模型的向量不可混用
+            pooling: 池化方式，cls 或 mean
+            max_length: 单条文本的最大 token 数
+            threads: 每次推理的算子线程数（0 为 ONNX Runtime 默认）
+            workers: 同时进行的推理数
+            device: cpu 或 cuda（需 onnxruntime-gpu）
+            projection_seed: 投影矩阵的随机种子
+        """
+        if onnxruntime is None or Tokenizer is None:
+            raise ImportError("本地向量化后端需要安装 onnxruntime 与 tokenizers")
+        if pooling not in ('cls', 'mean'):
+            raise ValueError(f"不支持的池化方式：{pooling}")
+
+        path = Path(model_path).expanduser()
+        super().__init__(model_name or f"local/{path.name}", dimension)
+        self.model_path = path
+        self.pooling = pooling
+        self.max_length = max_length
+        self.threads = threads
+        self.device = device
+        self.projection_seed = projection_seed
+        self._executor = ThreadPoolExecutor(max_workers=max(workers, 1), thread_name_prefix='sage-embed')
+        self._session = None
+        self._tokenizer = None
+        self._projection: Optional[np.ndarray] = None
+        self._load_lock = threading.Lock()
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any]) -> 'LocalOnnxBackend':
+        if not config.get('local_model_path'):
+            raise ValueError("EMBEDDING_BACKEND=local 需要设置 EMBEDDING_LOCAL_MODEL_PATH")
+        return cls(
+            model_path=config['local_model_path'],
+            dimension=config.get('dimension', 4096),
+            model_name=config.get('local_model') or None,
+            pooling=config.get('local_pooling', 'cls'),
+            max_length=config.get('local_max_length', 512),
+            threads=config.get('local_threads', 0),
+            workers=config.get('max_concurrency', 2),
+            device=config.get('device', 'cpu')
+        )
+
+    def _load(self) -> None:
+        """首次推理时加载模型与分词器（在线程池中执行）"""
+        with self._load_lock:
+            if self._session is None:
+                self._load_locked()
+
+    def _load_locked(self) -> None:
+        model_file = self.model_path / 'model.onnx'
+        if not model_file.exists():
+            candidates = sorted(self.model_path.glob('*.onnx'))
+            if not candidates:
+                raise FileNotFoundError(f"{self.model_path} 下没有 .onnx 模型文件")
+            model_file = candidates[0]
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+        providers = ['CPUExecutionProvider']
+        if self.device == 'cuda' and 'CUDAExecutionProvider' in onnxruntime.get_available_providers():
+            providers.insert(0, 'CUDAExecutionProvider')
+
+        tokenizer = Tokenizer.from_file(str(self.model_path / 'tokenizer.json'))
+        tokenizer.enable_truncation(max_length=self.max_length)
+        tokenizer.enable_padding()
+
+        # 先设置分词器：其他线程以 _session 判断是否已加载
+        self._tokenizer = tokenizer
+        self._session = onnxruntime.InferenceSession(str(model_file), options, providers=providers)
+        logger.info(f"本地向量化模型已加载：{model_file}（{', '.join(providers)}）")
+
+    def _project(self, embeddings: np.ndarray) -> np.ndarray:
+        """映射到配置的维度并归一化"""
+        native = embeddings.shape[1]
+        if native != self.dimension:
+            if self._projection is None:
+                rng = np.random.default_rng(self.projection_seed)
+                self._projection = (rng.standard_normal((native, self.dimension))
+                                    / np.sqrt(self.dimension)).astype(np.float32)
+            embeddings = embeddings @ self._projection
+        norms = np.linalg.norm(embeddings, axis=1, keepdims=True)
+        return (embeddings / np.where(norms > 0, norms, 1)).astype(np.float32)
+
+    def _embed_sync(self, texts: List[str]) -> np.ndarray:
+        """分词、推理、池化与投影（在线程池中执行）"""
+        if self._session is None:
+            self._load()
+        encodings = self._tokenizer.encode_batch(texts)
+        input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+        attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+        feeds = {'input_ids': input_ids, 'attention_mask': attention_mask}
+        names = {i.name for i in self._session.get_inputs()}
+        if 'token_type_ids' in names:
+            feeds['token_type_ids'] = np.array([e.type_ids for e in encodings], dtype=np.int64)
+        feeds = {name: value for name, value in feeds.items() if name in names}
+
+        output = self._session.run(None, feeds)[0]
+        if output.ndim == 3:
+            if self.pooling == 'cls':
+                output = output[:, 0]
+            else:
+                mask = attention_mask[:, :, None].astype(np.float32)
+                output = (output * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1)
+        return self._project(np.asarray(output, dtype=np.float32))
+
+    async def embed(self, texts: List[str]) -> np.ndarray:
+        return await asyncio.get_running_loop().run_in_executor(self._executor, self._embed_sync, texts)
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+_BACKENDS: Dict[str, Type[EmbeddingBackend]] = {
+    'siliconflow': SiliconFlowBackend,
+    'local': LocalOnnxBackend
+}
+
+
+def register_embedding_backend(name: str, backend_cls: Type[EmbeddingBackend]) -> None:
+    """注册向量化后端，注册后可通过 EMBEDDING_BACKEND=<name> 选择"""
+    _BACKENDS[name] = backend_cls
+
+
+def create_embedding_backend(config: Dict[str, Any]) -> EmbeddingBackend:
+    """按 embedding 配置的 backend 字段创建后端"""
+    name = config.get('backend', 'siliconflow')
+    backend_cls = _BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"未知的向量化后端：{name}（可选：{', '.join(sorted(_BACKENDS))}）")
+    return backend_cls.from_config(config)
@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+EmbeddingCache - 按内容寻址的向量缓存
+键为 sha256(模型, 维度, 文本)，值为 float32 原始字节。磁盘层使用 SQLite（WAL 模式），
+MCP 服务与 hook 进程共用同一个文件；进程内另有一层小的 LRU 前置缓存。
+命中的文本不再调用远程向量化 API。
+"""
+import asyncio
+import hashlib
+import logging
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    """向量缓存 - 进程内 LRU + SQLite 磁盘 LRU"""
+
+    # 每写入多少条检查一次磁盘容量
+    _EVICT_EVERY = 100
+    # 单条 SQL 的参数个数上限（兼容 SQLITE_MAX_VARIABLE_NUMBER=999 的旧版本）
+    _QUERY_CHUNK = 500
+
+    def __init__(self, path: Optional[str] = None, max_entries: int = 20000,
+                 memory_entries: int = 256):
+        """初始化缓存
+
+        Args:
+            path: SQLite 文件路径（默认 ~/.sage/embedding_cache.db）
+            max_entries: 磁盘缓存条数上限，超出时淘汰最久未使用的条目
+            memory_entries: 进程内前置缓存条数
+        """
+        self.path = Path(path) if path else Path.home() / '.sage' / 'embedding_cache.db'
+        self.max_entries = max_entries
+        self.memory_entries = memory_entries
+        self._memory: OrderedDict = OrderedDict()
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "writes": 0
+        }
+
+    @staticmethod
+    def make_key(text: str, model: str, dimension: int) -> bytes:
+        """内容寻址键：模型、维度与文本共同决定"""
+        return hashlib.sha256(f"{model}\0{dimension}\0{text}".encode('utf-8')).digest()
+
+    def _connect(self) -> sqlite3.Connection:
+        """打开（必要时创建）缓存库；多进程通过 WAL 与 busy_timeout 并发访问"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS embeddings (
+                    key BLOB PRIMARY KEY,
+                    dimension INTEGER NOT NULL,
+                    vector BLOB NOT NULL,
+                    last_used INTEGER NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_embeddings_last_used ON embeddings (last_used)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+
+    def _remember(self, key: bytes, vector: np.ndarray) -> None:
+        """写入进程内前置缓存"""
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def get_many_sync(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """批量查询，返回命中的 键 -> 向量"""
+        found: Dict[bytes, np.ndarray] = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    found[key] = vector
+                    self.stats["memory_hits"] += 1
+                else:
+                    missing.append(key)
+
+            if missing:
+                conn = self._connect()
+                rows = []
+                for start in range(0, len(missing), self._QUERY_CHUNK):
+                    chunk = missing[start:start + self._QUERY_CHUNK]
+                    rows.extend(conn.execute(
+                        f"SELECT key, dimension, vector FROM embeddings WHERE key IN ({','.join('?' * len(chunk))})",
+                        chunk
+                    ).fetchall())
+                for key, dimension, blob in rows:
+                    vector = np.frombuffer(blob, dtype=np.float32, count=dimension).copy()
+                    found[key] = vector
+                    self._remember(key, vector)
+                self.stats["disk_hits"] += len(rows)
+                self.stats["misses"] += len(missing) - len(rows)
+
+                if rows:
+                    conn.executemany(
+                        'UPDATE embeddings SET last_used = ? WHERE key = ?',
+                        [(int(time.time()), key) for key, _, _ in rows]
+                    )
+                    conn.commit()
+        return found
+
+    def put_many_sync(self, items: Dict[bytes, np.ndarray]) -> None:
+        """批量写入"""
+        if not items:
+            return
+        now = int(time.time())
+        with self._lock:
+            conn = self._connect()
+            conn.executemany(
+                'INSERT OR REPLACE INTO embeddings (key, dimension, vector, last_used) VALUES (?, ?, ?, ?)',
+                [
+                    (key, int(vector.shape[0]), np.asarray(vector, dtype=np.float32).tobytes(), now)
+                    for key, vector in items.items()
+                ]
+            )
+            conn.commit()
+            for key, vector in items.items():
+                self._remember(key, vector)
+            self.stats["writes"] += len(items)
+
+            self._puts_since_evict += len(items)
+            if self._puts_since_evict >= self._EVICT_EVERY:
+                self._puts_since_evict = 0
+                self._evict(conn)
+
+    def _evict(self, conn: sqlite3.Connection) -> None:
+        """超出容量时按 last_used 淘汰"""
+        count = conn.execute('SELECT COUNT(*) FROM embeddings').fetchone()[0]
+        overflow = count - self.max_entries
+        if overflow > 0:
+            conn.execute(
+                'DELETE FROM embeddings WHERE key IN '
+                '(SELECT key FROM embeddings ORDER BY last_used LIMIT ?)',
+                (overflow,)
+            )
+            conn.commit()
+            logger.info(f"[向量缓存] 淘汰 {overflow} 条最久未使用的向量")
+
+    async def get_many(self, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """异步批量查询；进程内全部命中时不进入线程池"""
+        if all(key in self._memory for key in keys):
+            return self.get_many_sync(keys)
+        return await asyncio.to_thread(self.get_many_sync, keys)
+
+    async def put_many(self, items: Dict[bytes, np.ndarray]) -> None:
+        """异步批量写入"""
+        await asyncio.to_thread(self.put_many_sync, items)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self._memory)
+        }
+
+    def close(self) -> None:
+        """关闭磁盘连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_embedding_cache(config: Dict[str, Any]) -> Optional[EmbeddingCache]:
+    """按 embedding 配置创建缓存；未启用时返回 None"""
+    if not config.get('cache_enabled', True):
+        return None
+    return EmbeddingCache(
+        path=config.get('cache_path') or None,
+        max_entries=config.get('cache_max_entries', 20000),
+        memory_entries=config.get('cache_memory_entries', 256)
+    )
@@ -3,16 +3,17 @@
 """
 Memory Manager - 记忆管理器
 """
+import asyncio
 import uuid
-from typing import List, Dict, Any, Optional
-from datetime import datetime
+from typing import AsyncIterator, List, Dict, Any, Optional, Union
+from datetime import datetime, timezone
 import json
 import logging
 
 from ..interfaces import MemoryContent, SearchOptions
 from ..database import DatabaseConnection
 from ..database.transaction import TransactionManager
-from .storage import MemoryStorage
+from .storage import MemoryStorage, record_to_memory
 from .vectorizer import TextVectorizer
 from ..resilience import retry, circuit_breaker, CircuitBreakerOpenError
 
@@ -24,28 +25,67 @@ class MemoryManager:
     
     def __init__(self, db_connection: DatabaseConnection, 
                  vectorizer: TextVectorizer,
-                 transaction_manager: Optional[TransactionManager] = None):
+                 transaction_manager: Optional[TransactionManager] = None,
+                 search_config: Optional[Dict[str, Any]] = None):
         """初始化记忆管理器
         
         Args:
             db_connection: 数据库连接
             vectorizer: 向量化器
             transaction_manager: 事务管理器（可选）
+            search_config: 向量检索配置（可选）
         """
-        self.storage = MemoryStorage(db_connection, transaction_manager)
+        # 向量按模型名存放在 memory_embeddings，写入与检索都使用当前向量化器的模型
+        self.storage = MemoryStorage(db_connection, transaction_manager, search_config,
+                                     embedding_model=vectorizer.model_name,
+                                     embedding_version=getattr(vectorizer, 'version', 1))
         self.vectorizer = vectorizer
         self.transaction_manager = transaction_manager
         self.current_session_id: Optional[str] = None
+        # 单飞：(文本, 是否返回来源) -> 在途的向量化任务
+        self._vectorize_inflight: Dict[tuple, asyncio.Future] = {}
     
     async def initialize(self) -> None:
         """初始化管理器"""
         await self.storage.connect()
         await self.vectorizer.initialize()
+        await self._copy_legacy_embeddings()
+        await self._check_embedding_generation()
         
         # 创建默认会话
         self.current_session_id = str(uuid.uuid4())
         logger.info(f"记忆管理器初始化完成，会话ID：{self.current_session_id}")
     
+    async def _copy_legacy_embeddings(self) -> None:
+        """尚未执行 add_memory_embeddings.sql 的存量库：把 memories.embedding 复制到向量表"""
+        try:
+            copied = await self.storage.copy_legacy_embeddings(self.vectorizer.get_dimension())
+        except Exception as e:
+            logger.warning(f"复制存量向量失败：{e}")
+            return
+        if copied:
+            logger.info(f"已将 {copied} 条存量向量复制到 memory_embeddings，"
+                        f"可执行 add_memory_embeddings.sql 删除 memories 上的旧向量列")
+    
+    async def _check_embedding_generation(self) -> None:
+        """登记当前向量代际；新模型的重新向量化未完成时提示检索结果不完整"""
+        try:
+            generation = await self.storage.register_embedding_generation(self.vectorizer.get_dimension())
+        except Exception as e:
+            logger.warning(f"检查向量代际失败：{e}")
+            return
+        
+        if generation['dimension'] != self.vectorizer.get_dimension():
+            logger.error(
+                f"向量模型 {generation['model']} 已登记的维度为 {generation['dimension']}，"
+                f"与配置的 {self.vectorizer.get_dimension()} 不一致"
+            )
+        if generation['status'] != 'ready':
+            logger.warning(
+                f"向量模型 {generation['model']} 的代际状态为 {generation['status']}，历史记忆尚未完成重新向量化，"
+                f"检索结果可能不完整，请运行 scripts/reembed_memories.py"
+            )
+    
     async def save(self, content: MemoryContent) -> str:
         """保存记忆 - 支持事务
         
@@ -67,7 +107,7 @@ class MemoryManager:
             try:
                 # 合并用户输入和助手回复进行向量化
                 combined_text = f"{content.user_input}\n{content.assistant_response}"
-                embedding = await self._vectorize_with_protection(combined_text)
+                embedding, source = await self._vectorize_with_protection(combined_text, with_source=True)
                 
                 # 使用当前会话ID（如果内容中没有指定）
                 session_id = content.session_id or self.current_session_id
@@ -77,6 +117,7 @@ class MemoryManager:
                     user_input=content.user_input,
                     assistant_response=content.assistant_response,
                     embedding=embedding,
+                    embedding_source=source,
                     metadata=content.metadata,
                     session_id=session_id,
                     is_agent_report=content.is_agent_report,  # 添加
@@ -101,7 +142,7 @@ class MemoryManager:
                 async with self.transaction_manager.transaction() as conn:
                     # 合并用户输入和助手回复进行向量化
                     combined_text = f"{content.user_input}\n{content.assistant_response}"
-                    embedding = await self._vectorize_with_protection(combined_text)
+                    embedding, source = await self._vectorize_with_protection(combined_text, with_source=True)
                     
                     # 使用当前会话ID（如果内容中没有指定）
                     session_id = content.session_id or self.current_session_id
@@ -116,6 +157,7 @@ class MemoryManager:
                         user_input=content.user_input,
                         assistant_response=content.assistant_response,
                         embedding=embedding,
+                        embedding_source=source,
                         metadata=content.metadata,
                         session_id=session_id,
                         is_agent_report=content.is_agent_report,
@@ -128,7 +170,7 @@ class MemoryManager:
             else:
                 # 降级到无事务模式
                 combined_text = f"{content.user_input}\n{content.assistant_response}"
-                embedding = await self._vectorize_with_protection(combined_text)
+                embedding, source = await self._vectorize_with_protection(combined_text, with_source=True)
                 
                 session_id = content.session_id or self.current_session_id
                 
@@ -136,6 +178,7 @@ class MemoryManager:
                     user_input=content.user_input,
                     assistant_response=content.assistant_response,
                     embedding=embedding,
+                    embedding_source=source,
                     metadata=content.metadata,
                     session_id=session_id,
                     is_agent_report=content.is_agent_report,
@@ -152,11 +195,109 @@ class MemoryManager:
             logger.error(f"保存记忆失败：{e}")
             raise
     
+    async def save_many(self, contents: List[MemoryContent], batch_size: int = 32) -> List[Optional[str]]:
+        """批量保存记忆 - 分批向量化后一次性 COPY 写入
+        
+        Args:
+            contents: 记忆内容列表
+            batch_size: 每次向量化请求的文本数量
+        
+        Returns:
+            与输入一一对应的记忆ID
+        """
+        if not contents:
+            return []
+        
+        embeddings = []
+        sources = []
+        for start in range(0, len(contents), batch_size):
+            batch = contents[start:start + batch_size]
+            texts = [f"{c.user_input}\n{c.assistant_response}" for c in batch]
+            batch_embeddings, batch_sources = await self._vectorize_with_protection(texts, with_source=True)
+            embeddings.extend(batch_embeddings)
+            sources.extend(batch_sources)
+            logger.info(f"批量向量化进度：{min(start + batch_size, len(contents))}/{len(contents)}")
+        
+        records = [
+            {
+                'user_input': content.user_input,
+                'assistant_response': content.assistant_response,
+                'embedding': embedding,
+                'embedding_source': source,
+                'metadata': content.metadata,
+                'session_id': content.session_id or self.current_session_id,
+                'is_agent_report': content.is_agent_report,
+                'agent_metadata': content.agent_metadata
+            }
+            for content, embedding, source in zip(contents, embeddings, sources)
+        ]
+        
+        return await self.storage.save_many(records)
+    
+    async def reembed_fallback(self, batch_size: int = 32) -> int:
+        """重新向量化 API 故障期间写入降级向量的记忆
+        
+        分批取出 source = 'fallback' 的向量，重新请求 API 后替换；某一批仍有降级结果时
+        说明 API 尚未恢复，停止本轮。
+        
+        Returns:
+            替换的向量条数
+        """
+        total = 0
+        while True:
+            rows = await self.storage.fetch_fallback_embeddings(batch_size)
+            if not rows:
+                break
+            
+            # 与保存时的向量化文本保持一致
+            texts = [f"{row['user_input']}\n{row['assistant_response']}" for row in rows]
+            embeddings, sources = await self.vectorizer.vectorize_with_source(texts)
+            repaired = [
+                (row['memory_id'], embedding, source)
+                for row, embedding, source in zip(rows, embeddings, sources)
+                if source != self.vectorizer.SOURCE_FALLBACK
+            ]
+            await self.storage.replace_fallback_embeddings(repaired)
+            total += len(repaired)
+            
+            if len(repaired) < len(rows):
+                logger.warning(f"向量化 API 仍不可用，{len(rows) - len(repaired)} 条降级向量留待下次重试")
+                break
+        
+        if total:
+            logger.info(f"已重新向量化 {total} 条降级向量")
+        return total
+    
+    async def _vectorize_with_protection(self, text: Union[str, List[str]], with_source: bool = False):
+        """带保护的向量化操作；并发的相同文本共享同一次调用（含重试与断路器判定）
+        
+        with_source=True 时返回 (向量, 向量来源)，保存时写入 memory_embeddings.source
+        """
+        if not isinstance(text, str):
+            return await self._vectorize_protected(text, with_source)
+        
+        key = (text, with_source)
+        loop = asyncio.get_running_loop()
+        future = self._vectorize_inflight.get(key)
+        if future is None or future.get_loop() is not loop:
+            future = loop.create_task(self._vectorize_protected(text, with_source))
+            self._vectorize_inflight[key] = future
+            
+            def release(done: asyncio.Future) -> None:
+                if self._vectorize_inflight.get(key) is done:
+                    del self._vectorize_inflight[key]
+            
+            future.add_done_callback(release)
+        # shield：调用方被取消时不取消其他调用方共享的任务
+        return await asyncio.shield(future)
+    
     @retry(max_attempts=3, initial_delay=0.5)
     @circuit_breaker("vectorizer", failure_threshold=5, recovery_timeout=60)
-    async def _vectorize_with_protection(self, text: str) -> List[float]:
-        """带保护的向量化操作"""
+    async def _vectorize_protected(self, text: Union[str, List[str]], with_source: bool = False):
+        """向量化操作 - 带重试和断路器保护"""
         try:
+            if with_source:
+                return await self.vectorizer.vectorize_with_source(text)
             return await self.vectorizer.vectorize(text)
         except CircuitBreakerOpenError:
             logger.error("向量化断路器已打开，拒绝请求")
@@ -180,13 +321,14 @@ class MemoryManager:
         try:
             results = []
             
-            if options.strategy == "semantic" or options.strategy == "default":
+            if options.strategy == "semantic":
                 # 语义搜索
                 query_embedding = await self._vectorize_with_protection(query)
                 semantic_results = await self.storage.search(
                     query_embedding=query_embedding,
                     limit=options.limit,
-                    session_id=options.session_id
+                    session_id=options.session_id,
+                    lean=options.lean
                 )
                 results.extend(semantic_results)
             
@@ -201,26 +343,19 @@ class MemoryManager:
                     # 获取所有最近的记忆
                     recent_results = await self._get_recent_memories(options.limit)
                 results.extend(recent_results)
+                results.sort(key=lambda x: x.get('created_at', ''), reverse=True)
             
             if options.strategy == "default":
-                # 默认策略：结合语义和文本搜索
-                text_results = await self.storage.search_by_text(
-                    query=query,
-                    limit=options.limit // 2,  # 一半配额给文本搜索
-                    session_id=options.session_id
+                # 默认策略：语义与文本候选在数据库内按 RRF 融合，结果已按融合得分排序
+                query_embedding = await self._vectorize_with_protection(query)
+                hybrid_results = await self.storage.search_hybrid(
+                    query_embedding=query_embedding,
+                    query_text=query,
+                    limit=options.limit,
+                    session_id=options.session_id,
+                    lean=options.lean
                 )
-                
-                # 合并结果，去重
-                existing_ids = {r['id'] for r in results}
-                for result in text_results:
-                    if result['id'] not in existing_ids:
-                        results.append(result)
-            
-            # 按相似度或时间排序
-            if options.strategy == "semantic":
-                results.sort(key=lambda x: x.get('similarity', 0), reverse=True)
-            else:
-                results.sort(key=lambda x: x.get('created_at', ''), reverse=True)
+                results.extend(hybrid_results)
             
             # 限制返回数量
             return results[:options.limit]
@@ -244,10 +379,12 @@ class MemoryManager:
         """
         try:
             # 搜索相关记忆 - 使用全局搜索而不限制会话
+            # 上下文只展示正文前若干字符，使用精简投影避免传输完整对话
             options = SearchOptions(
                 limit=max_results,
                 strategy="default",
-                session_id=None  # 修改为None以搜索所有会话的记忆
+                session_id=None,  # 修改为None以搜索所有会话的记忆
+                lean=True
             )
             
             memories = await self.search(query, options)
@@ -255,13 +392,26 @@ class MemoryManager:
             if not memories:
                 return "没有找到相关的历史记忆。"
             
+            # 工具执行结果会完整展示，仅对这部分被截断的记录批量获取完整回复
+            hydrate_ids = [
+                m['id'] for m in memories
+                if m.get('truncated') and not m.get('user_input', '').strip()
+                and m.get('assistant_response', '').startswith("Tool execution result")
+            ]
+            if hydrate_ids:
+                full_bodies = await self.storage.get_many(hydrate_ids, fields=['assistant_response'])
+                bodies = {m['id']: m['assistant_response'] for m in full_bodies}
+                for memory in memories:
+                    if memory['id'] in bodies:
+                        memory['assistant_response'] = bodies[memory['id']]
+            
             # 格式化上下文 - 增强版，包含更多有价值的信息
             context_parts = ["相关历史记忆：\n"]
             
             for i, memory in enumerate(memories, 1):
                 context_parts.append(f"\n[记忆 {i}]")
                 context_parts.append(f"时间：{memory['created_at']}")
-                if 'similarity' in memory:
+                if memory.get('similarity') is not None:
                     context_parts.append(f"相关度：{memory['similarity']:.2f}")
                 
                 # 提取元数据中的有用信息
@@ -279,12 +429,12 @@ class MemoryManager:
                     if metadata.get('tool_call_count'):
                         context_parts.append(f"工具调用：{metadata['tool_call_count']}次")
                         
-                    # 显示具体的工具调用（如果有）
+                    # 显示具体的工具调用（如果有；精简投影只带 tool_names）
                     tool_calls = metadata.get('tool_calls', [])
-                    if tool_calls:
-                        tool_names = [tc.get('tool_name', 'unknown') for tc in tool_calls[:3]]  # 最多显示3个
-                        if tool_names:
-                            context_parts.append(f"使用工具：{', '.join(tool_names)}")
+                    tool_names = metadata.get('tool_names') or [tc.get('tool_name', 'unknown') for tc in tool_calls]
+                    if tool_names:
+                        tool_names = [str(name) for name in tool_names[:3]]  # 最多显示3个
+                        context_parts.append(f"使用工具：{', '.join(tool_names)}")
                     
                     # 显示处理格式
                     if metadata.get('format'):
@@ -352,9 +502,6 @@ class MemoryManager:
         # 获取会话统计
         stats = await self.storage.get_statistics(target_session)
         
-        # 获取会话记忆数量
-        memories = await self.storage.get_session_memories(target_session, limit=1)
-        
         return {
             'session_id': target_session,
             'is_current': target_session == self.current_session_id,
@@ -363,9 +510,10 @@ class MemoryManager:
             'last_memory': stats['last_memory']
         }
     
-    async def list_sessions(self) -> List[Dict[str, Any]]:
-        """列出所有会话"""
-        sessions = await self.storage.list_sessions()
+    async def list_sessions(self, limit: Optional[int] = None,
+                          offset: int = 0) -> List[Dict[str, Any]]:
+        """列出会话（分页）"""
+        sessions = await self.storage.list_sessions(limit=limit, offset=offset)
         
         # 标记当前会话
         for session in sessions:
@@ -374,7 +522,9 @@ class MemoryManager:
         return sessions
     
     async def export_session(self, session_id: str, format: str = "json") -> Any:
-        """导出会话数据
+        """导出会话数据（记忆按时间正序）
+        
+        一次性返回完整文档，内存占用随会话大小增长；大会话请使用 iter_export_session。
         
         Args:
             session_id: 会话ID
@@ -383,10 +533,8 @@ class MemoryManager:
         Returns:
             导出的数据
         """
-        # 获取会话的所有记忆
-        memories = await self.storage.get_session_memories(session_id)
-        
         if format == "json":
+            memories = [memory async for memory in self.storage.iter_session_memories(session_id)]
             return {
                 'session_id': session_id,
                 'exported_at': datetime.utcnow().isoformat(),
@@ -395,51 +543,77 @@ class MemoryManager:
             }
         
         elif format == "markdown":
-            lines = [
-                f"# Sage 会话导出",
-                f"\n会话ID：{session_id}",
-                f"导出时间：{datetime.utcnow().isoformat()}",
-                f"记忆数量：{len(memories)}",
-                "\n---\n"
-            ]
-            
-            for memory in memories:
-                lines.append(f"## {memory['created_at']}")
-                lines.append(f"\n**用户：** {memory['user_input']}")
-                lines.append(f"\n**助手：** {memory['assistant_response']}")
-                if memory.get('metadata'):
-                    lines.append(f"\n**元数据：** {memory['metadata']}")
-                lines.append("\n---\n")
-            
-            return "\n".join(lines)
+            return "".join([chunk async for chunk in self.iter_export_session(session_id, format)])
         
         else:
             raise ValueError(f"不支持的导出格式：{format}")
     
+    async def iter_export_session(self, session_id: str, format: str = "jsonl",
+                                  batch_size: int = 500) -> AsyncIterator[str]:
+        """流式导出会话数据
+        
+        基于 storage.iter_session_memories 逐页读取并逐块产出文本，
+        内存占用与会话大小无关，适合直接写入文件或分块响应。
+        
+        Args:
+            session_id: 会话ID
+            format: 导出格式 (jsonl：每行一条记忆 / markdown)
+            batch_size: 每页读取的记忆数
+            
+        Yields:
+            文本块
+        """
+        if format not in ("jsonl", "markdown"):
+            raise ValueError(f"不支持的流式导出格式：{format}")
+        
+        memories = self.storage.iter_session_memories(session_id, batch_size)
+        
+        if format == "jsonl":
+            async for memory in memories:
+                yield json.dumps(memory, ensure_ascii=False) + "\n"
+            return
+        
+        # 记忆数量取自 sessions 统计，无需预先遍历
+        stats = await self.storage.get_statistics(session_id)
+        yield "\n".join([
+            f"# Sage 会话导出",
+            f"\n会话ID：{session_id}",
+            f"导出时间：{datetime.utcnow().isoformat()}",
+            f"记忆数量：{stats['total_memories']}",
+            "\n---\n"
+        ])
+        
+        async for memory in memories:
+            lines = [
+                f"## {memory['created_at']}",
+                f"\n**用户：** {memory['user_input']}",
+                f"\n**助手：** {memory['assistant_response']}"
+            ]
+            if memory.get('metadata'):
+                lines.append(f"\n**元数据：** {memory['metadata']}")
+            lines.append("\n---\n")
+            yield "\n" + "\n".join(lines)
+    
     async def _get_recent_memories(self, limit: int) -> List[Dict[str, Any]]:
-        """获取最近的记忆（跨会话）"""
+        """获取最近的记忆（跨会话）
+        
+        先按分区键 time_window 限定在当月分区内取数，不足 limit 条时再扫描全部分区。
+        """
         query = '''
             SELECT id, session_id, user_input, assistant_response, 
                    metadata, created_at
             FROM memories
+            WHERE time_window >= $2
             ORDER BY created_at DESC
             LIMIT $1
         '''
         
-        results = await self.storage.db.fetch(query, limit)
-        
-        memories = []
-        for row in results:
-            memories.append({
-                'id': str(row['id']),
-                'session_id': row['session_id'],
-                'user_input': row['user_input'],
-                'assistant_response': row['assistant_response'],
-                'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                'created_at': row['created_at'].isoformat()
-            })
+        current_month = datetime.now(timezone.utc).strftime("%Y%m")
+        results = await self.storage.db.fetch(query, limit, current_month)
+        if len(results) < limit:
+            results = await self.storage.db.fetch(query, limit, '')
         
-        return memories
+        return [record_to_memory(row) for row in results]
     
     async def cleanup(self) -> None:
         """清理资源"""
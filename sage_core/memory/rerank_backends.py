@@ -0,0 +1,325 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Rerank Backends - 重排后端
+TextReranker 负责分数缓存与降级顺序，一组候选的实际打分交给后端：
+- siliconflow：SiliconFlow 云端重排 API（默认）
+- local：本地 CPU 交叉编码器（ONNX 模型，线程池中分批推理，超过延迟上限即放弃）
+- embedding：查询与候选的向量余弦相似度；查询向量在检索时已算过，通常直接命中向量缓存
+通过 SAGE_RERANKER_BACKEND 选择主后端，SAGE_RERANKER_FALLBACK 指定主后端失败时依次尝试的后端，
+其他后端可用 register_rerank_backend 注册。
+"""
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+import numpy as np
+
+from ..utils.http import get_http_client
+from ..utils.rate_limit import get_rate_limiter
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+except ImportError:  # 本地后端的可选依赖
+    onnxruntime = None
+    Tokenizer = None
+
+logger = logging.getLogger(__name__)
+
+
+class RerankBackend:
+    """重排后端基类"""
+
+    def __init__(self, model_name: str):
+        """初始化后端
+
+        Args:
+            model_name: 模型名称，同时作为分数缓存键的一部分
+        """
+        self.model_name = model_name
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], vectorizer: Any = None) -> 'RerankBackend':
+        """按 reranker 配置创建后端"""
+        raise NotImplementedError
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        """为每个文档打分（越大越相关）；失败时抛出异常"""
+        raise NotImplementedError
+
+    async def score_for_cache(self, query: str, documents: List[str]) -> Tuple[List[float], bool]:
+        """打分并返回分数能否写入缓存；降级得到的分数不应在缓存中顶替正常分数"""
+        return await self.score(query, documents), True
+
+    async def close(self) -> None:
+        """释放后端资源"""
+
+
+class SiliconFlowRerankBackend(RerankBackend):
+    """SiliconFlow 云端重排 API 后端"""
+
+    def __init__(self, model_name: str = "Qwen/Qwen3-Reranker-8B", api_key: Optional[str] = None,
+                 base_url: str = "https://api.siliconflow.cn/v1"):
+        super().__init__(model_name)
+        self.api_key = api_key or os.getenv('SILICONFLOW_API_KEY')
+        if not self.api_key:
+            raise ValueError("SILICONFLOW_API_KEY 未设置")
+        self.base_url = base_url
+        self.headers = {
+            "Authorization": f"Bearer {self.api_key}",
+            "Content-Type": "application/json"
+        }
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], vectorizer: Any = None) -> 'SiliconFlowRerankBackend':
+        return cls(model_name=config.get('model', 'Qwen/Qwen3-Reranker-8B'))
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        # 构建请求
+        payload = {
+            "model": self.model_name,
+            "query": query,
+            "documents": documents,
+            "return_documents": False,
+            "top_n": len(documents)  # 返回所有文档的分数
+        }
+
+        # 发送请求（共享连接池，30秒超时，可随调用方取消）
+        async with get_rate_limiter('rerank').limit() as limiter:
+            response = await get_http_client().post(
+                f"{self.base_url}/rerank",
+                json=payload,
+                headers=self.headers,
+                timeout=30
+            )
+            limiter.record(response)
+
+        if response.status_code != 200:
+            raise Exception(f"API 调用失败：{response.status_code} - {response.text}")
+
+        result = response.json()
+        if "results" not in result:
+            raise Exception(f"API 返回格式错误：{result}")
+
+        # 按文档顺序返回分数
+        scores = [0.0] * len(documents)
+        for item in result["results"]:
+            idx = item.get("index", 0)
+            if 0 <= idx < len(scores):
+                scores[idx] = item.get("relevance_score", 0.0)
+        return scores
+
+
+class LocalCrossEncoderBackend(RerankBackend):
+    """本地 CPU 交叉编码器 - ONNX Runtime 推理
+
+    model_path 目录下需有 model.onnx（推荐量化版本，如 bge-reranker-base 的 int8 导出）与 tokenizer.json。
+    (查询, 文档) 成对编码后分批推理，输出 logit 经 sigmoid 映射到 0~1。
+    模型在构造时即于后台线程加载，加载耗时不计入延迟上限，加载完成前的打分直接失败并降级。
+    推理在专用线程池中执行，只在有空闲线程时提交，不在队列中等待；单次打分超过 timeout 秒时
+    抛出 TimeoutError，被放弃的推理继续占用其线程直到完成，期间空闲线程不足则直接失败，由调用方降级。
+    """
+
+    def __init__(self, model_path: str, model_name: Optional[str] = None, max_length: int = 512,
+                 batch_size: int = 16, threads: int = 0, workers: int = 2, timeout: float = 2.0):
+        """初始化本地后端
+
+        Args:
+            model_path: 模型目录（model.onnx + tokenizer.json）
+            model_name: 缓存标识（默认 local/<目录名>）
+            max_length: 单个 (查询, 文档) 对的最大 token 数
+            batch_size: 每次推理的文档数
+            threads: 每次推理的算子线程数（0 为 ONNX Runtime 默认）
+            workers: 推理线程数（含被放弃、仍在运行的推理）
+            timeout: 单次打分的延迟上限（秒）
+        """
+        if onnxruntime is None or Tokenizer is None:
+            raise ImportError("本地重排后端需要安装 onnxruntime 与 tokenizers")
+
+        path = Path(model_path).expanduser()
+        super().__init__(model_name or f"local/{path.name}")
+        self.model_path = path
+        self.max_length = max_length
+        self.batch_size = max(batch_size, 1)
+        self.threads = threads
+        self.timeout = timeout
+        self.workers = max(workers, 1)
+        self._executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='sage-rerank')
+        self._session = None
+        self._tokenizer = None
+        self._running = 0
+        self._running_lock = threading.Lock()
+        # 后台加载模型；加载期间占用一个推理线程
+        self._loading = self._executor.submit(self._load)
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], vectorizer: Any = None) -> 'LocalCrossEncoderBackend':
+        if not config.get('local_model_path'):
+            raise ValueError("本地重排后端需要设置 SAGE_RERANKER_LOCAL_MODEL_PATH")
+        return cls(
+            model_path=config['local_model_path'],
+            model_name=config.get('local_model') or None,
+            max_length=config.get('local_max_length', 512),
+            batch_size=config.get('local_batch_size', 16),
+            threads=config.get('local_threads', 0),
+            timeout=config.get('local_timeout_ms', 2000) / 1000
+        )
+
+    def _load(self) -> None:
+        """加载模型与分词器（构造时提交到线程池）"""
+        model_file = self.model_path / 'model.onnx'
+        if not model_file.exists():
+            candidates = sorted(self.model_path.glob('*.onnx'))
+            if not candidates:
+                raise FileNotFoundError(f"{self.model_path} 下没有 .onnx 模型文件")
+            model_file = candidates[0]
+
+        options = onnxruntime.SessionOptions()
+        options.graph_optimization_level = onnxruntime.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if self.threads:
+            options.intra_op_num_threads = self.threads
+
+        tokenizer = Tokenizer.from_file(str(self.model_path / 'tokenizer.json'))
+        tokenizer.enable_truncation(max_length=self.max_length)
+        tokenizer.enable_padding()
+
+        self._tokenizer = tokenizer
+        self._session = onnxruntime.InferenceSession(
+            str(model_file), options, providers=['CPUExecutionProvider']
+        )
+        logger.info(f"本地重排模型已加载：{model_file}")
+
+    def _score_batch(self, query: str, documents: List[str]) -> np.ndarray:
+        """一批 (查询, 文档) 对的推理"""
+        encodings = self._tokenizer.encode_batch([(query, doc) for doc in documents])
+        feeds = {
+            'input_ids': np.array([e.ids for e in encodings], dtype=np.int64),
+            'attention_mask': np.array([e.attention_mask for e in encodings], dtype=np.int64),
+            'token_type_ids': np.array([e.type_ids for e in encodings], dtype=np.int64)
+        }
+        names = {i.name for i in self._session.get_inputs()}
+        logits = np.asarray(self._session.run(None, {k: v for k, v in feeds.items() if k in names})[0],
+                            dtype=np.float32)
+        if logits.ndim == 2 and logits.shape[1] == 2:
+            # 二分类输出取“相关”一类的 logit 差
+            logits = logits[:, 1] - logits[:, 0]
+        return 1 / (1 + np.exp(-logits.reshape(len(documents))))
+
+    def _score_sync(self, query: str, documents: List[str]) -> List[float]:
+        """分批打分（在线程池中执行）"""
+        scores = [
+            self._score_batch(query, documents[start:start + self.batch_size])
+            for start in range(0, len(documents), self.batch_size)
+        ]
+        return np.concatenate(scores).tolist() if scores else []
+
+    def _release(self, future) -> None:
+        with self._running_lock:
+            self._running -= 1
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        if not self._loading.done():
+            raise RuntimeError("本地重排模型仍在加载")
+        self._loading.result()  # 加载失败时抛出原异常
+
+        # 没有空闲线程（被放弃的推理仍在运行）时直接失败，避免排队等待计入延迟上限
+        with self._running_lock:
+            if self._running >= self.workers:
+                raise RuntimeError("本地重排繁忙：推理线程均被占用")
+            self._running += 1
+        future = self._executor.submit(self._score_sync, query, documents)
+        future.add_done_callback(self._release)
+        try:
+            return await asyncio.wait_for(asyncio.wrap_future(future), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            raise TimeoutError(f"本地重排超过 {self.timeout:.1f} 秒（{len(documents)} 个文档）")
+
+    async def close(self) -> None:
+        self._executor.shutdown(wait=False)
+
+
+class EmbeddingSimilarityBackend(RerankBackend):
+    """向量余弦相似度后端 - 复用 TextVectorizer 及其向量缓存
+
+    检索时已为查询算过向量，这里通常直接命中缓存；候选片段按需向量化。
+    API 不可用时向量化器返回字符 n-gram 哈希向量，对中文同样有效；
+    为避免在不同向量空间之间比较，只要有一个文本使用了降级向量，就全部改用哈希向量打分。
+    向量化超过 timeout 秒时不再等待（向量化在后台继续并写入缓存），本次直接用哈希向量打分。
+    哈希向量的分数只是临时结果，不写入重排分数缓存。
+    """
+
+    def __init__(self, vectorizer: Any, timeout: float = 1.0):
+        """初始化后端
+
+        Args:
+            vectorizer: 文本向量化器
+            timeout: 等待向量化的上限（秒）
+        """
+        super().__init__(f"cosine/{vectorizer.model_name}")
+        self.vectorizer = vectorizer
+        self.timeout = timeout
+
+    @classmethod
+    def from_config(cls, config: Dict[str, Any], vectorizer: Any = None) -> 'EmbeddingSimilarityBackend':
+        if vectorizer is None:
+            raise ValueError("embedding 重排后端需要向量化器")
+        return cls(vectorizer, timeout=config.get('embedding_timeout_ms', 1000) / 1000)
+
+    async def score(self, query: str, documents: List[str]) -> List[float]:
+        return (await self.score_for_cache(query, documents))[0]
+
+    async def score_for_cache(self, query: str, documents: List[str]) -> Tuple[List[float], bool]:
+        texts = [query] + list(documents)
+        try:
+            vectors, sources = await asyncio.wait_for(
+                asyncio.shield(self.vectorizer.vectorize_with_source(texts)), timeout=self.timeout
+            )
+        except asyncio.TimeoutError:
+            logger.warning(f"[Reranker] 向量化超过 {self.timeout:.1f} 秒，改用哈希向量打分")
+            vectors, sources = None, [self.vectorizer.SOURCE_FALLBACK]
+        degraded = self.vectorizer.SOURCE_FALLBACK in sources
+        if degraded:
+            vectors = self.vectorizer.hash_vectorize(texts)
+
+        norms = np.linalg.norm(vectors, axis=1)
+        norms = np.where(norms > 0, norms, 1)
+        return ((vectors[1:] @ vectors[0]) / (norms[1:] * norms[0])).tolist(), not degraded
+
+
+_BACKENDS: Dict[str, Type[RerankBackend]] = {
+    'siliconflow': SiliconFlowRerankBackend,
+    'local': LocalCrossEncoderBackend,
+    'embedding': EmbeddingSimilarityBackend
+}
+
+
+def register_rerank_backend(name: str, backend_cls: Type[RerankBackend]) -> None:
+    """注册重排后端，注册后可在 SAGE_RERANKER_BACKEND / SAGE_RERANKER_FALLBACK 中使用"""
+    _BACKENDS[name] = backend_cls
+
+
+def create_rerank_backend(name: str, config: Dict[str, Any], vectorizer: Any = None) -> RerankBackend:
+    """按名称与 reranker 配置创建后端"""
+    backend_cls = _BACKENDS.get(name)
+    if backend_cls is None:
+        raise ValueError(f"未知的重排后端：{name}（可选：{', '.join(sorted(_BACKENDS))}）")
+    return backend_cls.from_config(config, vectorizer)
+
+
+def create_rerank_backends(config: Dict[str, Any], vectorizer: Any = None) -> List[RerankBackend]:
+    """创建主后端与降级后端（按配置顺序）；降级后端创建失败时跳过"""
+    primary = config.get('backend', 'siliconflow')
+    backends = [create_rerank_backend(primary, config, vectorizer)]
+    for name in config.get('fallback', []):
+        if name == primary:
+            continue
+        try:
+            backends.append(create_rerank_backend(name, config, vectorizer))
+        except (ImportError, ValueError) as e:
+            logger.warning(f"[Reranker] 降级后端 {name} 不可用：{e}")
+    return backends
@@ -1,84 +1,245 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Reranker - 语义重排服务 (使用 SiliconFlow 云端 API)
+Reranker - 语义重排服务 (默认使用 SiliconFlow 云端 API，可换用本地后端，见 rerank_backends.py)
 用于优化召回结果，减少 token 消耗
 """
 import numpy as np
-from typing import List, Tuple, Dict, Optional, Any
-import requests
-import os
+from typing import List, Tuple, Dict, Optional, Any, Union
 import logging
 import asyncio
+import hashlib
 import json
-from datetime import datetime, timedelta
+import sqlite3
+import threading
+import time
+from datetime import datetime
 from collections import OrderedDict
+from pathlib import Path
+from .rerank_backends import RerankBackend, SiliconFlowRerankBackend
 
 logger = logging.getLogger(__name__)
 
 
 class RerankerCache:
-    """简单的 LRU 缓存实现"""
+    """重排分数缓存 - 按 (模型, 查询, 文档) 内容寻址
+
+    交叉编码器对每个文档独立打分，候选集部分重叠时只需为新文档请求分数。
+    进程内为带 TTL 的有界 LRU；可选 SQLite 磁盘层（WAL 模式），hook 进程与 MCP 服务共用。
+    """
+    
+    # 每写入多少条检查一次磁盘容量
+    _EVICT_EVERY = 100
+    # 单条 SQL 的参数个数上限
+    _QUERY_CHUNK = 500
     
-    def __init__(self, max_size: int = 100, ttl_minutes: int = 30):
-        self.cache = OrderedDict()
+    def __init__(self, max_size: int = 5000, ttl_minutes: float = 30, path: Optional[str] = None):
+        """初始化缓存
+        
+        Args:
+            max_size: 进程内与磁盘各自的条数上限
+            ttl_minutes: 分数有效期（分钟）
+            path: SQLite 文件路径，为空时只使用进程内缓存
+        """
+        self.cache: OrderedDict = OrderedDict()
         self.max_size = max_size
-        self.ttl = timedelta(minutes=ttl_minutes)
+        self.ttl = ttl_minutes * 60
+        self.path = Path(path).expanduser() if path else None
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+        self._puts_since_evict = 0
+        self.stats = {
+            "memory_hits": 0,
+            "disk_hits": 0,
+            "misses": 0,
+            "expired": 0,
+            "evictions": 0,
+            "writes": 0
+        }
     
-    def get(self, key: str) -> Optional[List[float]]:
-        """获取缓存值"""
-        if key in self.cache:
-            value, timestamp = self.cache[key]
-            if datetime.now() - timestamp < self.ttl:
-                # 移到最后（LRU）
-                self.cache.move_to_end(key)
-                return value
-            else:
-                # 过期删除
-                del self.cache[key]
-        return None
+    @staticmethod
+    def make_key(model: str, query: str, document: str) -> bytes:
+        """内容寻址键：模型、查询与完整文档共同决定，跨进程稳定"""
+        return hashlib.sha256(f"{model}\0{query}\0{document}".encode('utf-8')).digest()
     
-    def set(self, key: str, value: List[float]) -> None:
-        """设置缓存值"""
-        self.cache[key] = (value, datetime.now())
+    def _connect(self) -> sqlite3.Connection:
+        """打开（必要时创建）磁盘缓存"""
+        if self._conn is None:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            conn = sqlite3.connect(str(self.path), timeout=5, check_same_thread=False)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute('''
+                CREATE TABLE IF NOT EXISTS rerank_scores (
+                    key BLOB PRIMARY KEY,
+                    score REAL NOT NULL,
+                    created_at REAL NOT NULL
+                ) WITHOUT ROWID
+            ''')
+            conn.execute('CREATE INDEX IF NOT EXISTS idx_rerank_scores_created_at ON rerank_scores (created_at)')
+            conn.commit()
+            self._conn = conn
+        return self._conn
+    
+    def _remember(self, key: bytes, score: float, created_at: float) -> None:
+        """写入进程内 LRU"""
+        self.cache[key] = (score, created_at)
         self.cache.move_to_end(key)
-        
-        # 超过大小限制时删除最旧的
-        if len(self.cache) > self.max_size:
+        while len(self.cache) > self.max_size:
             self.cache.popitem(last=False)
+            self.stats["evictions"] += 1
+    
+    def _in_memory(self, key: bytes, now: float) -> bool:
+        entry = self.cache.get(key)
+        return entry is not None and now - entry[1] < self.ttl
+    
+    def get_many_sync(self, keys: List[bytes]) -> Dict[bytes, float]:
+        """批量查询，返回命中且未过期的 键 -> 分数"""
+        now = time.time()
+        found: Dict[bytes, float] = {}
+        missing = []
+        with self._lock:
+            for key in keys:
+                entry = self.cache.get(key)
+                if entry is not None:
+                    if now - entry[1] < self.ttl:
+                        self.cache.move_to_end(key)
+                        found[key] = entry[0]
+                        self.stats["memory_hits"] += 1
+                        continue
+                    # 过期删除
+                    del self.cache[key]
+                    self.stats["expired"] += 1
+                missing.append(key)
+            
+            if missing and self.path is not None:
+                conn = self._connect()
+                for start in range(0, len(missing), self._QUERY_CHUNK):
+                    chunk = missing[start:start + self._QUERY_CHUNK]
+                    rows = conn.execute(
+                        f"SELECT key, score, created_at FROM rerank_scores "
+                        f"WHERE key IN ({','.join('?' * len(chunk))}) AND created_at > ?",
+                        [*chunk, now - self.ttl]
+                    ).fetchall()
+                    for key, score, created_at in rows:
+                        found[key] = score
+                        self._remember(key, score, created_at)
+                    self.stats["disk_hits"] += len(rows)
+            
+            self.stats["misses"] += len(keys) - len(found)
+        return found
+    
+    def set_many_sync(self, items: Dict[bytes, float]) -> None:
+        """批量写入"""
+        if not items:
+            return
+        now = time.time()
+        with self._lock:
+            for key, score in items.items():
+                self._remember(key, score, now)
+            self.stats["writes"] += len(items)
+            
+            if self.path is not None:
+                conn = self._connect()
+                conn.executemany(
+                    'INSERT OR REPLACE INTO rerank_scores (key, score, created_at) VALUES (?, ?, ?)',
+                    [(key, float(score), now) for key, score in items.items()]
+                )
+                conn.commit()
+                self._puts_since_evict += len(items)
+                if self._puts_since_evict >= self._EVICT_EVERY:
+                    self._puts_since_evict = 0
+                    self._evict(conn, now)
+    
+    def _evict(self, conn: sqlite3.Connection, now: float) -> None:
+        """删除过期分数，超出容量时删除最早写入的"""
+        conn.execute('DELETE FROM rerank_scores WHERE created_at <= ?', (now - self.ttl,))
+        count = conn.execute('SELECT COUNT(*) FROM rerank_scores').fetchone()[0]
+        overflow = count - self.max_size
+        if overflow > 0:
+            conn.execute(
+                'DELETE FROM rerank_scores WHERE key IN '
+                '(SELECT key FROM rerank_scores ORDER BY created_at LIMIT ?)',
+                (overflow,)
+            )
+        conn.commit()
+    
+    async def get_many(self, keys: List[bytes]) -> Dict[bytes, float]:
+        """异步批量查询；进程内全部命中或没有磁盘层时不进入线程池"""
+        now = time.time()
+        if self.path is None or all(self._in_memory(key, now) for key in keys):
+            return self.get_many_sync(keys)
+        return await asyncio.to_thread(self.get_many_sync, keys)
+    
+    async def set_many(self, items: Dict[bytes, float]) -> None:
+        """异步批量写入"""
+        if self.path is None:
+            self.set_many_sync(items)
+        else:
+            await asyncio.to_thread(self.set_many_sync, items)
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """命中率统计"""
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return {
+            **self.stats,
+            "hit_rate": hits / total if total else 0.0,
+            "memory_entries": len(self.cache),
+            "disk": self.path is not None
+        }
+    
+    def close(self) -> None:
+        """关闭磁盘连接"""
+        with self._lock:
+            if self._conn is not None:
+                self._conn.close()
+                self._conn = None
+
+
+def create_reranker_cache(config: Dict[str, Any]) -> RerankerCache:
+    """按 reranker 配置创建分数缓存"""
+    path = None
+    if config.get('disk_cache', True):
+        path = config.get('cache_path') or str(Path.home() / '.sage' / 'reranker_cache.db')
+    return RerankerCache(
+        max_size=config.get('cache_max_entries', 5000),
+        ttl_minutes=config.get('cache_ttl_minutes', 30),
+        path=path
+    )
 
 
 class TextReranker:
-    """文本重排器 - 使用 SiliconFlow API"""
+    """文本重排器 - 默认使用 SiliconFlow API，失败时依次尝试降级后端"""
     
     def __init__(self, 
                  model_name: str = "Qwen/Qwen3-Reranker-8B",
-                 api_key: Optional[str] = None):
+                 api_key: Optional[str] = None,
+                 cache: Optional[RerankerCache] = None,
+                 backend: Optional[RerankBackend] = None,
+                 fallbacks: Optional[List[RerankBackend]] = None):
         """初始化重排器
         
         Args:
-            model_name: 模型名称
-            api_key: API 密钥（优先使用参数，其次环境变量）
+            model_name: 模型名称（未指定 backend 时使用）
+            api_key: API 密钥（优先使用参数，其次环境变量；未指定 backend 时使用）
+            cache: 分数缓存（默认仅进程内）
+            backend: 主后端（默认 SiliconFlow API）
+            fallbacks: 主后端失败时依次尝试的后端
         """
-        self.model_name = model_name
-        self.api_key = api_key or os.getenv('SILICONFLOW_API_KEY')
-        if not self.api_key:
-            raise ValueError("SILICONFLOW_API_KEY 未设置")
-        
-        self.base_url = "https://api.siliconflow.cn/v1"
-        self.headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+        self.backend = backend or SiliconFlowRerankBackend(model_name, api_key)
+        self.fallbacks = list(fallbacks or [])
+        self.model_name = self.backend.model_name
         
         # 初始化缓存
-        self.cache = RerankerCache()
+        self.cache = cache or RerankerCache()
         
         # 性能统计
         self.stats = {
             "total_calls": 0,
             "cache_hits": 0,
             "api_calls": 0,
+            "fallback_calls": 0,
             "total_latency": 0.0
         }
     
@@ -102,21 +263,7 @@ class TextReranker:
         start_time = datetime.now()
         
         try:
-            # 生成缓存键
-            cache_key = self._generate_cache_key(query, documents)
-            
-            # 尝试从缓存获取
-            cached_scores = self.cache.get(cache_key)
-            if cached_scores:
-                self.stats["cache_hits"] += 1
-                logger.info(f"[Reranker] 缓存命中")
-                scores = cached_scores
-            else:
-                # 调用 API
-                scores = await self._call_rerank_api(query, documents)
-                # 保存到缓存
-                self.cache.set(cache_key, scores)
-                self.stats["api_calls"] += 1
+            scores = await self._score(query, documents)
             
             # 排序
             doc_scores = list(zip(documents, scores))
@@ -143,95 +290,88 @@ class TextReranker:
             if top_k:
                 documents = documents[:top_k]
             if return_scores:
-                # 使用简单的长度相似度作为分数
+                # 使用字符二元组相似度作为分数
                 scores = [self._simple_similarity(query, doc) for doc in documents]
                 return list(zip(documents, scores))
             return documents
     
-    async def _call_rerank_api(self, query: str, documents: List[str]) -> List[float]:
-        """调用重排 API
-        
-        Args:
-            query: 查询文本
-            documents: 文档列表
-            
-        Returns:
-            每个文档的相关性分数
-        """
-        # 构建请求
-        payload = {
-            "model": self.model_name,
-            "query": query,
-            "documents": documents,
-            "return_documents": False,
-            "top_n": len(documents)  # 返回所有文档的分数
-        }
-        
-        # 发送请求
-        async with asyncio.timeout(30):  # 30秒超时
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: requests.post(
-                    f"{self.base_url}/rerank",
-                    json=payload,
-                    headers=self.headers,
-                    timeout=30
-                )
-            )
-        
-        if response.status_code != 200:
-            raise Exception(f"API 调用失败：{response.status_code} - {response.text}")
+    async def _score(self, query: str, documents: List[str]) -> List[float]:
+        """按主后端、降级后端的顺序打分，使用第一个成功的后端"""
+        errors = []
+        for i, backend in enumerate([self.backend] + self.fallbacks):
+            try:
+                scores = await self._score_with(backend, query, documents)
+            except Exception as e:
+                logger.warning(f"[Reranker] 后端 {backend.model_name} 打分失败：{e}")
+                errors.append(e)
+                continue
+            if i > 0:
+                self.stats["fallback_calls"] += 1
+                logger.info(f"[Reranker] 已降级到 {backend.model_name}")
+            return scores
+        raise errors[-1]
+    
+    async def _score_with(self, backend: RerankBackend, query: str, documents: List[str]) -> List[float]:
+        """逐文档查缓存，只为未命中的文档（去重后）调用后端"""
+        keys = [RerankerCache.make_key(backend.model_name, query, doc) for doc in documents]
+        cached = await self.cache.get_many(keys)
         
-        # 解析结果
-        result = response.json()
+        pending: Dict[bytes, str] = {}
+        for key, doc in zip(keys, documents):
+            if key not in cached:
+                pending.setdefault(key, doc)
         
-        # 提取分数
-        if "results" in result:
-            # 按文档顺序返回分数
-            scores = [0.0] * len(documents)
-            for item in result["results"]:
-                idx = item.get("index", 0)
-                score = item.get("relevance_score", 0.0)
-                if 0 <= idx < len(scores):
-                    scores[idx] = score
-            return scores
+        if not pending:
+            self.stats["cache_hits"] += 1
+            logger.info(f"[Reranker] 缓存命中")
         else:
-            raise Exception(f"API 返回格式错误：{result}")
-    
-    def _generate_cache_key(self, query: str, documents: List[str]) -> str:
-        """生成缓存键"""
-        # 使用查询和文档的前 50 个字符生成键
-        doc_preview = "|".join([doc[:50] for doc in documents])
-        content = f"{query}||{doc_preview}"
-        # 简单哈希
-        return str(hash(content))
+            fresh, cacheable = await backend.score_for_cache(query, list(pending.values()))
+            if backend is self.backend:
+                self.stats["api_calls"] += 1
+            new_scores = dict(zip(pending.keys(), fresh))
+            if cacheable:
+                await self.cache.set_many(new_scores)
+            cached.update(new_scores)
+            if len(pending) < len(documents):
+                logger.info(f"[Reranker] 缓存命中 {len(documents) - len(pending)}/{len(documents)} 个文档")
+        
+        return [cached[key] for key in keys]
     
     def _simple_similarity(self, query: str, document: str) -> float:
-        """简单的相似度计算（降级用）"""
-        # 基于共同词的简单相似度
-        query_words = set(query.lower().split())
-        doc_words = set(document.lower().split())
+        """简单的相似度计算（所有后端均失败时使用）
         
-        if not query_words or not doc_words:
-            return 0.0
+        字符二元组的 Jaccard 相似度：不依赖空格分词，中文同样适用
+        """
+        def bigrams(text: str) -> set:
+            text = ''.join(text.lower().split())
+            return {text[i:i + 2] for i in range(len(text) - 1)} or set(text)
         
-        intersection = query_words & doc_words
-        union = query_words | doc_words
+        query_grams = bigrams(query)
+        doc_grams = bigrams(document)
         
-        return len(intersection) / len(union)
+        if not query_grams or not doc_grams:
+            return 0.0
+        
+        return len(query_grams & doc_grams) / len(query_grams | doc_grams)
     
     def get_stats(self) -> Dict[str, Any]:
         """获取性能统计"""
         total = self.stats["total_calls"]
         if total == 0:
-            return self.stats
+            return {**self.stats, "cache": self.cache.get_stats()}
             
         return {
             **self.stats,
             "cache_hit_rate": self.stats["cache_hits"] / total,
-            "avg_latency": self.stats["total_latency"] / total
+            "avg_latency": self.stats["total_latency"] / total,
+            "cache": self.cache.get_stats()
         }
+    
+    async def close(self) -> None:
+        """关闭后端与分数缓存"""
+        for backend in [self.backend] + self.fallbacks:
+            await backend.close()
+        self.cache.close()
 
 
 async def test_reranker():
@@ -262,6 +402,7 @@ async def test_reranker():
     # 测试缓存
     print("\n测试缓存...")
     await reranker.rerank(query, documents)  # 应该命中缓存
+    await reranker.rerank(query, documents[1:] + ["索引并非越多越好"])  # 只为新文档请求分数
     
     # 打印统计
     print("\n性能统计:")
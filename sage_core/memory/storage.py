@@ -3,31 +3,87 @@
 """
 Memory Storage - 记忆存储实现
 """
+import re
 import uuid
-from typing import List, Optional, Dict, Any
-from datetime import datetime, timezone
+import hashlib
+from typing import AsyncIterator, List, Optional, Dict, Any, Tuple
+from datetime import datetime, timedelta, timezone
+from decimal import Decimal
 import numpy as np
-import json
 import logging
 from ..interfaces.memory import IMemoryProvider
 from ..database import DatabaseConnection
+from ..database.codecs import dumps_json
 from ..database.transaction import TransactionManager, TransactionalStorage
 from ..resilience import retry, circuit_breaker, CircuitBreakerOpenError
 
 logger = logging.getLogger(__name__)
 
+# 以 JSON 形式存储的列，NULL 统一映射为空字典
+_JSON_FIELDS = frozenset(('metadata', 'agent_metadata'))
+
+
+def record_to_memory(row) -> Dict[str, Any]:
+    """将查询结果行转换为记忆字典
+    
+    jsonb 列由连接上注册的编解码器直接解码为 Python 对象，这里只做
+    UUID / 时间 / Decimal 的格式转换，按行中实际存在的列逐个映射。
+    """
+    memory = {}
+    for key, value in row.items():
+        if key in _JSON_FIELDS:
+            if value is None:
+                value = {}
+        elif isinstance(value, datetime):
+            value = value.astimezone().isoformat()
+        elif isinstance(value, uuid.UUID):
+            value = str(value)
+        elif isinstance(value, Decimal):
+            value = float(value)
+        memory[key] = value
+    return memory
+
+
+# ANN 降维列的维度，与 migrations/add_ann_embedding.sql 的 vector(1024) 列、触发器
+# 及 scripts/backfill_embedding_columns.py 一致（改动时需同时修改三处并重建列）
+ANN_DIMENSION = 1024
+
+# pgvector 允许的 hnsw.ef_search 上限
+MAX_EF_SEARCH = 1000
+
+
+# CJK 字符（假名、汉字、兼容汉字、谚文），需与 migrations/add_text_search.sql 中 sage_cjk_segment 的范围一致
+_CJK_CHARS = re.compile(r'([\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uac00-\ud7af])')
+
 
 class MemoryStorage(IMemoryProvider, TransactionalStorage):
     """记忆存储实现类 - 支持事务管理"""
     
-    def __init__(self, db_connection: DatabaseConnection, transaction_manager: Optional[TransactionManager] = None):
+    # save_many 临时表列顺序，与 staged 元组一致
+    _STAGING_COLUMNS = (
+        'id', 'session_id', 'user_input', 'assistant_response', 'embedding', 'embedding_source',
+        'metadata', 'is_agent_report', 'agent_metadata', 'content_hash', 'time_window', 'previous_window'
+    )
+    
+    def __init__(self, db_connection: DatabaseConnection, transaction_manager: Optional[TransactionManager] = None,
+                 search_config: Optional[Dict[str, Any]] = None,
+                 embedding_model: str = "Qwen/Qwen3-Embedding-8B",
+                 embedding_version: int = 1):
         """初始化存储
         
         Args:
             db_connection: 数据库连接管理器
             transaction_manager: 事务管理器（可选）
+            search_config: 向量检索配置（可选，见 ConfigManager.get_vector_search_config）
+            embedding_model: 向量所属模型名，写入与检索 memory_embeddings 时按此过滤
+            embedding_version: 写入向量时记录的版本
         """
         self.db = db_connection
+        self.search_config = search_config or {}
+        self.embedding_model = embedding_model
+        self.embedding_version = embedding_version
+        # 已确认分区存在的月份（YYYYMM）
+        self._partition_month: Optional[str] = None
         # 如果提供了事务管理器，初始化事务支持
         if transaction_manager:
             TransactionalStorage.__init__(self, transaction_manager)
@@ -48,8 +104,13 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
                    session_id: Optional[str] = None, 
                    is_agent_report: bool = False,
                    agent_metadata: Optional[Dict[str, Any]] = None,
+                   embedding_source: str = 'api',
                    **kwargs) -> str:
-        """保存记忆到数据库 - 带重试和断路器保护"""
+        """保存记忆到数据库 - 带重试和断路器保护
+        
+        embedding_source 为 'fallback' 时表示向量是 API 故障时的降级向量，
+        写入 memory_embeddings.source，API 恢复后由 MemoryManager.reembed_fallback 重新向量化。
+        """
         try:
             # 数据完整性验证 - 改进逻辑以支持单边消息
             if not user_input and not assistant_response:
@@ -68,64 +129,14 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             if session_id is not None and (not isinstance(session_id, str) or not session_id.strip()):
                 raise ValueError("session_id 必须是非空字符串或 None")
             
-            # 生成内容哈希用于去重 - 增强版本
-            import hashlib
-            from datetime import datetime, timezone
-            
-            # 基础内容哈希
-            content_for_hash = f"{user_input or ''}{assistant_response or ''}"
-            content_hash = hashlib.sha256(content_for_hash.encode('utf-8')).hexdigest()
-            
-            # 时间窗口哈希（每小时为一个窗口）
-            time_window = datetime.now(timezone.utc).strftime("%Y%m%d%H")
-            time_aware_hash = hashlib.sha256(f"{content_for_hash}{time_window}".encode('utf-8')).hexdigest()
-            
-            # 检查是否已存在相同内容的记录（在近期时间窗口内）
-            existing_query = '''
-                SELECT id, created_at, metadata FROM memories 
-                WHERE (
-                    metadata->>'content_hash' = $1 
-                    OR metadata->>'time_aware_hash' = $2
-                )
-                AND session_id = $3
-                AND created_at > NOW() - INTERVAL '2 hours'
-                ORDER BY created_at DESC
-                LIMIT 1
-            '''
-            
-            # 根据连接类型执行查询
-            if self._transaction_manager and '_transaction_conn' in kwargs:
-                conn = kwargs['_transaction_conn']
-                existing_record = await conn.fetchrow(existing_query, content_hash, time_aware_hash, session_id)
-            else:
-                existing_record = await self.db.fetchrow(existing_query, content_hash, time_aware_hash, session_id)
-            
-            if existing_record:
-                # 检查是否为真正的重复记录
-                existing_metadata = json.loads(existing_record['metadata']) if existing_record['metadata'] else {}
-                
-                # 如果是时间窗口内的相同内容，检查是否有新的元数据
-                if metadata and existing_metadata:
-                    # 比较元数据的关键字段
-                    key_fields = ['tool_calls', 'message_count', 'thinking_content']
-                    has_new_info = any(
-                        metadata.get(field) != existing_metadata.get(field) 
-                        for field in key_fields
-                    )
-                    
-                    if has_new_info:
-                        logger.info(f"发现相似内容但有新信息，允许保存: {content_hash[:8]}...")
-                    else:
-                        logger.info(f"跳过重复记录，返回已存在的ID: {existing_record['id']} (hash: {content_hash[:8]}...)")
-                        return str(existing_record['id'])
-                else:
-                    logger.info(f"跳过重复记录，返回已存在的ID: {existing_record['id']} (hash: {content_hash[:8]}...)")
-                    return str(existing_record['id'])
+            # 生成内容哈希用于去重
+            content_hash, time_window, time_aware_hash = self._dedup_keys(user_input, assistant_response)
             
             # 生成记忆ID
             memory_id = str(uuid.uuid4())
             
-            # 准备元数据
+            # 准备元数据（调用方是否提供了元数据，决定冲突时是否比较关键字段）
+            has_metadata = bool(metadata)
             if metadata is None:
                 metadata = {}
             
@@ -134,18 +145,15 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             metadata['time_aware_hash'] = time_aware_hash
             metadata['time_window'] = time_window
             
-            # 将向量转换为列表（PostgreSQL pgvector 需要）
+            # 转换为 float32 数组，由连接上注册的 vector 二进制编解码器直接发送
             try:
-                embedding_list = embedding.tolist()
-            except (AttributeError, TypeError) as e:
+                embedding_vector = np.asarray(embedding, dtype=np.float32)
+            except (TypeError, ValueError) as e:
                 raise ValueError(f"embedding 转换失败: {e}")
             
-            # 将向量列表转换为 PostgreSQL vector 格式的字符串
-            embedding_str = '[' + ','.join(map(str, embedding_list)) + ']'
-            
             # 长期优化：处理Agent元数据
             # 现在是作为显式参数传入
-            agent_metadata_json = None
+            agent_metadata_value = None
             
             # 调试：打印所有接收到的参数
             logger.info(f"[DEBUG] save方法接收到的参数:")
@@ -157,56 +165,116 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             # 如果有agent_metadata参数，使用它
             if agent_metadata:
                 is_agent_report = True
-                agent_metadata_json = json.dumps(agent_metadata)
+                agent_metadata_value = agent_metadata
                 logger.info(f"使用agent_metadata参数: {agent_metadata}")
             # 否则从metadata中提取（向后兼容）
             elif metadata and 'agent_metadata' in metadata:
                 is_agent_report = True
-                agent_metadata_json = json.dumps(metadata['agent_metadata'])
+                agent_metadata_value = metadata['agent_metadata']
                 logger.info(f"从metadata提取agent_metadata: {metadata['agent_metadata']}")
             
             # 确保is_agent_report一致性
             if not is_agent_report and metadata:
                 is_agent_report = metadata.get('is_agent_report', False)
             
-            logger.info(f"最终: is_agent_report={is_agent_report}, agent_metadata_json={agent_metadata_json[:50] if agent_metadata_json else None}")
+            logger.info(f"最终: is_agent_report={is_agent_report}, agent_metadata={agent_metadata_value}")
             
             # 插入记录 - 支持事务和Agent元数据
+            # 去重窗口为当前与上一个 UTC 小时桶（10:59 与 11:01 的相同内容仍视为重复），单条语句完成：
+            # - 上一个小时桶已有相同内容且无新的关键元数据：不写入，返回已有记录ID
+            # - 当前小时桶由 (session_id, content_hash, time_window) 唯一索引保证：
+            #   无冲突时插入新记录；冲突且带有新的关键元数据（tool_calls / message_count / thinking_content）
+            #   时合并到已有记录；冲突且无新信息时不写入，返回已有记录ID
+            # 向量只随新插入的记录写入 memory_embeddings，memories 行本身不含向量
             query = '''
-                INSERT INTO memories 
-                (id, session_id, user_input, assistant_response, embedding, metadata, is_agent_report, agent_metadata)
-                VALUES ($1, $2, $3, $4, $5::vector, $6, $7, $8::jsonb)
-                RETURNING id
+                WITH upsert AS (
+                    INSERT INTO memories 
+                    (id, session_id, user_input, assistant_response, metadata,
+                     is_agent_report, agent_metadata, content_hash, time_window)
+                    SELECT $1::uuid, $2::text, $3::text, $4::text, $6::jsonb, $7::boolean, $8::jsonb,
+                           $9::text, $10::text
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM memories p
+                        WHERE p.session_id = $2 AND p.content_hash = $9 AND p.time_window = $15
+                          AND NOT ($11::boolean AND (
+                              p.metadata->'tool_calls' IS DISTINCT FROM $6::jsonb->'tool_calls'
+                              OR p.metadata->'message_count' IS DISTINCT FROM $6::jsonb->'message_count'
+                              OR p.metadata->'thinking_content' IS DISTINCT FROM $6::jsonb->'thinking_content'
+                          ))
+                    )
+                    ON CONFLICT (session_id, content_hash, time_window) DO UPDATE
+                    SET metadata = memories.metadata || EXCLUDED.metadata,
+                        is_agent_report = memories.is_agent_report OR EXCLUDED.is_agent_report,
+                        agent_metadata = COALESCE(EXCLUDED.agent_metadata, memories.agent_metadata),
+                        updated_at = CURRENT_TIMESTAMP
+                    WHERE $11::boolean AND (
+                        memories.metadata->'tool_calls' IS DISTINCT FROM EXCLUDED.metadata->'tool_calls'
+                        OR memories.metadata->'message_count' IS DISTINCT FROM EXCLUDED.metadata->'message_count'
+                        OR memories.metadata->'thinking_content' IS DISTINCT FROM EXCLUDED.metadata->'thinking_content'
+                    )
+                    RETURNING id, CASE WHEN xmax = 0 THEN 'inserted' ELSE 'merged' END AS action
+                ),
+                emb AS (
+                    INSERT INTO memory_embeddings (memory_id, time_window, model, version, source, embedding)
+                    SELECT id, $10, $12, $13, $14, $5::vector FROM upsert WHERE action = 'inserted'
+                    ON CONFLICT (memory_id, model) DO NOTHING
+                )
+                SELECT id, action FROM upsert
+                UNION ALL
+                (SELECT id, 'duplicate' FROM memories
+                 WHERE session_id = $2 AND content_hash = $9 AND time_window IN ($10, $15)
+                 ORDER BY time_window DESC
+                 LIMIT 1)
+                LIMIT 1
             '''
             
-            # 如果有事务管理器，使用事务连接
+            # 如果有事务管理器，使用事务连接；否则使用普通连接
             if self._transaction_manager and '_transaction_conn' in kwargs:
-                conn = kwargs['_transaction_conn']
-                result = await conn.fetchval(
-                    query,
-                    memory_id,
-                    session_id,
-                    user_input,
-                    assistant_response,
-                    embedding_str,
-                    json.dumps(metadata, ensure_ascii=False),
-                    is_agent_report,
-                    agent_metadata_json
-                )
+                executor = kwargs['_transaction_conn']
             else:
-                # 否则使用普通连接
-                result = await self.db.fetchval(
-                    query,
-                    memory_id,
-                    session_id,
-                    user_input,
-                    assistant_response,
-                    embedding_str,
-                    json.dumps(metadata, ensure_ascii=False),
-                    is_agent_report,
-                    agent_metadata_json
+                executor = self.db
+            
+            await self._ensure_partition(executor, time_window)
+            
+            row = await executor.fetchrow(
+                query,
+                memory_id,
+                session_id,
+                user_input,
+                assistant_response,
+                embedding_vector,
+                metadata,
+                is_agent_report,
+                agent_metadata_value,
+                content_hash,
+                time_window,
+                has_metadata,
+                self.embedding_model,
+                self.embedding_version,
+                embedding_source,
+                self._previous_window(time_window)
+            )
+            
+            if row is None:
+                # 并发写入者在本语句快照之后提交了相同内容，重新读取其ID
+                row = await executor.fetchrow(
+                    '''
+                    SELECT id, 'duplicate' AS action FROM memories
+                    WHERE session_id = $1 AND content_hash = $2 AND time_window IN ($3, $4)
+                    ORDER BY time_window DESC
+                    LIMIT 1
+                    ''',
+                    session_id, content_hash, time_window, self._previous_window(time_window)
                 )
             
+            result = str(row['id'])
+            if row['action'] == 'duplicate':
+                logger.info(f"跳过重复记录，返回已存在的ID: {result} (hash: {content_hash[:8]}...)")
+                return result
+            if row['action'] == 'merged':
+                logger.info(f"发现相似内容但有新信息，已合并到已有记录: {result} (hash: {content_hash[:8]}...)")
+                return result
+            
             logger.info(f"记忆已保存：{result}")
             return result
             
@@ -217,61 +285,634 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             logger.error(f"保存记忆失败：{e}")
             raise
     
+    @staticmethod
+    def _dedup_keys(user_input: str, assistant_response: str) -> Tuple[str, str, str]:
+        """计算去重键
+        
+        Returns:
+            (content_hash, time_window, time_aware_hash)，时间窗口为 UTC 小时桶；
+            save / save_many 同时检查当前与上一个小时桶，跨整点的重复内容同样会被去重
+        """
+        content_for_hash = f"{user_input or ''}{assistant_response or ''}"
+        content_hash = hashlib.sha256(content_for_hash.encode('utf-8')).hexdigest()
+        time_window = datetime.now(timezone.utc).strftime("%Y%m%d%H")
+        time_aware_hash = hashlib.sha256(f"{content_for_hash}{time_window}".encode('utf-8')).hexdigest()
+        return content_hash, time_window, time_aware_hash
+    
+    @staticmethod
+    def _previous_window(time_window: str) -> str:
+        """上一个 UTC 小时桶；去重同时检查当前与上一个小时桶"""
+        return (datetime.strptime(time_window, "%Y%m%d%H") - timedelta(hours=1)).strftime("%Y%m%d%H")
+    
+    async def _ensure_partition(self, executor, time_window: str) -> None:
+        """每个自然月首次写入前确认该月分区存在
+        
+        服务启动时已创建当月及未来两个月的分区，这里覆盖长驻进程跨月运行的情况。
+        """
+        month = time_window[:6]
+        if month == self._partition_month:
+            return
+        await executor.execute('SELECT sage_ensure_memory_partitions()')
+        self._partition_month = month
+    
+    async def register_embedding_generation(self, dimension: int) -> Dict[str, Any]:
+        """登记当前模型的向量代际并返回其状态
+        
+        首次登记时若已有其他 ready 的代际，说明是在切换模型，新代际记为 building，
+        需等待 scripts/reembed_memories.py 完成；否则（新库或沿用原模型）直接记为 ready。
+        """
+        row = await self.db.fetchrow('''
+            WITH ins AS (
+                INSERT INTO embedding_generations (model, dimension, version, status, ready_at)
+                SELECT $1, $2, $3, s.status, CASE WHEN s.status = 'ready' THEN CURRENT_TIMESTAMP END
+                FROM (
+                    SELECT CASE WHEN EXISTS (
+                        SELECT 1 FROM embedding_generations WHERE model <> $1 AND status = 'ready'
+                    ) THEN 'building' ELSE 'ready' END AS status
+                ) s
+                ON CONFLICT (model) DO NOTHING
+                RETURNING model, dimension, version, status
+            )
+            SELECT model, dimension, version, status FROM ins
+            UNION ALL
+            SELECT model, dimension, version, status FROM embedding_generations WHERE model = $1
+            LIMIT 1
+        ''', self.embedding_model, dimension, self.embedding_version)
+        return dict(row)
+    
+    async def copy_legacy_embeddings(self, dimension: int) -> int:
+        """将 memories.embedding 中的存量向量复制到 memory_embeddings
+        
+        检索只读 memory_embeddings；先升级代码、后执行 add_memory_embeddings.sql 的窗口内，
+        服务启动时在这里补齐复制，历史记忆不会从向量检索中消失。可重复执行，已复制的记录跳过；
+        memories.embedding 已被迁移删除时为空操作。存量向量记为当前模型，维度不一致的跳过。
+        
+        Returns:
+            本次复制的向量数
+        """
+        has_column = await self.db.fetchval('''
+            SELECT EXISTS (
+                SELECT 1 FROM information_schema.columns
+                WHERE table_name = 'memories' AND column_name = 'embedding'
+            )
+        ''')
+        if not has_column:
+            return 0
+        
+        result = await self.db.execute('''
+            INSERT INTO memory_embeddings (memory_id, time_window, model, version, embedding, created_at)
+            SELECT m.id,
+                   COALESCE(m.time_window, to_char(m.created_at AT TIME ZONE 'UTC', 'YYYYMMDDHH24')),
+                   $1, $2, m.embedding, m.created_at
+            FROM memories m
+            WHERE m.embedding IS NOT NULL
+              AND vector_dims(m.embedding) = $3
+              AND NOT EXISTS (
+                  SELECT 1 FROM memory_embeddings e WHERE e.memory_id = m.id AND e.model = $1
+              )
+            ON CONFLICT (memory_id, model) DO NOTHING
+        ''', self.embedding_model, self.embedding_version, dimension)
+        return int(result.split()[-1])
+    
+    async def fetch_fallback_embeddings(self, limit: int = 32) -> List[Dict[str, Any]]:
+        """取一批当前模型下使用降级向量的记忆（memory_id, time_window 与正文）"""
+        rows = await self.db.fetch('''
+            SELECT e.memory_id, e.time_window, m.user_input, m.assistant_response
+            FROM memory_embeddings e
+            JOIN memories m ON m.id = e.memory_id AND m.time_window = e.time_window
+            WHERE e.model = $1 AND e.source = 'fallback'
+            ORDER BY e.memory_id
+            LIMIT $2
+        ''', self.embedding_model, limit)
+        return [dict(row) for row in rows]
+    
+    async def replace_fallback_embeddings(self, embeddings: List[tuple]) -> None:
+        """用模型向量替换降级向量；期间已被替换或删除的记录跳过
+        
+        Args:
+            embeddings: (memory_id, embedding, embedding_source) 列表，来源同 save 的 embedding_source
+        """
+        if not embeddings:
+            return
+        async with self.db.acquire() as conn:
+            await conn.executemany('''
+                UPDATE memory_embeddings
+                SET embedding = $2,
+                    source = $5,
+                    version = $4,
+                    created_at = CURRENT_TIMESTAMP
+                WHERE memory_id = $1 AND model = $3 AND source = 'fallback'
+            ''', [
+                (memory_id, np.asarray(embedding, dtype=np.float32), self.embedding_model, self.embedding_version,
+                 source)
+                for memory_id, embedding, source in embeddings
+            ])
+    
+    @retry(max_attempts=3, initial_delay=0.5)
+    @circuit_breaker("memory_storage_save_many", failure_threshold=5, recovery_timeout=60)
+    async def save_many(self, records: List[Dict[str, Any]], **kwargs) -> List[Optional[str]]:
+        """批量保存记忆 - 通过 COPY 写入，单事务完成
+        
+        记录先经 copy_records_to_table 流式写入临时表，再以一条
+        INSERT ... SELECT ... ON CONFLICT DO NOTHING 合入 memories，
+        批内重复与库内已有记录在同一遍中去重。
+        
+        Args:
+            records: 记录列表，字段同 save 的参数
+                     （user_input, assistant_response, embedding, metadata,
+                      session_id, is_agent_report, agent_metadata, embedding_source）
+            
+        Returns:
+            与输入一一对应的记忆ID；重复记录返回已存在的ID
+        """
+        if not records:
+            return []
+        
+        staged = []
+        staged_index: Dict[tuple, str] = {}
+        record_ids: List[str] = []
+        
+        for record in records:
+            user_input = record.get('user_input') or ''
+            assistant_response = record.get('assistant_response') or ''
+            if not user_input.strip() and not assistant_response.strip():
+                raise ValueError("user_input 和 assistant_response 不能同时为空")
+            if record.get('embedding') is None:
+                raise ValueError("embedding 不能为 None")
+            
+            session_id = record.get('session_id')
+            content_hash, time_window, time_aware_hash = self._dedup_keys(user_input, assistant_response)
+            
+            # 批内去重：同一会话、同一时间窗口的相同内容只写入一次
+            key = (session_id, content_hash, time_window)
+            if session_id is not None and key in staged_index:
+                record_ids.append(staged_index[key])
+                continue
+            
+            metadata = dict(record.get('metadata') or {})
+            metadata['content_hash'] = content_hash
+            metadata['time_aware_hash'] = time_aware_hash
+            metadata['time_window'] = time_window
+            
+            agent_metadata = record.get('agent_metadata') or metadata.get('agent_metadata')
+            is_agent_report = bool(record.get('is_agent_report') or agent_metadata
+                                   or metadata.get('is_agent_report'))
+            
+            memory_id = uuid.uuid4()
+            staged.append((
+                memory_id,
+                session_id,
+                user_input,
+                assistant_response,
+                np.asarray(record['embedding'], dtype=np.float32),
+                record.get('embedding_source') or 'api',
+                metadata,
+                is_agent_report,
+                agent_metadata or None,
+                content_hash,
+                time_window,
+                self._previous_window(time_window)
+            ))
+            staged_index[key] = memory_id
+            record_ids.append(memory_id)
+        
+        try:
+            if self._transaction_manager and '_transaction_conn' in kwargs:
+                id_map = await self._copy_and_merge(kwargs['_transaction_conn'], staged)
+            else:
+                async with self.db.acquire() as conn:
+                    id_map = await self._copy_and_merge(conn, staged)
+            
+            inserted = sum(1 for staged_id, final_id in id_map.items() if staged_id == final_id)
+            logger.info(f"批量保存完成：{len(records)} 条记录，新写入 {inserted} 条，"
+                        f"跳过重复 {len(records) - inserted} 条")
+            
+            return [
+                str(id_map[memory_id]) if id_map.get(memory_id) is not None else None
+                for memory_id in record_ids
+            ]
+            
+        except CircuitBreakerOpenError:
+            logger.error("批量保存断路器已打开，拒绝请求")
+            raise
+        except Exception as e:
+            logger.error(f"批量保存记忆失败：{e}")
+            raise
+    
+    async def _copy_and_merge(self, conn, staged: List[tuple]) -> Dict[Any, Any]:
+        """COPY 到临时表并合入 memories，返回 临时ID -> 最终记忆ID 的映射"""
+        await self._ensure_partition(conn, max(row[-2] for row in staged))
+        
+        async with conn.transaction():
+            await conn.execute('''
+                CREATE TEMP TABLE memories_staging (
+                    id UUID,
+                    session_id TEXT,
+                    user_input TEXT,
+                    assistant_response TEXT,
+                    embedding vector,
+                    embedding_source TEXT,
+                    metadata JSONB,
+                    is_agent_report BOOLEAN,
+                    agent_metadata JSONB,
+                    content_hash TEXT,
+                    time_window TEXT,
+                    previous_window TEXT
+                ) ON COMMIT DROP
+            ''')
+            
+            await conn.copy_records_to_table(
+                'memories_staging',
+                records=staged,
+                columns=list(self._STAGING_COLUMNS)
+            )
+            
+            rows = await conn.fetch('''
+                WITH ins AS (
+                    INSERT INTO memories
+                    (id, session_id, user_input, assistant_response, metadata,
+                     is_agent_report, agent_metadata, content_hash, time_window)
+                    SELECT id, session_id, user_input, assistant_response, metadata,
+                           is_agent_report, agent_metadata, content_hash, time_window
+                    FROM memories_staging s
+                    -- 上一个小时桶已有相同内容时同样视为重复
+                    WHERE NOT EXISTS (
+                        SELECT 1 FROM memories p
+                        WHERE p.session_id = s.session_id
+                          AND p.content_hash = s.content_hash
+                          AND p.time_window = s.previous_window
+                    )
+                    ON CONFLICT (session_id, content_hash, time_window) DO NOTHING
+                    RETURNING id
+                ),
+                emb AS (
+                    INSERT INTO memory_embeddings (memory_id, time_window, model, version, source, embedding)
+                    SELECT s.id, s.time_window, $1, $2, s.embedding_source, s.embedding
+                    FROM memories_staging s
+                    JOIN ins i ON i.id = s.id
+                    ON CONFLICT (memory_id, model) DO NOTHING
+                )
+                SELECT s.id AS staged_id, COALESCE(i.id, (
+                    -- 重复记录优先取当前小时桶；按参数在执行时裁剪分区，只扫描两个小时桶所在的分区
+                    SELECT m.id FROM memories m
+                    WHERE m.session_id = s.session_id
+                      AND m.content_hash = s.content_hash
+                      AND m.time_window IN (s.time_window, s.previous_window)
+                    ORDER BY m.time_window DESC
+                    LIMIT 1
+                )) AS memory_id
+                FROM memories_staging s
+                LEFT JOIN ins i ON i.id = s.id
+            ''', self.embedding_model, self.embedding_version)
+        
+        return {row['staged_id']: row['memory_id'] for row in rows}
+    
     @retry(max_attempts=3, initial_delay=0.5)
     @circuit_breaker("memory_storage_search", failure_threshold=5, recovery_timeout=60)
     async def search(self, query_embedding: np.ndarray, limit: int = 10,
-                    session_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """向量相似度搜索 - 带重试和断路器保护"""
+                    session_id: Optional[str] = None, lean: bool = False) -> List[Dict[str, Any]]:
+        """向量相似度搜索 - 带重试和断路器保护
+        
+        检索模式由 search_config['mode'] 决定：
+            - exact: 对完整 4096 维 embedding 顺序扫描（默认）
+            - ann: 先在降维列 embedding_ann 的 HNSW 索引上召回候选，再用完整 embedding 精排
+            - binary: 先按二值列 embedding_bin 的 Hamming 距离取 N×limit 个候选，再用完整 embedding 精排
+        
+        lean=True 时只返回截断的正文片段与精简元数据（见 _result_columns），
+        需要完整正文时再通过 get_many 按ID批量获取。
+        """
         try:
-            embedding_list = query_embedding.tolist()
+            # 以 float32 数组传参，由 vector 二进制编解码器直接发送
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            
+            mode = self.search_config.get('mode', 'exact')
+            if mode == 'ann':
+                results = await self._search_ann(query_vector, limit, session_id, lean)
+            elif mode == 'binary':
+                results = await self._search_binary(query_vector, limit, session_id, lean)
+            else:
+                results = await self._search_exact(query_vector, limit, session_id, lean)
+            
+            # 转换结果
+            return [self._row_to_result(row, lean) for row in results]
             
-            # 将向量列表转换为 PostgreSQL vector 格式的字符串
-            embedding_str = '[' + ','.join(map(str, embedding_list)) + ']'
+        except CircuitBreakerOpenError:
+            logger.error("存储搜索断路器已打开，拒绝请求")
+            raise
+        except Exception as e:
+            logger.error(f"搜索记忆失败：{e}")
+            raise
+    
+    async def _search_exact(self, query_vector: np.ndarray, limit: int,
+                            session_id: Optional[str], lean: bool = False) -> list:
+        """精确检索：基于 pgvector 余弦距离的全量扫描"""
+        args = [query_vector, limit, self.embedding_model]
+        if session_id:
+            args.append(session_id)
+        
+        query = f'''
+            WITH nearest AS (
+                SELECT memory_id, time_window, embedding <=> $1::vector AS distance
+                FROM memory_embeddings
+                WHERE {self._embedding_scope('$3', '$4' if session_id else None)}
+                ORDER BY distance
+                LIMIT $2
+            )
+            {self._join_nearest(lean)}
+        '''
+        
+        return await self.db.fetch(query, *args)
+    
+    async def _search_ann(self, query_vector: np.ndarray, limit: int,
+                          session_id: Optional[str], lean: bool = False) -> list:
+        """近似检索：降维 HNSW 索引召回候选，完整 embedding 精排
+        
+        查询向量的截断与归一化在 SQL 中完成，与 add_ann_embedding.sql 的触发器保持同一公式。
+        """
+        candidates = max(int(self.search_config.get('ann_candidates', 200)), limit)
+        ef_search = min(max(int(self.search_config.get('hnsw_ef_search', 200)), candidates), MAX_EF_SEARCH)
+        
+        args = [query_vector, candidates, limit, self.embedding_model]
+        if session_id:
+            args.append(session_id)
+        
+        query = f'''
+            WITH candidates AS (
+                SELECT memory_id, time_window, embedding
+                FROM memory_embeddings
+                WHERE embedding_ann IS NOT NULL
+                  AND {self._embedding_scope('$4', '$5' if session_id else None)}
+                ORDER BY embedding_ann <=> l2_normalize(subvector($1::vector, 1, {ANN_DIMENSION}))::vector({ANN_DIMENSION})
+                LIMIT $2
+            ),
+            nearest AS (
+                SELECT memory_id, time_window, embedding <=> $1::vector AS distance
+                FROM candidates
+                ORDER BY distance
+                LIMIT $3
+            )
+            {self._join_nearest(lean)}
+        '''
+        
+        return await self.db.fetch_with_settings(
+            {'hnsw.ef_search': ef_search}, query, *args
+        )
+    
+    async def _search_binary(self, query_vector: np.ndarray, limit: int,
+                             session_id: Optional[str], lean: bool = False) -> list:
+        """二值预筛检索：Hamming 距离召回 N×limit 个候选，完整 embedding 精排
+        
+        预筛阶段只读取 512 字节的 embedding_bin，不解压 16KB 的完整向量。
+        """
+        rescore_factor = max(int(self.search_config.get('binary_rescore_factor', 10)), 1)
+        
+        args = [query_vector, limit * rescore_factor, limit, self.embedding_model]
+        if session_id:
+            args.append(session_id)
+        
+        query = f'''
+            WITH candidates AS (
+                SELECT memory_id, time_window, embedding
+                FROM memory_embeddings
+                WHERE embedding_bin IS NOT NULL
+                  AND {self._embedding_scope('$4', '$5' if session_id else None)}
+                ORDER BY embedding_bin <~> binary_quantize($1::vector)
+                LIMIT $2
+            ),
+            nearest AS (
+                SELECT memory_id, time_window, embedding <=> $1::vector AS distance
+                FROM candidates
+                ORDER BY distance
+                LIMIT $3
+            )
+            {self._join_nearest(lean)}
+        '''
+        
+        return await self.db.fetch(query, *args)
+    
+    @staticmethod
+    def _embedding_scope(model_param: str, session_param: Optional[str] = None) -> str:
+        """memory_embeddings 上的过滤条件：限定模型，可选限定会话（经 memories 的 session_id 索引取ID）"""
+        scope = f'model = {model_param}'
+        if session_param:
+            scope += f' AND memory_id IN (SELECT id FROM memories WHERE session_id = {session_param})'
+        return scope
+    
+    def _join_nearest(self, lean: bool) -> str:
+        """将 nearest(memory_id, time_window, distance) 关联回 memories，按距离输出结果列"""
+        return f'''
+            SELECT {self._result_columns(lean, 'm.')},
+                   1 - n.distance as similarity
+            FROM nearest n
+            JOIN memories m ON m.id = n.memory_id AND m.time_window = n.time_window
+            ORDER BY n.distance
+        '''
+    
+    @retry(max_attempts=3, initial_delay=0.5)
+    @circuit_breaker("memory_storage_search", failure_threshold=5, recovery_timeout=60)
+    async def search_hybrid(self, query_embedding: np.ndarray, query_text: str,
+                            limit: int = 10, session_id: Optional[str] = None,
+                            lean: bool = False) -> List[Dict[str, Any]]:
+        """混合检索 - 向量与文本候选在一条 SQL 中按倒数排名融合（RRF）
+        
+        score = Σ 1 / (rrf_k + rank)，向量候选沿用 search_config['mode'] 的检索方式，
+        文本候选与 search_by_text 的匹配规则一致。lean 的含义同 search。
+        
+        Returns:
+            按融合得分排序的结果，附带 vector_rank / text_rank / rrf_score
+        """
+        try:
+            query_vector = np.asarray(query_embedding, dtype=np.float32)
+            candidates = max(int(self.search_config.get('hybrid_candidates', 50)), limit)
+            rrf_k = int(self.search_config.get('rrf_k', 60))
             
-            # 构建查询 - 使用 pgvector 的余弦相似度
+            args = [query_vector, self._to_websearch_query(query_text), candidates, limit, rrf_k,
+                    f'%{query_text}%']
+            session_filter = ''
             if session_id:
-                query = '''
-                    SELECT id, session_id, user_input, assistant_response, 
-                           metadata, created_at,
-                           1 - (embedding <=> $1::vector) as similarity
-                    FROM memories
-                    WHERE session_id = $2
-                    ORDER BY embedding <=> $1::vector
-                    LIMIT $3
-                '''
-                results = await self.db.fetch(query, embedding_str, session_id, limit)
+                args.append(session_id)
+                session_filter = f'AND session_id = ${len(args)}'
+            args.append(self.embedding_model)
+            model_param = f'${len(args)}'
+            scope = self._embedding_scope(model_param, f'${len(args) - 1}' if session_id else None)
+            
+            vector_source, settings = self._hybrid_vector_source(scope, args)
+            query = f'''
+                WITH vec AS (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY distance) AS rank
+                    FROM ({vector_source}) v
+                ),
+                lex AS (
+                    SELECT id, ROW_NUMBER() OVER (ORDER BY text_score DESC, created_at DESC) AS rank
+                    FROM ({self._lexical_candidates_sql('$2', '$6', '$3', session_filter)}) t
+                ),
+                fused AS (
+                    SELECT COALESCE(vec.id, lex.id) AS id,
+                           vec.rank AS vector_rank,
+                           lex.rank AS text_rank,
+                           COALESCE(1.0 / ($5::int + vec.rank), 0)
+                             + COALESCE(1.0 / ($5::int + lex.rank), 0) AS rrf_score
+                    FROM vec
+                    FULL OUTER JOIN lex ON lex.id = vec.id
+                    ORDER BY rrf_score DESC
+                    LIMIT $4
+                )
+                SELECT {self._result_columns(lean, 'm.')},
+                       1 - (e.embedding <=> $1::vector) AS similarity,
+                       f.vector_rank, f.text_rank, f.rrf_score
+                FROM fused f
+                JOIN memories m ON m.id = f.id
+                LEFT JOIN memory_embeddings e ON e.memory_id = f.id AND e.model = {model_param}
+                ORDER BY f.rrf_score DESC
+            '''
+            
+            if settings:
+                results = await self.db.fetch_with_settings(settings, query, *args)
             else:
-                query = '''
-                    SELECT id, session_id, user_input, assistant_response, 
-                           metadata, created_at,
-                           1 - (embedding <=> $1::vector) as similarity
-                    FROM memories
-                    ORDER BY embedding <=> $1::vector
-                    LIMIT $2
-                '''
-                results = await self.db.fetch(query, embedding_str, limit)
+                results = await self.db.fetch(query, *args)
             
-            # 转换结果
-            memories = []
-            for row in results:
-                memory = {
-                    'id': str(row['id']),
-                    'session_id': row['session_id'],
-                    'user_input': row['user_input'],
-                    'assistant_response': row['assistant_response'],
-                    'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                    'created_at': row['created_at'].astimezone().isoformat(),
-                    'similarity': float(row['similarity'])
-                }
-                memories.append(memory)
+            return [self._row_to_result(row, lean) for row in results]
             
-            return memories
+        except CircuitBreakerOpenError:
+            logger.error("混合检索断路器已打开，拒绝请求")
+            raise
+        except Exception as e:
+            logger.error(f"混合检索失败：{e}")
+            raise
+    
+    def _hybrid_vector_source(self, scope: str, args: list) -> Tuple[str, Dict[str, Any]]:
+        """混合检索的向量候选子查询（id, distance），按 search_config['mode'] 选择检索方式
+        
+        $1 为查询向量、$3 为候选数量，scope 为 memory_embeddings 上的过滤条件（见 _embedding_scope）；
+        需要的额外参数追加到 args 末尾。
+        
+        Returns:
+            (子查询 SQL, 需要设置的会话参数)
+        """
+        mode = self.search_config.get('mode', 'exact')
+        
+        if mode == 'ann':
+            prefilter = max(int(self.search_config.get('ann_candidates', 200)), args[2])
+            args.append(prefilter)
+            ef_search = min(max(int(self.search_config.get('hnsw_ef_search', 200)), prefilter), MAX_EF_SEARCH)
+            prefilter_sql = f'''
+                SELECT memory_id, embedding FROM memory_embeddings
+                WHERE embedding_ann IS NOT NULL AND {scope}
+                ORDER BY embedding_ann <=> l2_normalize(subvector($1::vector, 1, {ANN_DIMENSION}))::vector({ANN_DIMENSION})
+                LIMIT ${len(args)}
+            '''
+            settings = {'hnsw.ef_search': ef_search}
+        elif mode == 'binary':
+            rescore_factor = max(int(self.search_config.get('binary_rescore_factor', 10)), 1)
+            args.append(args[2] * rescore_factor)
+            prefilter_sql = f'''
+                SELECT memory_id, embedding FROM memory_embeddings
+                WHERE embedding_bin IS NOT NULL AND {scope}
+                ORDER BY embedding_bin <~> binary_quantize($1::vector)
+                LIMIT ${len(args)}
+            '''
+            settings = {}
+        else:
+            return f'''
+                SELECT memory_id AS id, embedding <=> $1::vector AS distance
+                FROM memory_embeddings
+                WHERE {scope}
+                ORDER BY distance
+                LIMIT $3
+            ''', {}
+        
+        return f'''
+            SELECT c.memory_id AS id, c.embedding <=> $1::vector AS distance
+            FROM ({prefilter_sql}) c
+            ORDER BY distance
+            LIMIT $3
+        ''', settings
+    
+    def _result_columns(self, lean: bool, alias: str = '') -> str:
+        """检索结果的投影列
+        
+        lean 投影只传输截断到 snippet_chars 的正文片段、正文长度，以及去掉
+        tool_calls / thinking_content 的元数据（工具名单独提取为 tool_names），
+        避免每次检索搬运整段对话。
+        """
+        p = alias
+        if not lean:
+            return f"{p}id, {p}session_id, {p}user_input, {p}assistant_response, {p}metadata, {p}created_at"
+        
+        snippet_chars = int(self.search_config.get('snippet_chars', 300))
+        return f'''{p}id, {p}session_id, {p}created_at,
+                   left({p}user_input, {snippet_chars}) AS user_input,
+                   left({p}assistant_response, {snippet_chars}) AS assistant_response,
+                   char_length({p}user_input) AS user_input_length,
+                   char_length({p}assistant_response) AS assistant_response_length,
+                   COALESCE({p}metadata, '{{}}'::jsonb) - 'tool_calls' - 'thinking_content'
+                     || jsonb_build_object('tool_names',
+                            jsonb_path_query_array({p}metadata, '$.tool_calls[*].tool_name', '{{}}', true))
+                     AS metadata'''
+    
+    @staticmethod
+    def _row_to_result(row, lean: bool) -> Dict[str, Any]:
+        """将检索结果行转换为字典，lean 投影额外标记正文是否被截断
+        
+        混合检索中只由文本命中、当前模型下没有向量的记忆 similarity 为 NULL，不输出该字段。
+        """
+        result = record_to_memory(row)
+        if 'similarity' in result and result['similarity'] is None:
+            del result['similarity']
+        if lean:
+            result['truncated'] = (
+                (row['user_input_length'] or 0) > len(row['user_input'] or '')
+                or (row['assistant_response_length'] or 0) > len(row['assistant_response'] or '')
+            )
+        return result
+    
+    # get_many 允许获取的列
+    _HYDRATABLE_FIELDS = (
+        'session_id', 'user_input', 'assistant_response', 'metadata',
+        'created_at', 'updated_at', 'is_agent_report', 'agent_metadata'
+    )
+    
+    @retry(max_attempts=3, initial_delay=0.5)
+    @circuit_breaker("memory_storage_get", failure_threshold=5, recovery_timeout=60)
+    async def get_many(self, memory_ids: List[str],
+                       fields: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """按ID批量获取记忆的指定字段（一次查询）
+        
+        Args:
+            memory_ids: 记忆ID列表
+            fields: 需要的字段，默认 user_input / assistant_response / metadata
+            
+        Returns:
+            按输入顺序排列的记忆字典，不存在的ID被跳过
+        """
+        if not memory_ids:
+            return []
+        
+        fields = list(fields or ('user_input', 'assistant_response', 'metadata'))
+        unknown = set(fields) - set(self._HYDRATABLE_FIELDS)
+        if unknown:
+            raise ValueError(f"不支持的字段：{sorted(unknown)}")
+        
+        try:
+            query = f'''
+                SELECT id, {', '.join(fields)}
+                FROM memories
+                WHERE id = ANY($1::uuid[])
+            '''
+            rows = await self.db.fetch(query, [str(memory_id) for memory_id in memory_ids])
+            
+            by_id = {}
+            for row in rows:
+                memory = record_to_memory(row)
+                by_id[memory['id']] = memory
+            
+            return [by_id[str(memory_id)] for memory_id in memory_ids if str(memory_id) in by_id]
             
         except CircuitBreakerOpenError:
-            logger.error("存储搜索断路器已打开，拒绝请求")
+            logger.error("批量获取断路器已打开，拒绝请求")
             raise
         except Exception as e:
-            logger.error(f"搜索记忆失败：{e}")
+            logger.error(f"批量获取记忆失败：{e}")
             raise
     
     async def get_by_id(self, memory_id: str) -> Optional[Dict[str, Any]]:
@@ -287,14 +928,7 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             row = await self.db.fetchrow(query, uuid.UUID(memory_id))
             
             if row:
-                return {
-                    'id': str(row['id']),
-                    'session_id': row['session_id'],
-                    'user_input': row['user_input'],
-                    'assistant_response': row['assistant_response'],
-                    'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                    'created_at': row['created_at'].astimezone().isoformat()
-                }
+                return record_to_memory(row)
             
             return None
             
@@ -311,7 +945,7 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             
             if 'metadata' in updates:
                 set_clauses.append(f"metadata = ${len(values) + 1}")
-                values.append(json.dumps(updates['metadata'], ensure_ascii=False))
+                values.append(updates['metadata'])
             
             if 'user_input' in updates:
                 set_clauses.append(f"user_input = ${len(values) + 1}")
@@ -321,6 +955,10 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
                 set_clauses.append(f"assistant_response = ${len(values) + 1}")
                 values.append(updates['assistant_response'])
             
+            if 'session_id' in updates:
+                set_clauses.append(f"session_id = ${len(values) + 1}")
+                values.append(updates['session_id'])
+            
             if not set_clauses:
                 return True
             
@@ -337,7 +975,26 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
                 WHERE id = ${len(values)}
             '''
             
-            result = await self.db.execute(query, *values)
+            if 'session_id' not in updates:
+                result = await self.db.execute(query, *values)
+                return 'UPDATE' in result
+            
+            # 改换会话：在同一事务内调整两个会话的 sessions 统计
+            async with self.db.acquire() as conn:
+                async with conn.transaction():
+                    previous = await conn.fetchrow(
+                        'SELECT session_id, created_at FROM memories WHERE id = $1 FOR UPDATE',
+                        values[-1]
+                    )
+                    if previous is None:
+                        return False
+                    
+                    result = await conn.execute(query, *values)
+                    if previous['session_id'] != updates['session_id']:
+                        await self._move_session_stats(
+                            conn, previous['session_id'], updates['session_id'], 1,
+                            previous['created_at'], previous['created_at']
+                        )
             return 'UPDATE' in result
             
         except Exception as e:
@@ -355,20 +1012,171 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             logger.error(f"删除记忆失败：{e}")
             raise
     
-    async def list_sessions(self) -> List[Dict[str, Any]]:
-        """列出所有会话"""
+    @retry(max_attempts=3, initial_delay=0.5)
+    @circuit_breaker("memory_storage_delete", failure_threshold=5, recovery_timeout=60)
+    async def delete_session(self, session_id: str, batch_size: int = 5000) -> int:
+        """删除会话的全部记忆 - 集合操作，按主键区间分批
+        
+        每个区间一条 DELETE 语句、独立提交，大会话不会长时间占用连接或持有行锁；
+        sessions 统计由删除触发器维护。
+        
+        Args:
+            session_id: 会话ID
+            batch_size: 每批最多删除的记忆数
+            
+        Returns:
+            删除的记忆数量
+        """
         try:
-            query = '''
-                SELECT session_id, COUNT(*) as memory_count,
-                       MIN(created_at) as created_at,
-                       MAX(created_at) as last_active
+            deleted = 0
+            for lower, upper in await self._session_id_ranges(session_id, batch_size):
+                result = await self.db.execute(
+                    f'DELETE FROM memories m WHERE m.session_id = $1 {self._ID_RANGE_FILTER}',
+                    session_id, lower, upper
+                )
+                deleted += int(result.split()[-1])
+            
+            return deleted
+            
+        except CircuitBreakerOpenError:
+            logger.error("删除断路器已打开，拒绝请求")
+            raise
+        except Exception as e:
+            logger.error(f"删除会话失败：{e}")
+            raise
+    
+    @retry(max_attempts=3, initial_delay=0.5)
+    @circuit_breaker("memory_storage_update", failure_threshold=5, recovery_timeout=60)
+    async def merge_sessions(self, source_session_id: str, target_session_id: str,
+                             batch_size: int = 5000) -> Dict[str, int]:
+        """将源会话的记忆合并到目标会话 - 集合操作，按主键区间分批
+        
+        每个区间在一个事务内完成：改写 session_id，目标会话同一时间窗口内已有相同内容的记录
+        （去重唯一索引会冲突）直接删除，随后调整两个会话的统计行。
+        
+        Args:
+            source_session_id: 源会话ID
+            target_session_id: 目标会话ID
+            batch_size: 每批最多处理的记忆数
+            
+        Returns:
+            {'merged': 迁移的记忆数, 'duplicates': 因重复而删除的记忆数}
+        """
+        if source_session_id == target_session_id:
+            return {'merged': 0, 'duplicates': 0}
+        
+        duplicate_in_target = '''
+            SELECT 1 FROM memories t
+            WHERE t.session_id = $2
+              AND t.content_hash = m.content_hash
+              AND t.time_window = m.time_window
+        '''
+        query = f'''
+            WITH moved AS (
+                UPDATE memories m
+                SET session_id = $2, updated_at = CURRENT_TIMESTAMP
+                WHERE m.session_id = $1 {self._ID_RANGE_FILTER}
+                  AND NOT EXISTS ({duplicate_in_target})
+                RETURNING m.created_at
+            ), duplicates AS (
+                DELETE FROM memories m
+                WHERE m.session_id = $1 {self._ID_RANGE_FILTER}
+                  AND EXISTS ({duplicate_in_target})
+                RETURNING 1
+            )
+            SELECT (SELECT COUNT(*) FROM moved) AS merged,
+                   (SELECT MIN(created_at) FROM moved) AS first_at,
+                   (SELECT MAX(created_at) FROM moved) AS last_at,
+                   (SELECT COUNT(*) FROM duplicates) AS duplicates
+        '''
+        
+        try:
+            merged = duplicates = 0
+            for lower, upper in await self._session_id_ranges(source_session_id, batch_size):
+                async with self.db.acquire() as conn:
+                    async with conn.transaction():
+                        row = await conn.fetchrow(query, source_session_id, target_session_id, lower, upper)
+                        if row['merged']:
+                            await self._move_session_stats(
+                                conn, source_session_id, target_session_id,
+                                row['merged'], row['first_at'], row['last_at']
+                            )
+                merged += row['merged']
+                duplicates += row['duplicates']
+            
+            return {'merged': merged, 'duplicates': duplicates}
+            
+        except CircuitBreakerOpenError:
+            logger.error("更新断路器已打开，拒绝请求")
+            raise
+        except Exception as e:
+            logger.error(f"合并会话失败：{e}")
+            raise
+    
+    # 主键区间过滤（$3 / $4 为 NULL 表示不设下界 / 上界），配合 _session_id_ranges 使用
+    _ID_RANGE_FILTER = 'AND ($3::uuid IS NULL OR m.id > $3) AND ($4::uuid IS NULL OR m.id <= $4)'
+    
+    async def _session_id_ranges(self, session_id: str,
+                                 batch_size: int) -> List[Tuple[Optional[uuid.UUID], Optional[uuid.UUID]]]:
+        """将会话记忆按主键切成每段至多 batch_size 条的左开右闭区间
+        
+        只读取 id 列，一次扫描得到全部分段边界；首尾区间不设界，覆盖扫描后新写入的记录。
+        """
+        bounds = await self.db.fetch('''
+            SELECT id FROM (
+                SELECT id, row_number() OVER (ORDER BY id) AS rn
                 FROM memories
-                WHERE session_id IS NOT NULL
-                GROUP BY session_id
-                ORDER BY last_active DESC
+                WHERE session_id = $1
+            ) t
+            WHERE rn % $2 = 0
+            ORDER BY id
+        ''', session_id, batch_size)
+        
+        edges = [None] + [row['id'] for row in bounds] + [None]
+        return list(zip(edges[:-1], edges[1:]))
+    
+    @staticmethod
+    async def _move_session_stats(conn, source_session_id: str, target_session_id: str,
+                                  moved: int, first_at: datetime, last_at: datetime) -> None:
+        """记忆改换会话后调整 sessions 统计（触发器只覆盖 INSERT / DELETE）"""
+        await conn.execute('''
+            WITH source AS (
+                UPDATE sessions s SET
+                    memory_count = GREATEST(s.memory_count - $3, 0),
+                    first_memory_at = (SELECT MIN(m.created_at) FROM memories m WHERE m.session_id = s.id),
+                    last_memory_at = (SELECT MAX(m.created_at) FROM memories m WHERE m.session_id = s.id)
+                WHERE s.id = $1
+            )
+            INSERT INTO sessions AS s (id, memory_count, first_memory_at, last_memory_at, last_active)
+            SELECT $2, $3, $4, $5, $5
+            WHERE $2::text IS NOT NULL
+            ON CONFLICT (id) DO UPDATE SET
+                memory_count = s.memory_count + EXCLUDED.memory_count,
+                first_memory_at = LEAST(s.first_memory_at, EXCLUDED.first_memory_at),
+                last_memory_at = GREATEST(s.last_memory_at, EXCLUDED.last_memory_at),
+                last_active = GREATEST(s.last_active, EXCLUDED.last_active)
+        ''', source_session_id, target_session_id, moved, first_at, last_at)
+    
+    async def list_sessions(self, limit: Optional[int] = None,
+                          offset: int = 0) -> List[Dict[str, Any]]:
+        """列出会话（读取触发器维护的 sessions 表，按最近记忆时间倒序分页）
+        
+        Args:
+            limit: 每页数量，None 表示不限
+            offset: 偏移量
+        """
+        try:
+            query = '''
+                SELECT id AS session_id, memory_count,
+                       first_memory_at AS created_at,
+                       last_memory_at AS last_active
+                FROM sessions
+                WHERE memory_count > 0
+                ORDER BY last_memory_at DESC, id
+                LIMIT $1 OFFSET $2
             '''
             
-            results = await self.db.fetch(query)
+            results = await self.db.fetch(query, limit, offset)
             
             sessions = []
             for row in results:
@@ -409,65 +1217,95 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
                 '''
                 results = await self.db.fetch(query, session_id)
             
-            memories = []
-            for row in results:
-                memories.append({
-                    'id': str(row['id']),
-                    'session_id': row['session_id'],
-                    'user_input': row['user_input'],
-                    'assistant_response': row['assistant_response'],
-                    'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                    'created_at': row['created_at'].astimezone().isoformat()
-                })
-            
-            return memories
+            return [record_to_memory(row) for row in results]
             
         except Exception as e:
             logger.error(f"获取会话记忆失败：{e}")
             raise
     
+    async def iter_session_memories(self, session_id: str, batch_size: int = 500,
+                                    after: Optional[Tuple[str, str]] = None) -> AsyncIterator[Dict[str, Any]]:
+        """按时间正序流式遍历会话记忆（键集分页）
+        
+        每页一条 (created_at, id) > 游标 的查询，页与页之间归还连接，
+        内存占用只与 batch_size 有关，不随会话大小增长。
+        
+        Args:
+            session_id: 会话ID
+            batch_size: 每页读取的记忆数
+            after: 续读游标，即上一条记忆的 (created_at, id)，None 表示从头开始
+            
+        Yields:
+            记忆字典
+        """
+        first_page = '''
+            SELECT id, session_id, user_input, assistant_response,
+                   metadata, created_at
+            FROM memories
+            WHERE session_id = $1
+            ORDER BY created_at, id
+            LIMIT $2
+        '''
+        # created_at >= $3 让 (session_id, created_at) 索引直接定位到游标位置
+        next_page = '''
+            SELECT id, session_id, user_input, assistant_response,
+                   metadata, created_at
+            FROM memories
+            WHERE session_id = $1
+              AND created_at >= $3
+              AND (created_at, id) > ($3, $4)
+            ORDER BY created_at, id
+            LIMIT $2
+        '''
+        
+        cursor = None
+        if after is not None:
+            cursor = (datetime.fromisoformat(after[0]), uuid.UUID(after[1]))
+        
+        try:
+            while True:
+                if cursor is None:
+                    rows = await self.db.fetch(first_page, session_id, batch_size)
+                else:
+                    rows = await self.db.fetch(next_page, session_id, batch_size, *cursor)
+                
+                for row in rows:
+                    yield record_to_memory(row)
+                
+                if len(rows) < batch_size:
+                    return
+                cursor = (rows[-1]['created_at'], rows[-1]['id'])
+            
+        except Exception as e:
+            logger.error(f"遍历会话记忆失败：{e}")
+            raise
+    
     @retry(max_attempts=3, initial_delay=0.5)
     @circuit_breaker("memory_storage_text_search", failure_threshold=5, recovery_timeout=60)
     async def search_by_text(self, query: str, limit: int = 10,
                            session_id: Optional[str] = None) -> List[Dict[str, Any]]:
-        """文本搜索 - 带重试和断路器保护"""
+        """文本搜索 - 带重试和断路器保护
+        
+        全文检索（search_vector，ts_rank 打分）与子串匹配（pg_trgm 索引加速的 ILIKE）取并集，
+        按相关度、时间倒序排列。
+        """
         try:
-            search_pattern = f'%{query}%'
-            
+            args = [self._to_websearch_query(query), f'%{query}%', limit]
+            session_filter = ''
             if session_id:
-                query_sql = '''
-                    SELECT id, session_id, user_input, assistant_response, 
-                           metadata, created_at
-                    FROM memories
-                    WHERE session_id = $1 
-                    AND (user_input ILIKE $2 OR assistant_response ILIKE $2)
-                    ORDER BY created_at DESC
-                    LIMIT $3
-                '''
-                results = await self.db.fetch(query_sql, session_id, search_pattern, limit)
-            else:
-                query_sql = '''
-                    SELECT id, session_id, user_input, assistant_response, 
-                           metadata, created_at
-                    FROM memories
-                    WHERE user_input ILIKE $1 OR assistant_response ILIKE $1
-                    ORDER BY created_at DESC
-                    LIMIT $2
-                '''
-                results = await self.db.fetch(query_sql, search_pattern, limit)
-            
-            memories = []
-            for row in results:
-                memories.append({
-                    'id': str(row['id']),
-                    'session_id': row['session_id'],
-                    'user_input': row['user_input'],
-                    'assistant_response': row['assistant_response'],
-                    'metadata': json.loads(row['metadata']) if row['metadata'] else {},
-                    'created_at': row['created_at'].astimezone().isoformat()
-                })
+                args.append(session_id)
+                session_filter = 'AND session_id = $4'
+            
+            query_sql = f'''
+                SELECT m.id, m.session_id, m.user_input, m.assistant_response,
+                       m.metadata, m.created_at, t.text_score
+                FROM ({self._lexical_candidates_sql('$1', '$2', '$3', session_filter)}) t
+                JOIN memories m ON m.id = t.id
+                ORDER BY t.text_score DESC, t.created_at DESC
+            '''
+            results = await self.db.fetch(query_sql, *args)
             
-            return memories
+            return [record_to_memory(row) for row in results]
             
         except CircuitBreakerOpenError:
             logger.error("文本搜索断路器已打开，拒绝请求")
@@ -476,35 +1314,74 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             logger.error(f"文本搜索失败：{e}")
             raise
     
+    @staticmethod
+    def _lexical_candidates_sql(tsquery_param: str, pattern_param: str, limit_param: str,
+                                session_filter: str) -> str:
+        """文本候选子查询（id, created_at, text_score）
+        
+        search_vector 命中由 GIN 索引提供，ILIKE 子串命中由 pg_trgm 索引提供，规划器可合并为 BitmapOr。
+        """
+        return f'''
+            SELECT id, created_at,
+                   COALESCE(ts_rank(search_vector, websearch_to_tsquery('simple', {tsquery_param})), 0) AS text_score
+            FROM memories
+            WHERE (
+                search_vector @@ websearch_to_tsquery('simple', {tsquery_param})
+                OR user_input ILIKE {pattern_param}
+                OR assistant_response ILIKE {pattern_param}
+            ) {session_filter}
+            ORDER BY text_score DESC, created_at DESC
+            LIMIT {limit_param}
+        '''
+    
+    @staticmethod
+    def _to_websearch_query(text: str) -> str:
+        """将查询文本转换为 websearch_to_tsquery 输入
+        
+        每个词加引号作为短语；中文按单字切分，短语查询要求各字相邻，
+        与 sage_cjk_segment 的建索引方式对应，例如 数据库 -> "数 据 库"。
+        """
+        terms = []
+        for term in text.split():
+            segmented = _CJK_CHARS.sub(r' \1 ', term.replace('"', ' ')).split()
+            if segmented:
+                terms.append('"' + ' '.join(segmented) + '"')
+        return ' '.join(terms)
+    
     async def get_statistics(self, session_id: Optional[str] = None) -> Dict[str, Any]:
-        """获取统计信息"""
+        """获取统计信息（读取 sessions 表，代价与会话数成正比）"""
         try:
             if session_id:
                 query = '''
-                    SELECT COUNT(*) as total,
-                           MIN(created_at) as first_memory,
-                           MAX(created_at) as last_memory
-                    FROM memories
-                    WHERE session_id = $1
+                    SELECT memory_count as total,
+                           first_memory_at as first_memory,
+                           last_memory_at as last_memory
+                    FROM sessions
+                    WHERE id = $1
                 '''
                 row = await self.db.fetchrow(query, session_id)
             else:
+                # 未归属会话的记忆不进入 sessions，单独计数（走 session_id 索引）
                 query = '''
-                    SELECT COUNT(*) as total,
-                           COUNT(DISTINCT session_id) as session_count,
-                           MIN(created_at) as first_memory,
-                           MAX(created_at) as last_memory
-                    FROM memories
+                    SELECT COALESCE(SUM(memory_count), 0)::bigint
+                               + (SELECT COUNT(*) FROM memories WHERE session_id IS NULL) as total,
+                           COUNT(*) FILTER (WHERE memory_count > 0) as session_count,
+                           MIN(first_memory_at) as first_memory,
+                           MAX(last_memory_at) as last_memory
+                    FROM sessions
                 '''
                 row = await self.db.fetchrow(query)
             
+            if row is None:
+                return {'total_memories': 0, 'first_memory': None, 'last_memory': None}
+            
             stats = {
                 'total_memories': row['total'],
                 'first_memory': row['first_memory'].astimezone().isoformat() if row['first_memory'] else None,
                 'last_memory': row['last_memory'].astimezone().isoformat() if row['last_memory'] else None
             }
             
-            if not session_id and 'session_count' in row:
+            if not session_id:
                 stats['session_count'] = row['session_count']
             
             return stats
@@ -519,8 +1396,7 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
             return {}
         
         # 序列化检查大小
-        metadata_json = json.dumps(metadata, ensure_ascii=False)
-        metadata_size = len(metadata_json.encode('utf-8'))
+        metadata_size = len(dumps_json(metadata))
         
         # 设置合理的限制（100KB）
         MAX_METADATA_SIZE = 100 * 1024
@@ -562,8 +1438,7 @@ class MemoryStorage(IMemoryProvider, TransactionalStorage):
                         optimized_metadata[field] = value
             
             # 检查优化后的大小
-            optimized_json = json.dumps(optimized_metadata, ensure_ascii=False)
-            optimized_size = len(optimized_json.encode('utf-8'))
+            optimized_size = len(dumps_json(optimized_metadata))
             
             logger.info(f"元数据优化完成：{metadata_size} -> {optimized_size} bytes")
             
@@ -7,10 +7,11 @@ TextGenerator - 文本生成处理 (使用 SiliconFlow 云端 API)
 import os
 import time
 import logging
-import requests
 from typing import List, Dict, Any, Optional
 from dotenv import load_dotenv
 from ..interfaces.ai_compressor import AICompressor
+from ..utils.http import get_http_client
+from ..utils.rate_limit import get_rate_limiter
 
 # 加载环境变量
 load_dotenv()
@@ -80,12 +81,14 @@ class TextGenerator(AICompressor):
             
             logger.info(f"[文本生成] 开始调用SiliconFlow API，消息数量: {len(messages)}")
             
-            response = requests.post(
-                f"{self.base_url}/chat/completions",
-                headers=headers,
-                json=data,
-                timeout=kwargs.get("timeout", 30)
-            )
+            async with get_rate_limiter('chat').limit() as limiter:
+                response = await get_http_client().post(
+                    f"{self.base_url}/chat/completions",
+                    headers=headers,
+                    json=data,
+                    timeout=kwargs.get("timeout", 30)
+                )
+                limiter.record(response)
             response.raise_for_status()
             
             result = response.json()
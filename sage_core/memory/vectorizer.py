@@ -1,15 +1,17 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
 """
-Vectorizer - 文本向量化处理 (使用 SiliconFlow 云端 API)
-重构版本：完全基于云端 API，不加载本地模型
+Vectorizer - 文本向量化处理
+默认使用 SiliconFlow 云端 API；可换用本地 CPU 等后端（见 embedding_backends.py）
 """
+import asyncio
 import numpy as np
-from typing import List, Union, Optional
-import requests
-import os
+from typing import Dict, List, Set, Tuple, Union, Optional
 import logging
 from dotenv import load_dotenv
+from .embedding_backends import EmbeddingBackend, SiliconFlowBackend
+from .embedding_cache import EmbeddingCache
+from ..utils.rate_limit import PRIORITY_BACKGROUND, current_priority, request_priority
 
 # 加载环境变量
 load_dotenv()
@@ -18,120 +20,342 @@ logger = logging.getLogger(__name__)
 
 
 class TextVectorizer:
-    """文本向量化器 - 使用 SiliconFlow API"""
+    """文本向量化器 - 默认使用 SiliconFlow API"""
+    
+    # 向量来源，写入 memory_embeddings.source
+    SOURCE_API = 'api'
+    SOURCE_LOCAL = 'local'
+    SOURCE_FALLBACK = 'fallback'
+    
+    # 降级向量的特征哈希参数
+    _NGRAM_SIZES = (1, 2, 3)
+    _HASH_PRIME = np.uint64(0x100000001B3)
+    _HASH_MIX = np.uint64(0xBF58476D1CE4E5B9)
     
     def __init__(self, model_name: str = "Qwen/Qwen3-Embedding-8B", 
-                 device: str = "cpu"):
+                 device: str = "cpu", dimension: int = 4096, version: int = 1,
+                 batch_size: int = 32, max_batch_tokens: int = 32768,
+                 cache: Optional[EmbeddingCache] = None, batch_window_ms: float = 5,
+                 backend: Optional[EmbeddingBackend] = None):
         """初始化向量化器
         
         Args:
-            model_name: 模型名称 (用于 API 调用)
-            device: 设备类型 (兼容参数，实际使用云端)
+            model_name: 模型名称 (用于 API 调用；指定 backend 时以后端的模型名为准)
+            device: 设备类型 (兼容参数，由后端决定)
+            dimension: 模型输出维度
+            version: 向量版本，写入 memory_embeddings.version
+            batch_size: 单次请求的最大文本条数
+            max_batch_tokens: 单次请求的 token 预算（按字符数估算）
+            cache: 向量缓存（可选），命中的片段不调用 API
+            batch_window_ms: 微批窗口（毫秒），窗口内并发到达的片段合并成一次批量请求
+            backend: 向量化后端（默认 SiliconFlow API，需要 SILICONFLOW_API_KEY）
         """
-        self.model_name = model_name
-        self.api_key = os.getenv('SILICONFLOW_API_KEY')
-        if not self.api_key:
-            raise ValueError("SILICONFLOW_API_KEY 环境变量未设置")
-        self.base_url = "https://api.siliconflow.cn/v1"
-        self._initialized = True
+        self.backend = backend or SiliconFlowBackend(model_name, dimension)
+        # 模型名同时是 memory_embeddings 中的代际标识，不同后端的向量不会混用
+        self.model_name = self.backend.model_name
+        self.dimension = dimension
+        self.version = version
+        self.batch_size = max(batch_size, 1)
+        self.max_batch_tokens = max_batch_tokens
+        self.cache = cache
+        self.batch_window = max(batch_window_ms, 0) / 1000
+        # 单飞与微批状态：片段 -> 在途 Future，以及等待发送的片段队列
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._inflight: Dict[str, asyncio.Future] = {}
+        self._queue: List[str] = []
+        self._flush_scheduled = False
+        self._flush_tasks: Set[asyncio.Task] = set()
+        # 微批内等待方的最高优先级（数值最小），发送时按此优先级排队限流
+        self._queue_priority = PRIORITY_BACKGROUND
+        self._initialized = False
     
     async def initialize(self) -> None:
-        """异步初始化（使用 API 无需加载模型）"""
+        """异步初始化（后端在首次调用时自行加载）"""
         if self._initialized:
             return
         
-        logger.info(f"使用 SiliconFlow API 进行向量化：{self.model_name}")
+        logger.info(f"使用 {type(self.backend).__name__} 进行向量化：{self.model_name}")
         self._initialized = True
     
     async def vectorize(self, text: Union[str, List[str]], enable_chunking: bool = True, chunk_size: int = 8000) -> np.ndarray:
         """将文本转换为向量（使用 SiliconFlow API）
         
+        所有文本及长文本的分块先展开为一个列表，按条数与 token 预算打包成批量请求，
+        经后端的并发控制发送，结果按原顺序写回，再按文本聚合分块向量：
+        按块长度加权平均后重新归一化，末尾的短块不会与完整块同权。
+        
         Args:
             text: 输入文本或文本列表
             enable_chunking: 是否启用智能分块
             chunk_size: 单个块的大小（字符数）
             
         Returns:
-            向量数组 (4096 维)
+            向量数组 (get_dimension() 维)
         """
+        single_input = isinstance(text, str)
+        texts = [text] if single_input else text
+        
+        embeddings_np, _, _ = await self._embed_texts(texts, enable_chunking, chunk_size)
+        
+        # 如果输入是单个文本，返回一维数组
+        if single_input:
+            return embeddings_np[0]
+        
+        return embeddings_np
+    
+    async def vectorize_with_source(self, text: Union[str, List[str]], enable_chunking: bool = True,
+                                    chunk_size: int = 8000) -> Tuple[np.ndarray, Union[str, List[str]]]:
+        """向量化并返回每个文本的向量来源（后端的 SOURCE_API / SOURCE_LOCAL，或 SOURCE_FALLBACK）
+        
+        任一分块使用了降级向量时，该文本记为 SOURCE_FALLBACK，保存时写入 memory_embeddings.source，
+        便于 API 恢复后重新向量化。
+        
+        Returns:
+            (向量, 来源)；单个文本时分别为一维数组与字符串
+        """
+        single_input = isinstance(text, str)
+        texts = [text] if single_input else text
+        
+        embeddings_np, _, sources = await self._embed_texts(texts, enable_chunking, chunk_size)
+        
+        if single_input:
+            return embeddings_np[0], sources[0]
+        
+        return embeddings_np, sources
+    
+    async def vectorize_chunks(self, text: Union[str, List[str]], chunk_size: int = 8000
+                               ) -> Tuple[np.ndarray, List[List[Tuple[str, np.ndarray]]]]:
+        """向量化文本并保留分块向量，用于段落级检索
+        
+        Args:
+            text: 输入文本或文本列表
+            chunk_size: 单个块的大小（字符数）
+            
+        Returns:
+            (聚合向量, 每个文本的 [(块文本, 块向量), ...])；单个文本时聚合向量为一维数组，
+            分块列表只含该文本一项
+        """
+        single_input = isinstance(text, str)
+        texts = [text] if single_input else text
+        
+        embeddings_np, chunks, _ = await self._embed_texts(texts, True, chunk_size)
+        
+        if single_input:
+            return embeddings_np[0], chunks
+        
+        return embeddings_np, chunks
+    
+    async def _embed_texts(self, texts: List[str], enable_chunking: bool, chunk_size: int
+                           ) -> Tuple[np.ndarray, List[List[Tuple[str, np.ndarray]]], List[str]]:
+        """展开分块、批量向量化并聚合，返回 (len(texts), dimension) 数组、每个文本的分块向量与向量来源"""
         if not self._initialized:
             await self.initialize()
         
-        # 确保输入是列表
-        if isinstance(text, str):
-            texts = [text]
-            single_input = True
-        else:
-            texts = text
-            single_input = False
+        if not texts:
+            return np.empty((0, self.dimension), dtype=np.float32), [], []
         
-        # 处理超长文本的分块向量化
-        all_embeddings = []
-        for t in texts:
+        # 展开为待向量化片段，owners[i] 为第 i 个片段所属文本的下标
+        pieces: List[str] = []
+        owners: List[int] = []
+        for index, t in enumerate(texts):
             if enable_chunking and len(t) > chunk_size:
                 # 智能分块处理
-                chunks = self._smart_chunk_text(t, chunk_size)
-                chunk_embeddings = []
-                
-                for chunk in chunks:
-                    chunk_embedding = await self._vectorize_single_text(chunk)
-                    chunk_embeddings.append(chunk_embedding)
-                
-                # 聚合块向量（取平均值）
-                aggregated_embedding = np.mean(chunk_embeddings, axis=0)
-                all_embeddings.append(aggregated_embedding)
-                
+                chunks = self._smart_chunk_text(t, chunk_size) or [t]
                 logger.info(f"长文本分块处理：{len(chunks)}个块，原文本{len(t)}字符")
             else:
-                # 正常单文本向量化
-                embedding = await self._vectorize_single_text(t)
-                all_embeddings.append(embedding)
+                chunks = [t]
+            pieces.extend(chunks)
+            owners.extend([index] * len(chunks))
         
-        # 转换为 numpy 数组
-        embeddings_np = np.array(all_embeddings, dtype=np.float32)
+        piece_embeddings, piece_sources = await self._vectorize_pieces(pieces)
         
-        # 如果输入是单个文本，返回一维数组
-        if single_input:
-            return embeddings_np[0]
+        # 聚合块向量：片段按文本连续排列，按块长度加权按段求和后除以总长度
+        owners_np = np.asarray(owners)
+        starts = np.flatnonzero(np.r_[True, owners_np[1:] != owners_np[:-1]])
+        ends = np.r_[starts[1:], len(owners_np)]
+        weights = np.array([max(len(p), 1) for p in pieces], dtype=np.float32)
+        embeddings_np = (np.add.reduceat(piece_embeddings * weights[:, None], starts, axis=0)
+                         / np.add.reduceat(weights, starts)[:, None]).astype(np.float32)
         
-        return embeddings_np
+        # 多块文本的平均向量模长小于 1，重新归一化；单块文本保持 API 原值
+        multi = (ends - starts) > 1
+        if multi.any():
+            norms = np.linalg.norm(embeddings_np[multi], axis=1, keepdims=True)
+            embeddings_np[multi] /= np.where(norms > 0, norms, 1)
+        
+        chunks_per_text = [
+            [(pieces[i], piece_embeddings[i]) for i in range(start, end)]
+            for start, end in zip(starts, ends)
+        ]
+        sources = [
+            self.SOURCE_FALLBACK if self.SOURCE_FALLBACK in piece_sources[start:end] else self.backend.source
+            for start, end in zip(starts, ends)
+        ]
+        return embeddings_np, chunks_per_text, sources
+    
+    def _pack_batches(self, pieces: List[str]) -> List[List[int]]:
+        """按条数上限与 token 预算把片段打包成批，返回每批的片段下标
+        
+        token 数按字符数估算（中文约一字一 token，对英文偏保守）；
+        单个片段超过预算时独占一批。
+        """
+        batches: List[List[int]] = []
+        current: List[int] = []
+        current_tokens = 0
+        for index, piece in enumerate(pieces):
+            tokens = max(len(piece), 1)
+            if current and (len(current) >= self.batch_size
+                            or current_tokens + tokens > self.max_batch_tokens):
+                batches.append(current)
+                current, current_tokens = [], 0
+            current.append(index)
+            current_tokens += tokens
+        if current:
+            batches.append(current)
+        return batches
+    
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        """在途请求与微批队列绑定当前事件循环，事件循环变化时重置"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._inflight = {}
+            self._queue = []
+            self._flush_scheduled = False
+            self._queue_priority = PRIORITY_BACKGROUND
+        return loop
+    
+    async def _vectorize_pieces(self, pieces: List[str]) -> Tuple[np.ndarray, List[str]]:
+        """批量、并发地向量化片段，返回与输入顺序一致的 (len(pieces), dimension) 数组及每个片段的向量来源
+        
+        相同片段只请求一次；配置了缓存时先查缓存。未命中的片段若已有在途请求则等待其结果，
+        否则登记新的在途请求并放入微批队列，batch_window 内到达的片段合并成批量请求。
+        """
+        result = np.empty((len(pieces), self.dimension), dtype=np.float32)
+        # 缓存只保存后端向量（键含模型名），命中的片段来源为当前后端
+        sources = [self.backend.source] * len(pieces)
+        
+        # 相同片段合并，positions[text] 为其在 pieces 中的全部位置
+        positions: Dict[str, List[int]] = {}
+        for index, piece in enumerate(pieces):
+            positions.setdefault(piece, []).append(index)
+        unique = list(positions)
+        
+        pending = unique
+        if self.cache is not None:
+            keys = [EmbeddingCache.make_key(t, self.model_name, self.dimension) for t in unique]
+            try:
+                cached = await self.cache.get_many(keys)
+            except Exception as e:
+                logger.warning(f"读取向量缓存失败：{e}")
+                cached = {}
+            pending = []
+            for key, text in zip(keys, unique):
+                vector = cached.get(key)
+                if vector is not None:
+                    result[positions[text]] = vector
+                else:
+                    pending.append(text)
+        if not pending:
+            return result, sources
+        
+        loop = self._bind_loop()
+        futures = []
+        queued = 0
+        for text in pending:
+            future = self._inflight.get(text)
+            if future is None:
+                future = loop.create_future()
+                self._inflight[text] = future
+                self._queue.append(text)
+                queued += 1
+            futures.append(future)
+        self._queue_priority = min(self._queue_priority, current_priority())
+        if queued and not self._flush_scheduled:
+            self._flush_scheduled = True
+            loop.call_later(self.batch_window, self._start_flush)
+        
+        # shield：调用方被取消时不影响其他等待同一请求的调用方
+        outcomes = await asyncio.gather(*(asyncio.shield(f) for f in futures))
+        for text, (embedding, source) in zip(pending, outcomes):
+            result[positions[text]] = embedding
+            for index in positions[text]:
+                sources[index] = source
+        return result, sources
+    
+    def _start_flush(self) -> None:
+        """取出微批队列并在后台发送"""
+        texts, self._queue = self._queue, []
+        priority, self._queue_priority = self._queue_priority, PRIORITY_BACKGROUND
+        self._flush_scheduled = False
+        if texts:
+            with request_priority(priority):
+                task = asyncio.ensure_future(self._flush(texts))
+            self._flush_tasks.add(task)
+            task.add_done_callback(self._flush_tasks.discard)
     
-    async def _vectorize_single_text(self, text: str) -> np.ndarray:
-        """向量化单个文本（内部方法）"""
+    async def _flush(self, texts: List[str]) -> None:
+        """把一次微批的片段打包成批量请求并发发送，结果交给在途请求的等待方
+        
+        API 成功返回的向量写回缓存（降级的哈希向量不缓存）；写缓存完成后才移除在途登记，
+        期间到达的相同片段仍等待同一结果。
+        """
+        fetched: Dict[bytes, np.ndarray] = {}
+        
+        async def run(batch: List[int]) -> None:
+            batch_texts = [texts[i] for i in batch]
+            # 并发由后端控制：API 后端经共享限流器按优先级放行，本地后端受线程池大小限制
+            try:
+                embeddings = await self._request_embeddings(batch_texts)
+                source = self.backend.source
+            except Exception as e:
+                logger.error(f"API 向量化失败：{e}")
+                # 降级到哈希向量化，维度与配置一致
+                embeddings = self.hash_vectorize(batch_texts)
+                source = self.SOURCE_FALLBACK
+            else:
+                if self.cache is not None:
+                    for text, embedding in zip(batch_texts, embeddings):
+                        fetched[EmbeddingCache.make_key(text, self.model_name, self.dimension)] = embedding
+            for text, embedding in zip(batch_texts, embeddings):
+                future = self._inflight.get(text)
+                if future is not None and not future.done():
+                    future.set_result((embedding, source))
         
         try:
-            headers = {
-                "Authorization": f"Bearer {self.api_key}",
-                "Content-Type": "application/json"
-            }
-            
-            data = {
-                "model": self.model_name,
-                "input": text,
-                "encoding_format": "float"
-            }
-            
-            response = requests.post(
-                f"{self.base_url}/embeddings",
-                headers=headers,
-                json=data,
-                timeout=30
-            )
-            response.raise_for_status()
-            
-            result = response.json()
-            embedding = result['data'][0]['embedding']
-            
-            # 确保返回 4096 维向量
-            if len(embedding) != 4096:
-                raise ValueError(f"期望 4096 维向量，但得到 {len(embedding)} 维")
-            
-            return np.array(embedding, dtype=np.float32)
+            batches = self._pack_batches(texts)
+            await asyncio.gather(*(run(batch) for batch in batches))
+            if len(batches) > 1:
+                logger.info(f"批量向量化：{len(texts)}个片段，{len(batches)}个请求")
             
-        except Exception as e:
-            logger.error(f"API 向量化失败：{e}")
-            # 降级到哈希向量化，但使用 4096 维
-            return self._hash_vectorize_single(text)
+            if fetched:
+                try:
+                    await self.cache.put_many(fetched)
+                except Exception as e:
+                    logger.warning(f"写入向量缓存失败：{e}")
+        except BaseException as e:
+            for text in texts:
+                future = self._inflight.get(text)
+                if future is None or future.done():
+                    continue
+                if isinstance(e, Exception):
+                    future.set_exception(e)
+                else:
+                    future.cancel()
+            raise
+        finally:
+            for text in texts:
+                self._inflight.pop(text, None)
+    
+    async def _request_embeddings(self, texts: List[str]) -> np.ndarray:
+        """通过后端向量化一批文本，返回 (len(texts), dimension) 数组；失败时抛出异常"""
+        embeddings = await self.backend.embed(texts)
+        
+        # 确保返回维度与配置一致
+        if embeddings.shape[1] != self.dimension:
+            raise ValueError(f"期望 {self.dimension} 维向量，但得到 {embeddings.shape[1]} 维")
+        
+        return embeddings
     
     def _smart_chunk_text(self, text: str, chunk_size: int) -> List[str]:
         """智能分块文本，保持语义完整性"""
@@ -200,30 +424,50 @@ class TextVectorizer:
         return [s.strip() + '.' for s in sentences if s.strip()]
     
     def _hash_vectorize_single(self, text: str) -> np.ndarray:
-        """单个文本的哈希向量化（降级方案）"""
-        # 使用哈希函数生成固定长度向量
-        hash_value = hash(text)
-        np.random.seed(abs(hash_value) % (2**32))
-        vector = np.random.randn(4096).astype(np.float32)
-        # 归一化
-        vector = vector / np.linalg.norm(vector)
-        return vector
-    
-    def _hash_vectorize(self, text: Union[str, List[str]]) -> np.ndarray:
-        """简单的哈希向量化（降级方案） - 兼容性保留
+        """单个文本的哈希向量化（降级方案）
+        
+        对字符 1~3-gram 做特征哈希：固定的 64 位乘法哈希决定维度下标与符号，
+        不依赖按进程随机化的 hash()，也不改动全局随机数状态，同一文本在 hook 进程与 MCP 服务中
+        得到相同向量；共享 n-gram 越多的文本余弦相似度越高。
+        """
+        codes = np.frombuffer(text.encode('utf-32-le'), dtype=np.uint32).astype(np.uint64)
+        vector = np.zeros(self.dimension, dtype=np.float64)
+        for n in self._NGRAM_SIZES:
+            count = len(codes) - n + 1
+            if count <= 0:
+                break
+            hashes = np.full(count, n, dtype=np.uint64)
+            for offset in range(n):
+                hashes = (hashes ^ codes[offset:offset + count]) * self._HASH_PRIME
+            # 末端混合（splitmix64），让高位与低位都充分依赖输入
+            hashes ^= hashes >> np.uint64(31)
+            hashes *= self._HASH_MIX
+            hashes ^= hashes >> np.uint64(29)
+            signs = np.where(hashes >> np.uint64(63), -1.0, 1.0)
+            vector += np.bincount((hashes % np.uint64(self.dimension)).astype(np.intp),
+                                  weights=signs, minlength=self.dimension)
+        
+        # 归一化；空文本使用固定的单位向量
+        norm = np.linalg.norm(vector)
+        if norm == 0:
+            vector[0], norm = 1.0, 1.0
+        return (vector / norm).astype(np.float32)
+    
+    def hash_vectorize(self, text: Union[str, List[str]]) -> np.ndarray:
+        """字符 n-gram 哈希向量化（降级方案，不依赖后端，结果跨进程稳定）
         
         Args:
             text: 输入文本
             
         Returns:
-            4096维向量
+            get_dimension() 维向量
         """
         if isinstance(text, str):
             return self._hash_vectorize_single(text)
         else:
             vectors = [self._hash_vectorize_single(t) for t in text]
-            return np.array(vectors)
+            return np.array(vectors, dtype=np.float32).reshape(len(vectors), self.dimension)
     
     def get_dimension(self) -> int:
         """获取向量维度"""
-        return 4096  # Qwen3-Embedding-8B 的实际维度
\ No newline at end of file
+        return self.dimension
\ No newline at end of file
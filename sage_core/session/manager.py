@@ -43,11 +43,10 @@ class SessionManager:
         Args:
             session_id: 目标会话ID
         """
-        # 验证会话是否存在
-        sessions = await self.list_sessions()
-        session_ids = [s['session_id'] for s in sessions]
+        # 验证会话是否存在（按主键读取 sessions 统计行）
+        info = await self.memory_manager.get_session_info(session_id)
         
-        if session_id not in session_ids:
+        if not info['memory_count']:
             # 如果会话不存在，创建一个新的
             logger.warning(f"会话 {session_id} 不存在，将创建新会话")
         
@@ -64,13 +63,18 @@ class SessionManager:
         """
         return self.current_session_id
     
-    async def list_sessions(self) -> List[Dict[str, Any]]:
-        """列出所有会话
+    async def list_sessions(self, limit: Optional[int] = None,
+                          offset: int = 0) -> List[Dict[str, Any]]:
+        """列出会话
+        
+        Args:
+            limit: 每页数量，None 表示不限
+            offset: 偏移量
         
         Returns:
             会话列表
         """
-        return await self.memory_manager.list_sessions()
+        return await self.memory_manager.list_sessions(limit=limit, offset=offset)
     
     async def get_session_info(self, session_id: Optional[str] = None) -> Dict[str, Any]:
         """获取会话信息
@@ -97,14 +101,10 @@ class SessionManager:
             logger.warning("不能删除当前会话")
             return False
         
-        # 获取会话的所有记忆
-        memories = await self.memory_manager.storage.get_session_memories(session_id)
+        # 按主键区间分批的集合删除，不再逐条加载与删除
+        deleted = await self.memory_manager.storage.delete_session(session_id)
         
-        # 删除每个记忆
-        for memory in memories:
-            await self.memory_manager.storage.delete(memory['id'])
-        
-        logger.info(f"已删除会话 {session_id} 的 {len(memories)} 条记忆")
+        logger.info(f"已删除会话 {session_id} 的 {deleted} 条记忆")
         return True
     
     async def merge_sessions(self, source_session_id: str, 
@@ -118,15 +118,8 @@ class SessionManager:
         Returns:
             合并的记忆数量
         """
-        # 获取源会话的所有记忆
-        memories = await self.memory_manager.storage.get_session_memories(source_session_id)
-        
-        # 更新每个记忆的会话ID
-        for memory in memories:
-            await self.memory_manager.storage.update(
-                memory['id'],
-                {'session_id': target_session_id}
-            )
-        
-        logger.info(f"已将 {len(memories)} 条记忆从会话 {source_session_id} 合并到 {target_session_id}")
-        return len(memories)
\ No newline at end of file
+        result = await self.memory_manager.storage.merge_sessions(source_session_id, target_session_id)
+        
+        logger.info(f"已将 {result['merged']} 条记忆从会话 {source_session_id} 合并到 {target_session_id}，"
+                    f"删除重复 {result['duplicates']} 条")
+        return result['merged']
\ No newline at end of file
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+共享的异步 HTTP 客户端
+向量化、重排与文本生成共用一个 httpx.AsyncClient：长连接池复用 TLS 连接，
+安装了 h2 时启用 HTTP/2 多路复用；请求在事件循环内异步执行，可被取消。
+"""
+import asyncio
+import logging
+import os
+from typing import Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+_client: Optional[httpx.AsyncClient] = None
+_client_loop: Optional[asyncio.AbstractEventLoop] = None
+
+
+def _http2_available() -> bool:
+    """HTTP/2 需要可选依赖 h2"""
+    try:
+        import h2  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+
+def _create_client() -> httpx.AsyncClient:
+    """按环境变量创建客户端"""
+    limits = httpx.Limits(
+        max_connections=int(os.getenv("SAGE_HTTP_MAX_CONNECTIONS", "20")),
+        max_keepalive_connections=int(os.getenv("SAGE_HTTP_MAX_KEEPALIVE", "10")),
+        keepalive_expiry=float(os.getenv("SAGE_HTTP_KEEPALIVE_EXPIRY", "60"))
+    )
+    # 单次请求可在调用处用 timeout= 覆盖
+    timeout = httpx.Timeout(
+        float(os.getenv("SAGE_HTTP_TIMEOUT", "30")),
+        connect=float(os.getenv("SAGE_HTTP_CONNECT_TIMEOUT", "5"))
+    )
+    http2 = _http2_available()
+    logger.info(f"创建共享 HTTP 客户端：HTTP/2={'启用' if http2 else '未启用'}，最大连接数 {limits.max_connections}")
+    return httpx.AsyncClient(http2=http2, limits=limits, timeout=timeout)
+
+
+def get_http_client() -> httpx.AsyncClient:
+    """获取当前事件循环上的共享客户端（首次调用时创建）
+
+    连接池绑定创建时的事件循环，事件循环变化（如多次 asyncio.run）时重新创建。
+    """
+    global _client, _client_loop
+    loop = asyncio.get_running_loop()
+    if _client is None or _client.is_closed or _client_loop is not loop:
+        _client = _create_client()
+        _client_loop = loop
+    return _client
+
+
+async def close_http_client() -> None:
+    """关闭共享客户端，释放连接池"""
+    global _client, _client_loop
+    if _client is not None and not _client.is_closed:
+        await _client.aclose()
+    _client = None
+    _client_loop = None
@@ -0,0 +1,252 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+SiliconFlow 调用的客户端限流
+向量化、重排与文本生成按端点（embeddings / rerank / chat）各有一个限流器，进程内共享：
+- 令牌桶限制请求速率（每秒请求数 + 突发量）
+- AIMD 并发控制：成功时并发上限缓慢增加，429/503 或超时时减半
+- 响应带 Retry-After 时，在该时间之前不再放行该端点的请求
+- 排队的请求按优先级放行：交互请求（generate_prompt）先于普通请求，后台保存最后
+"""
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import logging
+import os
+import time
+from email.utils import parsedate_to_datetime
+from typing import Any, Dict, Iterator, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# 优先级：数值越小越先放行
+PRIORITY_INTERACTIVE = 0
+PRIORITY_NORMAL = 1
+PRIORITY_BACKGROUND = 2
+
+_priority: contextvars.ContextVar = contextvars.ContextVar('sage_request_priority', default=PRIORITY_NORMAL)
+
+
+def current_priority() -> int:
+    """当前上下文的请求优先级"""
+    return _priority.get()
+
+
+@contextlib.contextmanager
+def request_priority(priority: int) -> Iterator[None]:
+    """在代码块内（含其中创建的任务）以指定优先级发起 API 请求"""
+    token = _priority.set(priority)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+def parse_retry_after(value: Optional[str]) -> Optional[float]:
+    """解析 Retry-After（秒数或 HTTP 日期），返回需要等待的秒数"""
+    if not value:
+        return None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return None
+
+
+class AdaptiveRateLimiter:
+    """单个端点的令牌桶 + AIMD 并发限流器"""
+
+    # 两次减半之间的最小间隔（秒），同一波 429 只减一次
+    _DECREASE_INTERVAL = 1.0
+
+    def __init__(self, name: str, rate: float, burst: int, max_concurrency: int,
+                 min_concurrency: int = 1):
+        """初始化限流器
+
+        Args:
+            name: 端点名称
+            rate: 每秒请求数
+            burst: 令牌桶容量
+            max_concurrency: 并发上限的上界（初始值）
+            min_concurrency: 并发上限的下界
+        """
+        self.name = name
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1)
+        self.max_concurrency = max(max_concurrency, 1)
+        self.min_concurrency = max(min(min_concurrency, self.max_concurrency), 1)
+        self.concurrency = float(self.max_concurrency)
+        self.in_flight = 0
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._blocked_until = 0.0
+        self._last_decrease = 0.0
+        self._waiters: list = []
+        self._seq = itertools.count()
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self.stats = {"requests": 0, "throttled": 0, "queued": 0}
+
+    def _bind_loop(self) -> asyncio.AbstractEventLoop:
+        """等待队列绑定当前事件循环，事件循环变化时重置"""
+        loop = asyncio.get_running_loop()
+        if self._loop is not loop:
+            self._loop = loop
+            self._waiters = []
+            self._timer = None
+            self.in_flight = 0
+        return loop
+
+    def _refill(self, now: float) -> None:
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _try_take(self) -> bool:
+        """有并发余量且有令牌时占用一个名额"""
+        now = time.monotonic()
+        self._refill(now)
+        if now < self._blocked_until or self.in_flight >= int(self.concurrency) or self._tokens < 1:
+            return False
+        self._tokens -= 1
+        self.in_flight += 1
+        return True
+
+    def _wake(self) -> None:
+        """按优先级放行排队的请求；受速率或 Retry-After 限制时定时重试"""
+        while self._waiters:
+            future = self._waiters[0][2]
+            if future.done():
+                heapq.heappop(self._waiters)
+                continue
+            if not self._try_take():
+                break
+            heapq.heappop(self._waiters)
+            future.set_result(None)
+
+        if self._waiters and self._timer is None and self.in_flight < int(self.concurrency):
+            now = time.monotonic()
+            delay = max(self._blocked_until - now, (1 - self._tokens) / self.rate, 0.001)
+            self._timer = self._loop.call_later(delay, self._on_timer)
+
+    def _on_timer(self) -> None:
+        self._timer = None
+        self._wake()
+
+    async def acquire(self, priority: Optional[int] = None) -> None:
+        """等待放行（占用一个并发名额，需配对调用 release）"""
+        loop = self._bind_loop()
+        self.stats["requests"] += 1
+        if not self._waiters and self._try_take():
+            return
+
+        future = loop.create_future()
+        priority = current_priority() if priority is None else priority
+        heapq.heappush(self._waiters, (priority, next(self._seq), future))
+        self.stats["queued"] += 1
+        self._wake()
+        try:
+            await future
+        except asyncio.CancelledError:
+            # 已放行但调用方被取消：归还名额
+            if future.done() and not future.cancelled():
+                self.release()
+            raise
+
+    def release(self) -> None:
+        """归还并发名额"""
+        self.in_flight = max(self.in_flight - 1, 0)
+        if self._loop is not None:
+            self._wake()
+
+    def on_success(self) -> None:
+        """加性增：每个成功响应把并发上限提高 1/上限，约每轮提高 1"""
+        if self.concurrency < self.max_concurrency:
+            self.concurrency = min(self.max_concurrency, self.concurrency + 1 / self.concurrency)
+
+    def on_overload(self, retry_after: Optional[float] = None) -> None:
+        """乘性减：并发上限减半；有 Retry-After 时在其之前暂停放行"""
+        now = time.monotonic()
+        self.stats["throttled"] += 1
+        if now - self._last_decrease >= self._DECREASE_INTERVAL:
+            self._last_decrease = now
+            self.concurrency = max(self.min_concurrency, self.concurrency / 2)
+            logger.warning(f"[限流] {self.name} 过载，并发上限降为 {int(self.concurrency)}"
+                           + (f"，{retry_after:.1f}秒后恢复" if retry_after else ""))
+        if retry_after:
+            self._blocked_until = max(self._blocked_until, now + retry_after)
+
+    def record(self, response: Any) -> None:
+        """根据响应调整限流参数"""
+        if response.status_code in (429, 503):
+            self.on_overload(parse_retry_after(response.headers.get('Retry-After')))
+        elif response.status_code < 500:
+            self.on_success()
+
+    @contextlib.asynccontextmanager
+    async def limit(self, priority: Optional[int] = None):
+        """放行后执行代码块，结束时归还名额；请求超时视为过载"""
+        await self.acquire(priority)
+        try:
+            yield self
+        except httpx.TimeoutException:
+            self.on_overload()
+            raise
+        finally:
+            self.release()
+
+    def get_status(self) -> Dict[str, Any]:
+        """当前限额与排队情况"""
+        now = time.monotonic()
+        self._refill(now)
+        return {
+            "rate": self.rate,
+            "burst": self.burst,
+            "tokens": round(self._tokens, 2),
+            "concurrency_limit": int(self.concurrency),
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.in_flight,
+            "queue_depth": sum(1 for _, _, future in self._waiters if not future.done()),
+            "blocked_for": round(max(self._blocked_until - now, 0.0), 2),
+            **self.stats
+        }
+
+
+# 各端点的默认额度：(每秒请求数, 突发量, 并发上限)；embeddings 的并发上限默认取 EMBEDDING_MAX_CONCURRENCY
+_DEFAULT_BUDGETS = {
+    "embeddings": (10.0, 10, None),
+    "rerank": (5.0, 5, 4),
+    "chat": (2.0, 2, 2)
+}
+
+_limiters: Dict[str, AdaptiveRateLimiter] = {}
+
+
+def get_rate_limiter(endpoint: str) -> AdaptiveRateLimiter:
+    """获取端点的共享限流器（首次调用时按 SAGE_RATE_<端点>_* 环境变量创建）"""
+    limiter = _limiters.get(endpoint)
+    if limiter is None:
+        rate, burst, concurrency = _DEFAULT_BUDGETS.get(endpoint, (5.0, 5, 4))
+        if concurrency is None:
+            concurrency = int(os.getenv("EMBEDDING_MAX_CONCURRENCY") or 4)
+        prefix = f"SAGE_RATE_{endpoint.upper()}"
+        # 留空的环境变量使用默认值
+        limiter = AdaptiveRateLimiter(
+            endpoint,
+            rate=float(os.getenv(f"{prefix}_RPS") or rate),
+            burst=int(os.getenv(f"{prefix}_BURST") or burst),
+            max_concurrency=int(os.getenv(f"{prefix}_CONCURRENCY") or concurrency)
+        )
+        _limiters[endpoint] = limiter
+    return limiter
+
+
+def get_rate_limit_status() -> Dict[str, Dict[str, Any]]:
+    """所有已创建的限流器的状态"""
+    return {name: limiter.get_status() for name, limiter in _limiters.items()}
@@ -11,9 +11,12 @@ import asyncio
 import json
 import logging
 import os
+import re
 import sys
+from datetime import datetime
 from pathlib import Path
 from typing import Any, Dict, List, Optional
+from urllib.parse import parse_qs, urlparse
 
 # Add parent directory to path
 sys.path.insert(0, str(Path(__file__).parent))
@@ -52,6 +55,47 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# sage://sessions/page 默认每页会话数
+SESSIONS_PAGE_SIZE = 50
+
+# export_session 工具的输出目录
+export_dir = os.environ.get('SAGE_EXPORT_DIR', str(get_project_root() / 'exports'))
+
+EXPORT_EXTENSIONS = {"jsonl": "jsonl", "markdown": "md"}
+
+
+def parse_page_param(params: Dict[str, List[str]], name: str, default: int, minimum: int) -> int:
+    """解析分页查询参数，非整数或越界时给出明确的错误"""
+    value = params.get(name, [default])[0]
+    try:
+        number = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid resource parameter {name}={value!r}: expected an integer")
+    if number < minimum:
+        raise ValueError(f"Invalid resource parameter {name}={value!r}: must be >= {minimum}")
+    return number
+
+
+async def export_session_to_file(sage_core, session_id: str, format: str, directory: str) -> Dict[str, Any]:
+    """把 iter_export_session 的数据块逐块写入文件，内存占用与会话大小无关
+
+    Returns:
+        {"path": 文件路径, "bytes": 写入字节数}
+    """
+    if format not in EXPORT_EXTENSIONS:
+        raise ValueError(f"Unsupported export format: {format!r} (expected jsonl or markdown)")
+    os.makedirs(directory, exist_ok=True)
+    safe_id = re.sub(r'[^\w.-]', '_', session_id)
+    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+    path = os.path.join(directory, f"{safe_id}_{timestamp}.{EXPORT_EXTENSIONS[format]}")
+
+    written = 0
+    with open(path, 'wb') as f:
+        async for chunk in sage_core.iter_export_session(session_id, format):
+            f.write(chunk)
+            written += len(chunk)
+    return {"path": path, "bytes": written}
+
 
 class SageMCPStdioServerV3:
     """MCP stdio server 基于 sage_core 的实现"""
@@ -166,6 +210,25 @@ class SageMCPStdioServerV3:
                         "required": ["action"]
                     }
                 ),
+                Tool(
+                    name="export_session",
+                    description="流式导出会话记忆到文件（按时间正序），返回文件路径",
+                    inputSchema={
+                        "type": "object",
+                        "properties": {
+                            "session_id": {
+                                "type": "string",
+                                "description": "会话ID（默认当前会话）"
+                            },
+                            "format": {
+                                "type": "string",
+                                "description": "导出格式：jsonl 每行一条记忆，markdown 为可读文档",
+                                "enum": ["jsonl", "markdown"],
+                                "default": "jsonl"
+                            }
+                        }
+                    }
+                ),
                 Tool(
                     name="generate_prompt",
                     description="基于上下文生成智能提示",
@@ -296,6 +359,16 @@ class SageMCPStdioServerV3:
                     output = "\n".join(output_lines)
                     return [TextContent(type="text", text=output)]
                 
+                elif name == "export_session":
+                    session_id = arguments.get("session_id")
+                    if not session_id:
+                        session_id = (await self.sage_core.memory_manager.get_session_info())['session_id']
+                    result = await export_session_to_file(
+                        self.sage_core, session_id, arguments.get("format", "jsonl"), export_dir
+                    )
+                    output = f"会话 {session_id} 已导出到 {result['path']}（{result['bytes']} 字节）"
+                    return [TextContent(type="text", text=output)]
+                
                 elif name == "generate_prompt":
                     prompt = await self.sage_core.generate_prompt(
                         context=arguments["context"],
@@ -400,6 +473,16 @@ class SageMCPStdioServerV3:
                 )
             )
             
+            # 分页的会话列表
+            resources.append(
+                Resource(
+                    uri="sage://sessions/page",
+                    name="会话列表（分页）",
+                    description=f"按页读取会话：?limit=&offset=（默认每页 {SESSIONS_PAGE_SIZE} 个），返回下一页的 offset",
+                    mimeType="application/json"
+                )
+            )
+            
             # 添加系统状态资源
             resources.append(
                 Resource(
@@ -424,12 +507,14 @@ class SageMCPStdioServerV3:
             if uri.startswith("sage://session/"):
                 # 读取特定会话
                 session_id = uri.split("/")[-1]
-                memories = await self.sage_core.memory_manager.storage.get_session_memories(session_id)
+                storage = self.sage_core.memory_manager.storage
+                stats = await storage.get_statistics(session_id)
+                memories = await storage.get_session_memories(session_id, limit=10)  # 限制返回数量
                 
                 content = {
                     "session_id": session_id,
-                    "memory_count": len(memories),
-                    "memories": memories[:10]  # 限制返回数量
+                    "memory_count": stats["total_memories"],
+                    "memories": memories
                 }
                 
                 return ResourceContents(
@@ -448,6 +533,26 @@ class SageMCPStdioServerV3:
                     text=json.dumps(sessions, indent=2, ensure_ascii=False)
                 )
             
+            elif urlparse(uri)._replace(query="").geturl() == "sage://sessions/page":
+                # 分页读取会话列表：sage://sessions/page?limit=50&offset=0
+                params = parse_qs(urlparse(uri).query)
+                limit = parse_page_param(params, "limit", SESSIONS_PAGE_SIZE, 1)
+                offset = parse_page_param(params, "offset", 0, 0)
+                sessions = await self.sage_core.memory_manager.list_sessions(limit=limit, offset=offset)
+                
+                content = {
+                    "sessions": sessions,
+                    "limit": limit,
+                    "offset": offset,
+                    "next_offset": offset + limit if len(sessions) == limit else None
+                }
+                
+                return ResourceContents(
+                    uri=uri,
+                    mimeType="application/json",
+                    text=json.dumps(content, indent=2, ensure_ascii=False)
+                )
+            
             elif uri == "sage://system/status":
                 # 读取系统状态
                 status = await self.sage_core.get_status()
@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+记忆分区归档脚本
+将早于保留期的月度分区（memories_pYYYYMM）从 memories 上分离并改名为 memories_archive_pYYYYMM。
+使用 DETACH PARTITION ... CONCURRENTLY，分离过程中 memories 的读写不受阻塞。
+分离后的表可用 pg_dump -t 导出后删除，或保留在库中按需查询。
+
+用法：
+    python scripts/archive_memory_partitions.py [--keep-months 12] [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import re
+from datetime import datetime, timezone
+
+import asyncpg
+from dotenv import load_dotenv
+
+# 设置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+PARTITION_PATTERN = re.compile(r'^memories_p(\d{6})$')
+
+
+def cutoff_month(keep_months: int) -> str:
+    """返回保留期起始月份 YYYYMM（当月计为保留期第一个月）"""
+    now = datetime.now(timezone.utc)
+    months = now.year * 12 + now.month - 1 - (keep_months - 1)
+    return f"{months // 12:04d}{months % 12 + 1:02d}"
+
+
+class PartitionArchiver:
+    """分区归档工具"""
+
+    def __init__(self, keep_months: int = 12, dry_run: bool = False):
+        load_dotenv()
+        self.db_config = {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'port': int(os.getenv('DB_PORT', 5432)),
+            'database': os.getenv('DB_NAME', 'sage_memory'),
+            'user': os.getenv('DB_USER', 'sage'),
+            'password': os.getenv('DB_PASSWORD')
+        }
+        self.cutoff = cutoff_month(keep_months)
+        self.dry_run = dry_run
+        self.conn = None
+
+    async def expired_partitions(self) -> list:
+        """列出早于保留期的分区名"""
+        rows = await self.conn.fetch('''
+            SELECT c.relname
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'memories'::regclass
+            ORDER BY c.relname
+        ''')
+        expired = []
+        for row in rows:
+            match = PARTITION_PATTERN.match(row['relname'])
+            if match and match.group(1) < self.cutoff:
+                expired.append(row['relname'])
+        return expired
+
+    async def archive(self, partition: str) -> None:
+        """分离单个分区并扣减 sessions 统计"""
+        archive_name = partition.replace('memories_p', 'memories_archive_p', 1)
+
+        # CONCURRENTLY 不能在事务块中执行；asyncpg 的 execute 默认自动提交
+        await self.conn.execute(f'ALTER TABLE memories DETACH PARTITION {partition} CONCURRENTLY')
+        await self.conn.execute(f'ALTER TABLE {partition} RENAME TO {archive_name}')
+
+        # 分离不会触发 memories 上的 DELETE 触发器，需手动扣减会话计数并重算首末时间
+        result = await self.conn.execute(f'''
+            UPDATE sessions s SET
+                memory_count = GREATEST(s.memory_count - d.removed, 0),
+                first_memory_at = (SELECT MIN(m.created_at) FROM memories m WHERE m.session_id = s.id),
+                last_memory_at = (SELECT MAX(m.created_at) FROM memories m WHERE m.session_id = s.id)
+            FROM (
+                SELECT session_id, COUNT(*) AS removed
+                FROM {archive_name}
+                WHERE session_id IS NOT NULL
+                GROUP BY session_id
+            ) d
+            WHERE s.id = d.session_id
+        ''')
+        logger.info(f"已归档 {partition} -> {archive_name}，更新会话统计 {result.split()[-1]} 个")
+
+        # memory_embeddings 不分区，将归档记忆的向量移入对应的归档表
+        embeddings_archive = partition.replace('memories_p', 'memory_embeddings_archive_p', 1)
+        async with self.conn.transaction():
+            await self.conn.execute(
+                f'CREATE TABLE IF NOT EXISTS {embeddings_archive} (LIKE memory_embeddings INCLUDING DEFAULTS)'
+            )
+            result = await self.conn.execute(f'''
+                WITH moved AS (
+                    DELETE FROM memory_embeddings e
+                    USING {archive_name} a
+                    WHERE e.memory_id = a.id
+                    RETURNING e.memory_id, e.time_window, e.model, e.embedding, e.created_at
+                )
+                INSERT INTO {embeddings_archive} (memory_id, time_window, model, embedding, created_at)
+                SELECT * FROM moved
+            ''')
+        logger.info(f"已移出向量 {result.split()[-1]} 条 -> {embeddings_archive}")
+
+    async def run(self):
+        """执行归档流程"""
+        self.conn = await asyncpg.connect(**self.db_config)
+        try:
+            partitioned = await self.conn.fetchval(
+                "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('memories')"
+            )
+            if not partitioned:
+                logger.error("memories 尚未分区，请先执行 migrations/partition_memories_by_month.sql")
+                return
+
+            partitions = await self.expired_partitions()
+            logger.info(f"保留 {self.cutoff} 及之后的分区，待归档 {len(partitions)} 个：{partitions}")
+            if self.dry_run:
+                return
+
+            for partition in partitions:
+                await self.archive(partition)
+        finally:
+            await self.conn.close()
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="归档早期记忆分区")
+    parser.add_argument('--keep-months', type=int, default=12, help="保留的月数（含当月）")
+    parser.add_argument('--dry-run', action='store_true', help="只列出待归档分区")
+    args = parser.parse_args()
+
+    archiver = PartitionArchiver(args.keep_months, args.dry_run)
+    await archiver.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -178,34 +178,53 @@ class AgentMetadataBackfiller:
         logger.info(f"识别出 {len(agent_reports)} 个Agent报告")
         return agent_reports
     
-    async def backfill_agent_data(self, agent_reports):
-        """回填Agent数据到新字段"""
+    async def backfill_agent_data(self, agent_reports, batch_size: int = 5000):
+        """回填Agent数据到新字段
+        
+        每批通过 COPY 写入临时表，再用一条 UPDATE ... FROM 合入，
+        避免逐行 UPDATE 的往返开销。
+        """
         logger.info(f"开始回填 {len(agent_reports)} 条Agent报告...")
         
         success_count = 0
         error_count = 0
         
-        for report in agent_reports:
+        for start in range(0, len(agent_reports), batch_size):
+            batch = agent_reports[start:start + batch_size]
             try:
-                update_query = """
-                    UPDATE memories
-                    SET is_agent_report = TRUE,
-                        agent_metadata = $2::jsonb
-                    WHERE id = $1
-                """
-                
-                await self.conn.execute(
-                    update_query,
-                    report['id'],
-                    json.dumps(report['agent_metadata'])
-                )
+                async with self.conn.transaction():
+                    await self.conn.execute("""
+                        CREATE TEMP TABLE agent_metadata_staging (
+                            id UUID PRIMARY KEY,
+                            agent_metadata JSONB
+                        ) ON COMMIT DROP
+                    """)
+                    
+                    await self.conn.copy_records_to_table(
+                        'agent_metadata_staging',
+                        records=[
+                            (report['id'], json.dumps(report['agent_metadata']))
+                            for report in batch
+                        ],
+                        columns=['id', 'agent_metadata']
+                    )
+                    
+                    result = await self.conn.execute("""
+                        UPDATE memories m
+                        SET is_agent_report = TRUE,
+                            agent_metadata = s.agent_metadata
+                        FROM agent_metadata_staging s
+                        WHERE m.id = s.id
+                    """)
                 
-                success_count += 1
-                logger.debug(f"已更新记录 {report['id']} (Agent: {report['agent_name']})")
+                updated = int(result.split()[-1])
+                success_count += updated
+                error_count += len(batch) - updated
+                logger.info(f"已回填 {start + len(batch)}/{len(agent_reports)} 条")
                 
             except Exception as e:
-                error_count += 1
-                logger.error(f"更新记录 {report['id']} 失败: {e}")
+                error_count += len(batch)
+                logger.error(f"回填批次 {start}-{start + len(batch)} 失败: {e}")
         
         logger.info(f"回填完成: 成功 {success_count}, 失败 {error_count}")
         return success_count, error_count
@@ -0,0 +1,121 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+派生列回填脚本
+为迁移前已存在的记录分批计算派生列（memory_embeddings 的 embedding_ann / embedding_bin，
+memories 的 search_vector），每批独立提交，避免单个长事务锁住整张表。
+
+用法：
+    python scripts/backfill_embedding_columns.py --column ann|bin|tsv [--batch-size 500]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import time
+
+import asyncpg
+from dotenv import load_dotenv
+
+# 设置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+# 列名 -> (表, 主键列, 派生列, 计算表达式, 待回填条件)（需与对应迁移脚本中的触发器保持一致；
+# ann 的 1024 维即 sage_core/memory/storage.py 的 ANN_DIMENSION）
+DERIVED_COLUMNS = {
+    'ann': ('memory_embeddings', 'memory_id, model', 'embedding_ann',
+            'l2_normalize(subvector(embedding, 1, 1024))::vector(1024)',
+            'vector_dims(embedding) >= 1024'),
+    'bin': ('memory_embeddings', 'memory_id, model', 'embedding_bin',
+            'binary_quantize(embedding)::bit(4096)',
+            'vector_dims(embedding) = 4096'),
+    'tsv': ('memories', 'id', 'search_vector',
+            'sage_search_vector(user_input, assistant_response)',
+            'user_input IS NOT NULL'),
+}
+
+
+class EmbeddingColumnBackfiller:
+    """派生列回填工具"""
+
+    def __init__(self, column: str, batch_size: int = 500, pause_seconds: float = 0.0):
+        load_dotenv()
+        self.db_config = {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'port': int(os.getenv('DB_PORT', 5432)),
+            'database': os.getenv('DB_NAME', 'sage_memory'),
+            'user': os.getenv('DB_USER', 'sage'),
+            'password': os.getenv('DB_PASSWORD')
+        }
+        self.table, self.key, self.column, self.expression, self.condition = DERIVED_COLUMNS[column]
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+        self.conn = None
+
+    async def backfill(self) -> int:
+        """分批回填，返回更新的总行数"""
+        query = f'''
+            UPDATE {self.table}
+            SET {self.column} = {self.expression}
+            WHERE ({self.key}) IN (
+                SELECT {self.key} FROM {self.table}
+                WHERE {self.column} IS NULL AND {self.condition}
+                LIMIT $1
+                FOR UPDATE SKIP LOCKED
+            )
+        '''
+
+        total = 0
+        start_time = time.time()
+        while True:
+            result = await self.conn.execute(query, self.batch_size)
+            updated = int(result.split()[-1])
+            if updated == 0:
+                break
+
+            total += updated
+            logger.info(f"已回填 {total} 行 {self.column}，耗时 {time.time() - start_time:.1f}秒")
+
+            if self.pause_seconds:
+                await asyncio.sleep(self.pause_seconds)
+
+        return total
+
+    async def run(self):
+        """执行回填流程"""
+        self.conn = await asyncpg.connect(**self.db_config)
+        try:
+            remaining = await self.conn.fetchval(
+                f"SELECT COUNT(*) FROM {self.table} WHERE {self.column} IS NULL AND {self.condition}"
+            )
+            logger.info(f"待回填 {self.column}: {remaining} 行")
+
+            total = await self.backfill()
+            logger.info(f"回填完成：{self.column} 共更新 {total} 行")
+
+            # 回填后刷新统计信息，让规划器尽快使用新索引
+            await self.conn.execute(f"ANALYZE {self.table}")
+        finally:
+            await self.conn.close()
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="回填派生列")
+    parser.add_argument('--column', choices=sorted(DERIVED_COLUMNS), required=True)
+    parser.add_argument('--batch-size', type=int, default=500)
+    parser.add_argument('--pause', type=float, default=0.0, help="每批之间的暂停秒数")
+    args = parser.parse_args()
+
+    backfiller = EmbeddingColumnBackfiller(args.column, args.batch_size, args.pause)
+    await backfiller.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+向量检索模式基准测试
+以精确扫描（exact）结果为基准，对比其他检索模式的 recall@k 与延迟。
+
+用法：
+    python scripts/benchmark_vector_search.py --modes ann --queries 50 --k 10
+"""
+
+import argparse
+import asyncio
+import sys
+import time
+from pathlib import Path
+from typing import Dict, List
+
+import numpy as np
+from dotenv import load_dotenv
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sage_core.config import ConfigManager
+from sage_core.database import DatabaseConnection
+from sage_core.memory.storage import MemoryStorage
+
+
+async def sample_queries(db: DatabaseConnection, model: str, count: int, noise: float) -> List[np.ndarray]:
+    """从已有记忆中抽样向量作为查询，并加入少量噪声模拟真实查询"""
+    rows = await db.fetch(
+        "SELECT embedding FROM memory_embeddings WHERE model = $2 "
+        "ORDER BY random() LIMIT $1",
+        count, model
+    )
+    rng = np.random.default_rng(42)
+    queries = []
+    for row in rows:
+        # vector 列经二进制编解码器直接解码为数组
+        vector = np.asarray(row['embedding'], dtype=np.float32)
+        if noise > 0:
+            vector = vector + rng.normal(0, noise, vector.shape).astype(np.float32)
+        queries.append(vector / np.linalg.norm(vector))
+    return queries
+
+
+async def run_mode(storage: MemoryStorage, queries: List[np.ndarray], k: int) -> Dict[str, list]:
+    """执行一种检索模式，返回每个查询的结果ID与耗时"""
+    ids, latencies = [], []
+    for query in queries:
+        start = time.perf_counter()
+        results = await storage.search(query, limit=k)
+        latencies.append((time.perf_counter() - start) * 1000)
+        ids.append([r['id'] for r in results])
+    return {'ids': ids, 'latencies': latencies}
+
+
+def summarize(name: str, run: Dict[str, list], baseline: Dict[str, list], k: int) -> str:
+    """计算 recall@k 与延迟分位数"""
+    recalls = [
+        len(set(got) & set(expected)) / max(len(expected), 1)
+        for got, expected in zip(run['ids'], baseline['ids'])
+    ]
+    latencies = np.array(run['latencies'])
+    return (f"{name:<8} recall@{k}={np.mean(recalls):.3f}  "
+            f"p50={np.percentile(latencies, 50):.1f}ms  "
+            f"p95={np.percentile(latencies, 95):.1f}ms  "
+            f"mean={latencies.mean():.1f}ms")
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="向量检索模式基准测试")
+    parser.add_argument('--modes', nargs='+', default=['ann'])
+    parser.add_argument('--queries', type=int, default=50)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--noise', type=float, default=0.01)
+    args = parser.parse_args()
+
+    load_dotenv()
+    config_manager = ConfigManager()
+    db = DatabaseConnection(config_manager.get_database_config())
+    await db.connect()
+
+    try:
+        model = config_manager.get_embedding_config().get('model', 'Qwen/Qwen3-Embedding-8B')
+        queries = await sample_queries(db, model, args.queries, args.noise)
+        if not queries:
+            print(f"memory_embeddings 表中没有模型 {model} 的向量数据")
+            return
+
+        base_config = config_manager.get_vector_search_config()
+        exact = MemoryStorage(db, search_config={**base_config, 'mode': 'exact'}, embedding_model=model)
+        baseline = await run_mode(exact, queries, args.k)
+
+        print(f"查询数: {len(queries)}  k={args.k}")
+        print(summarize('exact', baseline, baseline, args.k))
+        for mode in args.modes:
+            storage = MemoryStorage(db, search_config={**base_config, 'mode': mode}, embedding_model=model)
+            print(summarize(mode, await run_mode(storage, queries, args.k), baseline, args.k))
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
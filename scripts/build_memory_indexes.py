@@ -0,0 +1,125 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在 memories 上不阻塞写入地创建索引
+分区表不支持 CREATE INDEX CONCURRENTLY，因此按 PostgreSQL 推荐的方式分步建立：
+1. CREATE INDEX ... ON ONLY memories 建立父表索引（无效状态，不扫描数据）；
+2. 对每个分区 CREATE INDEX CONCURRENTLY 建立分区索引；
+3. ALTER INDEX ... ATTACH PARTITION 挂接；全部分区挂接后父表索引自动生效。
+之后 sage_ensure_memory_partitions() 创建的新分区会自动带上父表索引。
+memories 未分区时直接 CREATE INDEX CONCURRENTLY。
+
+默认创建 search_by_text / search_hybrid 使用的全文与 pg_trgm 索引（见 migrations/add_text_search.sql）。
+服务启动时 _initialize_schema 以阻塞方式创建同名索引；存量数据较多时，请在升级前先执行本脚本。
+
+用法：
+    python scripts/build_memory_indexes.py [--dry-run]
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+from typing import Dict
+
+import asyncpg
+from dotenv import load_dotenv
+
+# 设置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# 索引名 -> USING 子句（分区索引名为 <分区名>_<索引名去掉 idx_memories_ 前缀>）
+TEXT_SEARCH_INDEXES: Dict[str, str] = {
+    'idx_memories_search_vector': 'gin (search_vector)',
+    'idx_memories_user_input_trgm': 'gin (user_input gin_trgm_ops)',
+    'idx_memories_assistant_response_trgm': 'gin (assistant_response gin_trgm_ops)'
+}
+
+
+def partition_index_name(partition: str, index: str) -> str:
+    """分区索引名（不超过 63 字节的标识符上限）"""
+    return f"{partition}_{index.replace('idx_memories_', '', 1)}"[:63]
+
+
+class MemoryIndexBuilder:
+    """memories 索引构建工具"""
+
+    def __init__(self, indexes: Dict[str, str], dry_run: bool = False):
+        load_dotenv()
+        self.db_config = {
+            'host': os.getenv('DB_HOST', 'localhost'),
+            'port': int(os.getenv('DB_PORT', 5432)),
+            'database': os.getenv('DB_NAME', 'sage_memory'),
+            'user': os.getenv('DB_USER', 'sage'),
+            'password': os.getenv('DB_PASSWORD')
+        }
+        self.indexes = indexes
+        self.dry_run = dry_run
+        self.conn = None
+
+    async def execute(self, statement: str) -> None:
+        """执行（或在 dry-run 时只打印）一条 DDL；CONCURRENTLY 要求不在事务块中，asyncpg 默认自动提交"""
+        logger.info(statement)
+        if not self.dry_run:
+            await self.conn.execute(statement)
+
+    async def build_partitioned(self, index: str, using: str) -> None:
+        """父表 ON ONLY 建索引，逐个分区并发建索引后挂接"""
+        await self.execute(f'CREATE INDEX IF NOT EXISTS {index} ON ONLY memories USING {using}')
+
+        rows = await self.conn.fetch('''
+            SELECT c.relname,
+                   EXISTS (
+                       SELECT 1
+                       FROM pg_inherits ii
+                       JOIN pg_index x ON x.indexrelid = ii.inhrelid
+                       WHERE ii.inhparent = to_regclass($1) AND x.indrelid = c.oid
+                   ) AS attached
+            FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'memories'::regclass
+            ORDER BY c.relname
+        ''', index)
+
+        for row in rows:
+            if row['attached']:
+                continue
+            partition = row['relname']
+            child = partition_index_name(partition, index)
+            await self.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} USING {using}')
+            await self.execute(f'ALTER INDEX {index} ATTACH PARTITION {child}')
+
+    async def run(self):
+        """执行构建流程"""
+        self.conn = await asyncpg.connect(**self.db_config)
+        try:
+            await self.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+            partitioned = await self.conn.fetchval(
+                "SELECT relkind = 'p' FROM pg_class WHERE oid = to_regclass('memories')"
+            )
+            for index, using in self.indexes.items():
+                if partitioned:
+                    await self.build_partitioned(index, using)
+                else:
+                    await self.execute(f'CREATE INDEX CONCURRENTLY IF NOT EXISTS {index} ON memories USING {using}')
+            logger.info(f"已完成 {len(self.indexes)} 个索引")
+        finally:
+            await self.conn.close()
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="不阻塞写入地创建 memories 的全文与 pg_trgm 索引")
+    parser.add_argument('--dry-run', action='store_true', help="只打印将执行的语句")
+    args = parser.parse_args()
+
+    builder = MemoryIndexBuilder(TEXT_SEARCH_INDEXES, args.dry_run)
+    await builder.run()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -31,6 +31,8 @@ class CompleteRecordsImporter:
         self.imported_count = 0
         self.failed_count = 0
         self.vectorized_count = 0
+        # 每次批量写入的记录数（单个事务）
+        self.batch_size = int(os.getenv('SAGE_IMPORT_BATCH_SIZE', 500))
         
         # 数据源路径
         # 使用用户主目录，跨平台兼容
@@ -223,34 +225,39 @@ class CompleteRecordsImporter:
         
         return conversations
     
-    async def import_record(self, record: Dict[str, Any]) -> bool:
-        """导入单条记录到数据库"""
-        try:
-            from sage_core.interfaces.core_service import MemoryContent
-            
-            # 构建MemoryContent对象
-            content = MemoryContent(
-                user_input=record['user_input'],
-                assistant_response=record['assistant_response'],
-                metadata=record['metadata'],
-                session_id=record['session_id']
-            )
+    async def import_records(self, records: List[Dict[str, Any]]) -> int:
+        """批量导入记录到数据库（分批向量化 + COPY 写入）"""
+        from sage_core.interfaces.core_service import MemoryContent
+        
+        imported = 0
+        for start in range(0, len(records), self.batch_size):
+            batch = records[start:start + self.batch_size]
+            contents = [
+                MemoryContent(
+                    user_input=record['user_input'],
+                    assistant_response=record['assistant_response'],
+                    metadata=record['metadata'],
+                    session_id=record['session_id']
+                )
+                for record in batch
+            ]
             
-            # 保存到数据库并向量化
-            memory_id = await self.sage_core.save_memory(content)
+            try:
+                # 保存到数据库并向量化
+                memory_ids = await self.sage_core.save_memories(contents)
+            except Exception as e:
+                logger.error(f"批量导入失败（{len(batch)} 条）: {e}")
+                self.failed_count += len(batch)
+                continue
             
-            if memory_id and memory_id != "":
-                self.imported_count += 1
-                self.vectorized_count += 1
-                return True
-            else:
-                self.failed_count += 1
-                return False
-                
-        except Exception as e:
-            logger.error(f"导入记录失败: {e}")
-            self.failed_count += 1
-            return False
+            saved = sum(1 for memory_id in memory_ids if memory_id)
+            imported += saved
+            self.imported_count += saved
+            self.vectorized_count += saved
+            self.failed_count += len(batch) - saved
+            logger.info(f"已导入 {start + len(batch)}/{len(records)} 条记录")
+        
+        return imported
     
     async def import_hook_records(self) -> int:
         """导入Hook完整记录"""
@@ -263,15 +270,13 @@ class CompleteRecordsImporter:
         hook_files = list(self.hook_records_dir.glob('complete_*.json'))
         logger.info(f"找到 {len(hook_files)} 个Hook记录文件")
         
-        imported = 0
+        records = []
         for hook_file in hook_files:
             record = self.parse_hook_record(hook_file)
             if record:
-                success = await self.import_record(record)
-                if success:
-                    imported += 1
-                    if imported % 10 == 0:
-                        logger.info(f"已导入 {imported}/{len(hook_files)} 个Hook记录")
+                records.append(record)
+        
+        imported = await self.import_records(records)
         
         logger.info(f"✅ Hook记录导入完成: {imported}/{len(hook_files)}")
         return imported
@@ -287,16 +292,13 @@ class CompleteRecordsImporter:
         transcript_files = list(self.claude_transcripts_dir.glob('*.jsonl'))
         logger.info(f"找到 {len(transcript_files)} 个Claude transcript文件")
         
-        imported = 0
-        for transcript_file in transcript_files:
-            conversations = self.parse_claude_transcript(transcript_file)
-            for conversation in conversations:
-                success = await self.import_record(conversation)
-                if success:
-                    imported += 1
-            
-            if imported % 10 == 0:
-                logger.info(f"已处理 {transcript_files.index(transcript_file)+1}/{len(transcript_files)} 个transcript文件")
+        records = []
+        for index, transcript_file in enumerate(transcript_files, 1):
+            records.extend(self.parse_claude_transcript(transcript_file))
+            if index % 10 == 0:
+                logger.info(f"已解析 {index}/{len(transcript_files)} 个transcript文件")
+        
+        imported = await self.import_records(records)
         
         logger.info(f"✅ Claude transcript导入完成: {imported} 条记录")
         return imported
@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+在线重新向量化脚本
+为全部记忆生成指定模型（及版本）的向量，写入 memory_embeddings 的新代际。
+按记忆ID顺序分批处理、每批独立提交，可随时中断后重跑；服务继续使用 EMBEDDING_MODEL
+对应的旧代际检索，新代际完成后标记为 ready，再切换配置。
+
+用法：
+    python scripts/reembed_memories.py --model <模型> [--dimension 4096] [--version 1]
+                                       [--batch-size 32] [--pause 0.5]
+    python scripts/reembed_memories.py --retire <旧模型> [--batch-size 5000]
+"""
+
+import argparse
+import asyncio
+import logging
+import sys
+import time
+from pathlib import Path
+from typing import Optional
+
+from dotenv import load_dotenv
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+from sage_core.config import ConfigManager
+from sage_core.database import DatabaseConnection
+from sage_core.memory.vectorizer import TextVectorizer
+
+# 设置日志
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class ReembedJob:
+    """重新向量化任务"""
+
+    def __init__(self, db: DatabaseConnection, vectorizer: TextVectorizer,
+                 batch_size: int = 32, pause_seconds: float = 0.5):
+        self.db = db
+        self.vectorizer = vectorizer
+        self.model = vectorizer.model_name
+        self.version = vectorizer.version
+        self.batch_size = batch_size
+        self.pause_seconds = pause_seconds
+
+    async def register(self) -> None:
+        """登记新代际；已有代际升级版本时重新记为 building"""
+        await self.db.execute('''
+            INSERT INTO embedding_generations (model, dimension, version)
+            VALUES ($1, $2, $3)
+            ON CONFLICT (model) DO UPDATE
+            SET version = EXCLUDED.version,
+                dimension = EXCLUDED.dimension,
+                status = 'building',
+                ready_at = NULL
+            WHERE embedding_generations.version < EXCLUDED.version
+               OR embedding_generations.status = 'retired'
+        ''', self.model, self.vectorizer.get_dimension(), self.version)
+
+    async def pending(self) -> int:
+        """缺少目标代际（或版本较旧）的记忆数"""
+        return await self.db.fetchval('''
+            SELECT COUNT(*) FROM memories m
+            WHERE NOT EXISTS (
+                SELECT 1 FROM memory_embeddings e
+                WHERE e.memory_id = m.id AND e.model = $1 AND e.version >= $2
+            )
+        ''', self.model, self.version)
+
+    async def run_batch(self, after_id: Optional[str]) -> list:
+        """处理 after_id 之后的一批记忆，返回本批记忆行"""
+        rows = await self.db.fetch('''
+            SELECT m.id, m.time_window, m.user_input, m.assistant_response
+            FROM memories m
+            WHERE ($3::uuid IS NULL OR m.id > $3)
+              AND NOT EXISTS (
+                  SELECT 1 FROM memory_embeddings e
+                  WHERE e.memory_id = m.id AND e.model = $1 AND e.version >= $2
+              )
+            ORDER BY m.id
+            LIMIT $4
+        ''', self.model, self.version, after_id, self.batch_size)
+        if not rows:
+            return rows
+
+        # 与 MemoryManager 保存时的向量化文本保持一致
+        texts = [f"{row['user_input']}\n{row['assistant_response']}" for row in rows]
+        embeddings, sources = await self.vectorizer.vectorize_with_source(texts)
+
+        async with self.db.acquire() as conn:
+            await conn.executemany('''
+                INSERT INTO memory_embeddings (memory_id, time_window, model, version, source, embedding)
+                -- 跳过向量化期间已被删除的记忆
+                SELECT $1, $2, $3, $4, $6, $5::vector
+                WHERE EXISTS (SELECT 1 FROM memories WHERE id = $1 AND time_window = $2)
+                ON CONFLICT (memory_id, model) DO UPDATE
+                SET embedding = EXCLUDED.embedding,
+                    version = EXCLUDED.version,
+                    source = EXCLUDED.source,
+                    created_at = CURRENT_TIMESTAMP
+                WHERE memory_embeddings.version < EXCLUDED.version
+            ''', [
+                (row['id'], row['time_window'], self.model, self.version, embedding, source)
+                for row, embedding, source in zip(rows, embeddings, sources)
+            ])
+        return rows
+
+    async def run(self) -> int:
+        """按ID顺序扫描一遍以上，直到没有待处理记忆；返回处理的记忆数"""
+        await self.register()
+        logger.info(f"模型 {self.model} v{self.version}：待处理 {await self.pending()} 条")
+
+        total = 0
+        start_time = time.time()
+        while True:
+            # 每一轮从头扫描，覆盖上一轮期间写入到游标之前的记忆
+            processed, after_id = 0, None
+            while True:
+                rows = await self.run_batch(after_id)
+                if not rows:
+                    break
+                processed += len(rows)
+                after_id = rows[-1]['id']
+                logger.info(f"已处理 {total + processed} 条，耗时 {time.time() - start_time:.1f}秒")
+
+                if self.pause_seconds:
+                    await asyncio.sleep(self.pause_seconds)
+
+            total += processed
+            if processed == 0:
+                break
+
+        await self.db.execute('''
+            UPDATE embedding_generations
+            SET status = 'ready', ready_at = CURRENT_TIMESTAMP
+            WHERE model = $1 AND status = 'building'
+        ''', self.model)
+        logger.info(
+            f"模型 {self.model} 的代际已完成（本次处理 {total} 条），"
+            f"可将 EMBEDDING_MODEL 切换为该模型并重启服务"
+        )
+        return total
+
+
+async def retire(db: DatabaseConnection, model: str, active_model: str, batch_size: int) -> int:
+    """分批删除旧代际的向量"""
+    if model == active_model:
+        raise ValueError(f"{model} 是当前 EMBEDDING_MODEL，不能下线")
+
+    await db.execute(
+        "UPDATE embedding_generations SET status = 'retired' WHERE model = $1", model
+    )
+    total = 0
+    while True:
+        result = await db.execute('''
+            DELETE FROM memory_embeddings
+            WHERE (memory_id, model) IN (
+                SELECT memory_id, model FROM memory_embeddings
+                WHERE model = $1
+                LIMIT $2
+            )
+        ''', model, batch_size)
+        deleted = int(result.split()[-1])
+        if deleted == 0:
+            break
+        total += deleted
+        logger.info(f"已删除 {model} 的向量 {total} 条")
+    return total
+
+
+async def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="在线重新向量化 / 下线旧代际")
+    group = parser.add_mutually_exclusive_group(required=True)
+    group.add_argument('--model', help="目标模型")
+    group.add_argument('--retire', metavar='MODEL', help="删除该模型的全部向量")
+    parser.add_argument('--dimension', type=int, default=4096, help="目标模型的输出维度")
+    parser.add_argument('--version', type=int, default=1, help="向量版本，同一模型重新向量化时递增")
+    parser.add_argument('--batch-size', type=int, default=None,
+                        help="每批记忆数（默认：向量化 32，下线 5000）")
+    parser.add_argument('--pause', type=float, default=0.5, help="每批之间的暂停秒数，用于限速")
+    args = parser.parse_args()
+
+    load_dotenv()
+    config_manager = ConfigManager()
+    db = DatabaseConnection(config_manager.get_database_config())
+    await db.connect()
+
+    try:
+        if args.retire:
+            active_model = config_manager.get_embedding_config().get('model', 'Qwen/Qwen3-Embedding-8B')
+            deleted = await retire(db, args.retire, active_model, args.batch_size or 5000)
+            logger.info(f"已下线 {args.retire}，共删除 {deleted} 条向量")
+            return
+
+        vectorizer = TextVectorizer(model_name=args.model, dimension=args.dimension, version=args.version)
+        job = ReembedJob(db, vectorizer, args.batch_size or 32, args.pause)
+        await job.run()
+    finally:
+        await db.disconnect()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
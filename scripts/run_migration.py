@@ -2,15 +2,77 @@
 # -*- coding: utf-8 -*-
 """
 执行数据库迁移
+
+用法：
+    python scripts/run_migration.py                     # 执行 Agent 元数据迁移
+    python scripts/run_migration.py <migration.sql>     # 执行指定迁移脚本
 """
 
 import asyncio
 import os
+import sys
 import asyncpg
 from pathlib import Path
+from typing import List
 from dotenv import load_dotenv
 
-async def run_migration():
+
+def split_sql_statements(sql: str) -> List[str]:
+    """按分号拆分SQL语句，忽略注释、字符串和 $$ 函数体中的分号
+    
+    CREATE INDEX CONCURRENTLY 不能在事务块内执行，因此迁移脚本需要逐条执行。
+    """
+    statements = []
+    current = []
+    i = 0
+    dollar_tag = None
+    in_string = False
+    
+    while i < len(sql):
+        ch = sql[i]
+        
+        if dollar_tag:
+            if sql.startswith(dollar_tag, i):
+                current.append(dollar_tag)
+                i += len(dollar_tag)
+                dollar_tag = None
+                continue
+        elif in_string:
+            if ch == "'":
+                in_string = False
+        elif sql.startswith('--', i):
+            end = sql.find('\n', i)
+            i = len(sql) if end == -1 else end
+            continue
+        elif ch == "'":
+            in_string = True
+        elif ch == '$':
+            end = sql.find('$', i + 1)
+            tag = sql[i:end + 1] if end != -1 else ''
+            if tag and all(c.isalnum() or c == '_' for c in tag[1:-1]):
+                dollar_tag = tag
+                current.append(tag)
+                i += len(tag)
+                continue
+        elif ch == ';':
+            statement = ''.join(current).strip()
+            if statement:
+                statements.append(statement)
+            current = []
+            i += 1
+            continue
+        
+        current.append(ch)
+        i += 1
+    
+    statement = ''.join(current).strip()
+    if statement:
+        statements.append(statement)
+    
+    return statements
+
+
+async def run_migration(migration_file: Path = None):
     """执行数据库迁移"""
     load_dotenv()
     
@@ -24,19 +86,19 @@ async def run_migration():
     }
     
     # 读取迁移脚本
-    migration_file = Path(__file__).parent / 'database_migration_agent_metadata.sql'
+    if migration_file is None:
+        migration_file = Path(__file__).parent / 'database_migration_agent_metadata.sql'
     with open(migration_file, 'r', encoding='utf-8') as f:
         migration_sql = f.read()
     
     # 连接数据库并执行
     conn = await asyncpg.connect(**db_config)
     try:
-        print("开始执行数据库迁移...")
+        print(f"开始执行数据库迁移: {migration_file}")
         
         # 分割SQL语句并逐个执行
-        statements = migration_sql.split(';')
+        statements = split_sql_statements(migration_sql)
         for statement in statements:
-            statement = statement.strip()
             if statement:
                 try:
                     await conn.execute(statement)
@@ -59,4 +121,5 @@ async def run_migration():
         await conn.close()
 
 if __name__ == "__main__":
-    asyncio.run(run_migration())
\ No newline at end of file
+    target = Path(sys.argv[1]) if len(sys.argv) > 1 else None
+    asyncio.run(run_migration(target))
\ No newline at end of file
@@ -44,10 +44,11 @@ async def show_random_memories(count=3):
         for i, id_row in enumerate(selected_ids, 1):
             # 获取完整记录
             record = await conn.fetchrow('''
-                SELECT id, session_id, user_input, assistant_response, 
-                       metadata, created_at, embedding
-                FROM memories
-                WHERE id = $1
+                SELECT m.id, m.session_id, m.user_input, m.assistant_response, 
+                       m.metadata, m.created_at,
+                       (SELECT e.embedding FROM memory_embeddings e WHERE e.memory_id = m.id LIMIT 1) AS embedding
+                FROM memories m
+                WHERE m.id = $1
             ''', id_row['id'])
             
             print(f"{'='*80}")
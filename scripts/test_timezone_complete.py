@@ -41,8 +41,8 @@ async def test_complete_flow():
         # 2. 写入新数据并立即读取
         print("\n=== 2. 写入新数据测试 ===")
         result = await conn.fetchrow("""
-            INSERT INTO memories (session_id, user_input, assistant_response, embedding)
-            VALUES ('test-tz', '时区测试', '测试响应', ARRAY[0.1]::vector)
+            INSERT INTO memories (session_id, user_input, assistant_response)
+            VALUES ('test-tz', '时区测试', '测试响应')
             RETURNING id, created_at, created_at::text as text_format
         """)
         
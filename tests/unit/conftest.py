@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+单元测试共用的 fixture：带假数据库与假连接的 MemoryStorage
+"""
+import sys
+from contextlib import asynccontextmanager
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.storage import MemoryStorage
+
+
+@pytest.fixture
+def fake_conn():
+    """db.acquire() 返回的假连接，transaction() 为空上下文"""
+    conn = MagicMock()
+    conn.execute = AsyncMock()
+    conn.fetch = AsyncMock(return_value=[])
+    conn.fetchrow = AsyncMock()
+    conn.copy_records_to_table = AsyncMock()
+
+    @asynccontextmanager
+    async def transaction():
+        yield
+
+    conn.transaction = transaction
+    return conn
+
+
+@pytest.fixture
+def make_storage(fake_conn):
+    """构造存储的工厂：返回 (storage, db)，查询默认返回空结果，db.acquire() 返回 fake_conn"""
+    def factory(search_config=None, **kwargs):
+        db = AsyncMock()
+        db.fetch.return_value = []
+        db.fetch_with_settings.return_value = []
+
+        @asynccontextmanager
+        async def acquire():
+            yield fake_conn
+
+        db.acquire = acquire
+        return MemoryStorage(db, search_config=search_config, **kwargs), db
+
+    return factory
@@ -0,0 +1,102 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试向量化后端注册表与本地 ONNX 后端
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory import embedding_backends
+from sage_core.memory.embedding_backends import (
+    EmbeddingBackend, SiliconFlowBackend, create_embedding_backend, register_embedding_backend
+)
+from sage_core.memory.vectorizer import TextVectorizer
+
+
+def _write_tiny_model(path: Path, hidden: int = 8) -> None:
+    """写出一个最小的 ONNX 模型（token 嵌入查表）与 WordLevel 分词器"""
+    onnx = pytest.importorskip('onnx')
+    tokenizers = pytest.importorskip('tokenizers')
+    from onnx import TensorProto, helper, numpy_helper
+
+    vocab = {'[PAD]': 0, '[UNK]': 1, '数据库': 2, '索引': 3, '天气': 4}
+    table = np.random.default_rng(1).standard_normal((len(vocab), hidden)).astype(np.float32)
+    graph = helper.make_graph(
+        [helper.make_node('Gather', ['table', 'input_ids'], ['last_hidden_state'])],
+        'tiny',
+        [helper.make_tensor_value_info('input_ids', TensorProto.INT64, ['batch', 'seq']),
+         helper.make_tensor_value_info('attention_mask', TensorProto.INT64, ['batch', 'seq'])],
+        [helper.make_tensor_value_info('last_hidden_state', TensorProto.FLOAT, ['batch', 'seq', hidden])],
+        [numpy_helper.from_array(table, 'table')]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path / 'model.onnx'))
+
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token='[UNK]'))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(path / 'tokenizer.json'))
+
+
+def test_unknown_backend_rejected():
+    with pytest.raises(ValueError, match='未知的向量化后端'):
+        create_embedding_backend({'backend': 'nope'})
+
+
+def test_registered_backend_drives_vectorizer():
+    class ConstantBackend(EmbeddingBackend):
+        source = 'local'
+
+        @classmethod
+        def from_config(cls, config):
+            return cls('const', config['dimension'])
+
+        async def embed(self, texts):
+            return np.ones((len(texts), self.dimension), dtype=np.float32)
+
+    with patch.dict(embedding_backends._BACKENDS):
+        register_embedding_backend('const', ConstantBackend)
+        backend = create_embedding_backend({'backend': 'const', 'dimension': 4})
+    vectorizer = TextVectorizer(dimension=4, backend=backend)
+
+    embedding, source = asyncio.run(vectorizer.vectorize_with_source('文本'))
+    assert vectorizer.model_name == 'const'
+    assert source == TextVectorizer.SOURCE_LOCAL
+    assert np.allclose(embedding, 1.0)
+
+
+def test_siliconflow_backend_requires_api_key():
+    with patch.dict(os.environ, {'SILICONFLOW_API_KEY': ''}):
+        with pytest.raises(ValueError):
+            SiliconFlowBackend()
+
+
+def test_local_backend_projects_to_configured_dimension(tmp_path):
+    pytest.importorskip('onnxruntime')
+    _write_tiny_model(tmp_path)
+    backend = create_embedding_backend({
+        'backend': 'local', 'local_model_path': str(tmp_path), 'dimension': 32, 'local_pooling': 'mean'
+    })
+    assert backend.model_name == f'local/{tmp_path.name}'
+
+    async def run():
+        try:
+            return await backend.embed(['数据库 索引', '索引 数据库', '天气'])
+        finally:
+            await backend.close()
+
+    embeddings = asyncio.run(run())
+    assert embeddings.shape == (3, 32)
+    assert np.allclose(np.linalg.norm(embeddings, axis=1), 1.0)
+    # mean 池化与词序无关
+    assert np.allclose(embeddings[0], embeddings[1], atol=1e-6)
+    assert embeddings[0] @ embeddings[2] < 0.99
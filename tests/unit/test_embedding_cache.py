@@ -0,0 +1,83 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按内容寻址的持久化向量缓存
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.embedding_cache import EmbeddingCache
+from sage_core.memory.vectorizer import TextVectorizer
+
+
+def test_cache_roundtrip_across_instances(tmp_path):
+    """写入的向量可被另一个实例（另一进程）从磁盘读到"""
+    path = tmp_path / 'cache.db'
+    key = EmbeddingCache.make_key('你好', 'model', 4)
+    vector = np.array([0.1, 0.2, 0.3, 0.4], dtype=np.float32)
+
+    writer = EmbeddingCache(path=str(path))
+    writer.put_many_sync({key: vector})
+    writer.close()
+
+    reader = EmbeddingCache(path=str(path))
+    found = reader.get_many_sync([key, EmbeddingCache.make_key('你好', 'model', 8)])
+    assert list(found) == [key]
+    assert np.array_equal(found[key], vector)
+    assert reader.get_stats()['disk_hits'] == 1
+    assert reader.get_stats()['misses'] == 1
+
+    # 第二次读取命中进程内前置缓存
+    reader.get_many_sync([key])
+    assert reader.get_stats()['memory_hits'] == 1
+    reader.close()
+
+
+def test_cache_evicts_least_recently_used(tmp_path):
+    cache = EmbeddingCache(path=str(tmp_path / 'cache.db'), max_entries=2, memory_entries=0)
+    cache._EVICT_EVERY = 1
+    keys = [EmbeddingCache.make_key(str(i), 'model', 2) for i in range(3)]
+    with patch('sage_core.memory.embedding_cache.time.time', side_effect=[1, 2, 3, 4]):
+        cache.put_many_sync({keys[0]: np.zeros(2, dtype=np.float32)})
+        cache.put_many_sync({keys[1]: np.zeros(2, dtype=np.float32)})
+        cache.get_many_sync([keys[0]])
+        cache.put_many_sync({keys[2]: np.zeros(2, dtype=np.float32)})
+    assert set(cache.get_many_sync(keys)) == {keys[0], keys[2]}
+    cache.close()
+
+
+def test_vectorizer_skips_api_for_cached_pieces(tmp_path):
+    """命中缓存的文本不再请求 API，降级的哈希向量不写入缓存"""
+    requests_seen = []
+
+    async def handler(request):
+        texts = json.loads(request.content)['input']
+        requests_seen.append(texts)
+        data = [{'index': i, 'embedding': [float(len(t)), 0.0, 0.0, 1.0]} for i, t in enumerate(texts)]
+        return httpx.Response(200, json={'data': data})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch.dict(os.environ, {'SILICONFLOW_API_KEY': 'test'}):
+            vectorizer = TextVectorizer(dimension=4, cache=EmbeddingCache(path=str(tmp_path / 'cache.db')))
+        with patch('sage_core.memory.embedding_backends.get_http_client', return_value=client):
+            first = await vectorizer.vectorize(['a', 'bb', 'a'])
+            second = await vectorizer.vectorize(['bb', 'ccc'])
+        await client.aclose()
+        vectorizer.cache.close()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert requests_seen == [['a', 'bb'], ['ccc']]
+    assert np.allclose(first[:, 0], [1.0, 2.0, 1.0])
+    assert np.allclose(second[:, 0], [2.0, 3.0])
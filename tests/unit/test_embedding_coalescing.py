@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试并发向量化请求的单飞合并与微批
+"""
+import asyncio
+import json
+import os
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import httpx
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.manager import MemoryManager
+from sage_core.memory.vectorizer import TextVectorizer
+
+
+def _run_with_mock_api(coro_factory):
+    requests_seen = []
+
+    async def handler(request):
+        texts = json.loads(request.content)['input']
+        requests_seen.append(texts)
+        await asyncio.sleep(0.05)
+        data = [{'index': i, 'embedding': [float(len(t)), 0.0, 0.0, 1.0]} for i, t in enumerate(texts)]
+        return httpx.Response(200, json={'data': data})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        with patch.dict(os.environ, {'SILICONFLOW_API_KEY': 'test'}):
+            vectorizer = TextVectorizer(dimension=4, batch_window_ms=5)
+        with patch('sage_core.memory.embedding_backends.get_http_client', return_value=client):
+            result = await coro_factory(vectorizer)
+        await client.aclose()
+        return result
+
+    return asyncio.run(run()), requests_seen
+
+
+def test_identical_concurrent_texts_share_one_request():
+    async def scenario(vectorizer):
+        first = await asyncio.gather(*(vectorizer.vectorize('同一段文本') for _ in range(5)))
+        # 在途请求返回后再次请求会重新发起
+        second = await vectorizer.vectorize('同一段文本')
+        return first, second
+
+    (first, second), requests_seen = _run_with_mock_api(scenario)
+    assert requests_seen == [['同一段文本'], ['同一段文本']]
+    assert all(np.allclose(r, [5.0, 0.0, 0.0, 1.0]) for r in first + [second])
+
+
+def test_distinct_texts_within_window_are_micro_batched():
+    async def scenario(vectorizer):
+        return await asyncio.gather(*(vectorizer.vectorize('x' * (i + 1)) for i in range(4)))
+
+    results, requests_seen = _run_with_mock_api(scenario)
+    assert len(requests_seen) == 1
+    assert sorted(requests_seen[0]) == sorted('x' * (i + 1) for i in range(4))
+    assert [r[0] for r in results] == [1.0, 2.0, 3.0, 4.0]
+
+
+def test_cancelled_caller_does_not_cancel_shared_request():
+    async def scenario(vectorizer):
+        first = asyncio.ensure_future(vectorizer.vectorize('共享'))
+        second = asyncio.ensure_future(vectorizer.vectorize('共享'))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    result, requests_seen = _run_with_mock_api(scenario)
+    assert requests_seen == [['共享']]
+    assert result[0] == 2.0
+
+
+def test_manager_coalesces_identical_vectorize_calls():
+    vectorizer = MagicMock()
+    vectorizer.model_name = 'model'
+    vectorizer.version = 1
+
+    async def slow_vectorize(text):
+        await asyncio.sleep(0.05)
+        return np.ones(4, dtype=np.float32)
+
+    vectorizer.vectorize = AsyncMock(side_effect=slow_vectorize)
+    manager = MemoryManager(MagicMock(), vectorizer)
+
+    async def run():
+        return await asyncio.gather(*(manager._vectorize_with_protection('查询') for _ in range(3)))
+
+    results = asyncio.run(run())
+    assert vectorizer.vectorize.await_count == 1
+    assert len(results) == 3
+    assert manager._vectorize_inflight == {}
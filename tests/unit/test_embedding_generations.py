@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试向量代际（多模型 / 版本）与可配置维度
+"""
+import asyncio
+import os
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.manager import MemoryManager
+from sage_core.memory.storage import MemoryStorage
+from sage_core.memory.vectorizer import TextVectorizer
+
+
+def test_vectorizer_dimension_from_config():
+    """维度来自配置，降级向量与之一致"""
+    with patch.dict(os.environ, {'SILICONFLOW_API_KEY': 'test'}):
+        vectorizer = TextVectorizer(model_name='m-1024', dimension=1024, version=2)
+
+    assert vectorizer.get_dimension() == 1024
+    assert vectorizer.version == 2
+    assert vectorizer._hash_vectorize_single('文本').shape == (1024,)
+
+
+def test_save_records_model_and_version():
+    db = AsyncMock()
+    db.fetchrow.return_value = {'id': uuid.uuid4(), 'action': 'inserted'}
+    storage = MemoryStorage(db, embedding_model='m-1', embedding_version=3)
+
+    asyncio.run(storage.save('问', '答', np.ones(1024, dtype=np.float32), session_id='s1'))
+
+    query, *args = db.fetchrow.await_args.args
+    assert 'model, version, source, embedding' in query
+    assert args[11:14] == ['m-1', 3, 'api']
+
+
+def test_manager_warns_while_generation_is_building():
+    """新模型的代际尚未完成时给出提示，不影响初始化"""
+    db = MagicMock()
+    db.connect = AsyncMock()
+    db.fetchrow = AsyncMock(return_value={'model': 'm-2', 'dimension': 1024, 'version': 1,
+                                          'status': 'building'})
+    db.fetchval = AsyncMock(return_value=False)  # memories.embedding 已迁移
+    vectorizer = MagicMock()
+    vectorizer.model_name = 'm-2'
+    vectorizer.version = 1
+    vectorizer.initialize = AsyncMock()
+    vectorizer.get_dimension.return_value = 1024
+    manager = MemoryManager(db, vectorizer)
+
+    with patch('sage_core.memory.manager.logger') as logger:
+        asyncio.run(manager.initialize())
+
+    assert db.fetchrow.await_args.args[1:] == ('m-2', 1024, 1)
+    logger.warning.assert_called_once()
+    assert 'building' in logger.warning.call_args.args[0]
+    logger.error.assert_not_called()
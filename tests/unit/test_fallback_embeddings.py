@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试降级向量的跨进程稳定性、来源标记与恢复后的重新向量化
+"""
+import asyncio
+import os
+import subprocess
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock, patch
+
+import numpy as np
+
+# 添加项目路径
+ROOT = Path(__file__).parent.parent.parent
+sys.path.insert(0, str(ROOT))
+
+from sage_core.memory.manager import MemoryManager
+from sage_core.memory.storage import MemoryStorage
+from sage_core.memory.vectorizer import TextVectorizer
+
+
+def _vectorizer(dimension=64):
+    with patch.dict(os.environ, {'SILICONFLOW_API_KEY': 'test'}):
+        return TextVectorizer(dimension=dimension)
+
+
+def test_fallback_vector_stable_across_processes():
+    """不同 PYTHONHASHSEED 的进程得到相同的降级向量"""
+    script = (
+        "import os, sys; os.environ['SILICONFLOW_API_KEY'] = 'test'; sys.path.insert(0, sys.argv[1]);"
+        "from sage_core.memory.vectorizer import TextVectorizer;"
+        "print(TextVectorizer(dimension=64)._hash_vectorize_single('降级向量').round(6).tolist())"
+    )
+    outputs = {
+        subprocess.run([sys.executable, '-c', script, str(ROOT)], capture_output=True, text=True,
+                       env={**os.environ, 'PYTHONHASHSEED': seed}, check=True).stdout
+        for seed in ('1', '2')
+    }
+    assert len(outputs) == 1
+
+
+def test_fallback_vector_is_similarity_preserving_and_leaves_rng_alone():
+    vectorizer = _vectorizer(dimension=4096)
+    np.random.seed(7)
+    state = np.random.get_state()[1].copy()
+
+    a = vectorizer._hash_vectorize_single('数据库索引优化')
+    b = vectorizer._hash_vectorize_single('优化数据库索引')
+    c = vectorizer._hash_vectorize_single('weather report')
+
+    assert np.array_equal(np.random.get_state()[1], state)
+    assert np.isclose(np.linalg.norm(a), 1.0)
+    assert a @ b > 0.5 > abs(a @ c)
+    assert np.isclose(np.linalg.norm(vectorizer._hash_vectorize_single('')), 1.0)
+
+
+def test_vectorize_with_source_flags_fallback():
+    vectorizer = _vectorizer()
+    with patch.object(vectorizer, '_request_embeddings', AsyncMock(side_effect=RuntimeError('down'))):
+        embedding, source = asyncio.run(vectorizer.vectorize_with_source('文本'))
+    assert source == TextVectorizer.SOURCE_FALLBACK
+    assert np.allclose(embedding, vectorizer._hash_vectorize_single('文本'))
+
+
+def test_storage_save_writes_embedding_source():
+    db = MagicMock()
+    db.fetchrow = AsyncMock(return_value={'id': 'm1', 'action': 'inserted'})
+    db.execute = AsyncMock()
+    storage = MemoryStorage(db)
+    asyncio.run(storage.save('问', '答', np.ones(4, dtype=np.float32), session_id='s1',
+                             embedding_source='fallback'))
+    query, *args = db.fetchrow.await_args.args
+    assert 'source' in query
+    assert args[13] == 'fallback'
+
+
+def test_replace_fallback_embeddings_writes_backend_source():
+    conn = MagicMock()
+    conn.executemany = AsyncMock()
+    db = MagicMock()
+    db.acquire.return_value.__aenter__ = AsyncMock(return_value=conn)
+    db.acquire.return_value.__aexit__ = AsyncMock(return_value=False)
+    storage = MemoryStorage(db)
+    asyncio.run(storage.replace_fallback_embeddings([('m1', np.ones(4), 'local')]))
+    query, args = conn.executemany.await_args.args
+    assert "source = 'api'" not in query
+    assert args[0][-1] == 'local'
+
+
+def test_reembed_fallback_replaces_until_api_fails():
+    vectorizer = MagicMock()
+    vectorizer.model_name = 'model'
+    vectorizer.version = 1
+    vectorizer.SOURCE_FALLBACK = TextVectorizer.SOURCE_FALLBACK
+    vectorizer.vectorize_with_source = AsyncMock(side_effect=[
+        (np.ones((2, 4)), ['local', 'local']),
+        (np.ones((1, 4)), ['fallback'])
+    ])
+    manager = MemoryManager(MagicMock(), vectorizer)
+    manager.storage.fetch_fallback_embeddings = AsyncMock(side_effect=[
+        [{'memory_id': 'a', 'user_input': 'q1', 'assistant_response': 'r1'},
+         {'memory_id': 'b', 'user_input': 'q2', 'assistant_response': 'r2'}],
+        [{'memory_id': 'c', 'user_input': 'q3', 'assistant_response': 'r3'}]
+    ])
+    manager.storage.replace_fallback_embeddings = AsyncMock()
+
+    assert asyncio.run(manager.reembed_fallback(batch_size=2)) == 2
+    replaced = manager.storage.replace_fallback_embeddings.await_args_list[0].args[0]
+    assert [(memory_id, source) for memory_id, _, source in replaced] == [('a', 'local'), ('b', 'local')]
+    assert vectorizer.vectorize_with_source.await_args_list[0].args[0] == ['q1\nr1', 'q2\nr2']
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试共享异步 HTTP 客户端及向量化调用
+"""
+import asyncio
+import json
+import os
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.vectorizer import TextVectorizer
+from sage_core.utils import http
+
+
+def _vectorizer():
+    with patch.dict(os.environ, {'SILICONFLOW_API_KEY': 'test'}):
+        return TextVectorizer(dimension=4)
+
+
+def test_client_shared_within_loop_and_recreated_per_loop():
+    async def get_twice():
+        first, second = http.get_http_client(), http.get_http_client()
+        await http.close_http_client()
+        return first, second
+
+    first, second = asyncio.run(get_twice())
+    assert first is second
+    assert first.is_closed
+    assert asyncio.run(get_twice())[0] is not first
+
+
+def test_concurrent_embedding_requests_overlap():
+    """并发的向量化请求在事件循环内重叠执行，而不是串行阻塞"""
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={'data': [{'embedding': [0.1, 0.2, 0.3, 0.4]}]})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        vectorizer = _vectorizer()
+        vectorizer.batch_size = 1  # 每条文本单独请求，验证请求之间并发
+        with patch('sage_core.memory.embedding_backends.get_http_client', return_value=client):
+            start = time.perf_counter()
+            results = await asyncio.gather(*(vectorizer.vectorize(f'文本{i}') for i in range(5)))
+            elapsed = time.perf_counter() - start
+        await client.aclose()
+        return results, elapsed
+
+    results, elapsed = asyncio.run(run())
+    assert all(r.shape == (4,) for r in results)
+    assert elapsed < 0.6
+
+
+def test_vectorize_batches_texts_and_chunks_in_order():
+    """文本与分块打包进批量请求，结果按原顺序聚合"""
+    requests_seen = []
+
+    async def handler(request):
+        texts = json.loads(request.content)['input']
+        requests_seen.append(texts)
+        # 倒序返回，验证按 index 对齐
+        data = [{'index': i, 'embedding': [float(len(t)), 0.0, 0.0, 1.0]} for i, t in enumerate(texts)]
+        return httpx.Response(200, json={'data': data[::-1]})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        vectorizer = _vectorizer()
+        vectorizer.batch_size = 3
+        with patch('sage_core.memory.embedding_backends.get_http_client', return_value=client):
+            result = await vectorizer.vectorize(['a', 'x' * 10 + 'y' * 10 + 'z' * 5, 'bb'], chunk_size=10)
+        await client.aclose()
+        return result
+
+    result = asyncio.run(run())
+    # 25 字符的文本被分成 10 / 10 / 5 三块，共 5 个片段、2 个请求
+    assert [len(batch) for batch in requests_seen] == [3, 2]
+    assert result.shape == (3, 4)
+    # 分块按长度加权：(10*10 + 10*10 + 5*5) / 25 = 9，再归一化 [9, 0, 0, 1]
+    assert np.allclose(result[:, 0], [1.0, 9 / np.sqrt(82), 2.0])
+    assert np.isclose(np.linalg.norm(result[1]), 1.0)
+
+
+def test_vectorize_chunks_keeps_chunk_vectors():
+    async def handler(request):
+        texts = json.loads(request.content)['input']
+        data = [{'index': i, 'embedding': [float(len(t)), 0.0, 0.0, 1.0]} for i, t in enumerate(texts)]
+        return httpx.Response(200, json={'data': data})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        vectorizer = _vectorizer()
+        with patch('sage_core.memory.embedding_backends.get_http_client', return_value=client):
+            result = await vectorizer.vectorize_chunks('x' * 10 + 'y' * 4, chunk_size=10)
+        await client.aclose()
+        return result
+
+    pooled, chunks = asyncio.run(run())
+    assert pooled.shape == (4,)
+    assert [(text, vector[0]) for text, vector in chunks[0]] == [('x' * 10, 10.0), ('y' * 4, 4.0)]
@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试混合检索（RRF 融合）
+"""
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.interfaces import SearchOptions
+from sage_core.memory.manager import MemoryManager
+
+
+def test_hybrid_is_single_statement(make_storage):
+    """向量与文本候选在一条 SQL 中融合"""
+    storage, db = make_storage({'hybrid_candidates': 30, 'rrf_k': 60})
+    asyncio.run(storage.search_hybrid(np.ones(4096, dtype=np.float32), '索引', limit=5, session_id='s1'))
+
+    db.fetch.assert_awaited_once()
+    query, *args = db.fetch.await_args.args
+    assert 'FULL OUTER JOIN lex' in query
+    assert 'AND session_id = $7' in query
+    assert args[1:] == ['"索 引"', 30, 5, 60, '%索引%', 's1', 'Qwen/Qwen3-Embedding-8B']
+    assert 'memory_embeddings' in query and 'model = $8' in query
+
+
+def test_hybrid_ann_mode_uses_prefilter_and_ef_search(make_storage):
+    """ANN 模式下向量候选走降维索引并设置 ef_search"""
+    storage, db = make_storage({'mode': 'ann', 'ann_candidates': 100, 'hnsw_ef_search': 40})
+    asyncio.run(storage.search_hybrid(np.ones(4096, dtype=np.float32), 'q', limit=5))
+
+    settings, query, *args = db.fetch_with_settings.await_args.args
+    assert settings == {'hnsw.ef_search': 100}
+    assert 'embedding_ann <=>' in query and 'LIMIT $8' in query
+    assert args[7] == 100
+
+
+def test_default_strategy_keeps_fused_order():
+    """默认策略只调用一次混合检索，并保留融合排序"""
+    vectorizer = AsyncMock()
+    vectorizer.vectorize.return_value = np.ones(4096, dtype=np.float32)
+    manager = MemoryManager(AsyncMock(), vectorizer)
+    fused = [{'id': 'b', 'created_at': '2024-01-01'}, {'id': 'a', 'created_at': '2025-01-01'}]
+    manager.storage.search_hybrid = AsyncMock(return_value=fused)
+    manager.storage.search_by_text = AsyncMock()
+
+    results = asyncio.run(manager.search('q', SearchOptions(limit=2)))
+
+    assert [r['id'] for r in results] == ['b', 'a']
+    manager.storage.search_by_text.assert_not_awaited()
+
+
+def test_lexical_only_hit_without_embedding_row(make_storage):
+    """只由文本命中、当前模型下没有向量的记忆不带 similarity，上下文照常生成"""
+    storage, db = make_storage({})
+    db.fetch.return_value = [{
+        'id': 'm-1', 'session_id': 's1', 'created_at': '2025-01-01',
+        'user_input': '索引', 'assistant_response': '回复',
+        'user_input_length': 2, 'assistant_response_length': 2, 'metadata': {},
+        'similarity': None, 'vector_rank': None, 'text_rank': 1, 'rrf_score': 1 / 61
+    }]
+    results = asyncio.run(storage.search_hybrid(np.ones(4096, dtype=np.float32), '索引', lean=True))
+    assert 'similarity' not in results[0]
+
+    vectorizer = AsyncMock()
+    vectorizer.vectorize.return_value = np.ones(4096, dtype=np.float32)
+    manager = MemoryManager(AsyncMock(), vectorizer)
+    manager.storage.search_hybrid = AsyncMock(return_value=[
+        {'id': 'm-1', 'created_at': '2025-01-01', 'user_input': '索引', 'assistant_response': '回复',
+         'metadata': {}, 'similarity': None}
+    ])
+    context = asyncio.run(manager.get_context('索引'))
+    assert '[记忆 1]' in context and '相关度' not in context
@@ -0,0 +1,49 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 jsonb 二进制编解码器与记录映射
+"""
+import sys
+import uuid
+from datetime import datetime, timezone
+from decimal import Decimal
+from pathlib import Path
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.database.codecs import encode_jsonb, decode_jsonb
+from sage_core.memory.storage import record_to_memory
+
+
+def test_jsonb_roundtrip_keeps_unicode():
+    value = {'tool_calls': [{'tool_name': 'Read'}], 'note': '中文', 'count': 3}
+    payload = encode_jsonb(value)
+
+    assert payload[:1] == b'\x01'
+    assert '中文'.encode('utf-8') in payload
+    assert decode_jsonb(payload) == value
+
+
+def test_jsonb_accepts_preserialized_text():
+    """兼容传入 json.dumps 结果的旧调用方"""
+    assert decode_jsonb(encode_jsonb('{"a": 1}')) == {'a': 1}
+
+
+def test_record_to_memory_maps_only_present_columns():
+    memory_id = uuid.uuid4()
+    row = {
+        'id': memory_id,
+        'metadata': None,
+        'created_at': datetime(2025, 1, 1, 12, tzinfo=timezone.utc),
+        'rrf_score': Decimal('0.5'),
+        'user_input': '问',
+    }
+
+    memory = record_to_memory(row)
+
+    assert memory['id'] == str(memory_id)
+    assert memory['metadata'] == {}
+    assert memory['rrf_score'] == 0.5
+    assert memory['created_at'].startswith('2025-01-01')
+    assert set(memory) == set(row)
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试精简投影检索与按需批量获取正文
+"""
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import numpy as np
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.manager import MemoryManager
+from sage_core.memory.storage import MemoryStorage
+
+
+def _lean_row(memory_id, user_input, assistant_response, full_length):
+    return {
+        'id': memory_id, 'session_id': 's1', 'created_at': datetime.now(timezone.utc),
+        'user_input': user_input, 'assistant_response': assistant_response,
+        'user_input_length': len(user_input), 'assistant_response_length': full_length,
+        'metadata': {'tool_names': ['Read']}, 'similarity': 0.9,
+        'vector_rank': 1, 'text_rank': None, 'rrf_score': 0.016
+    }
+
+
+def test_lean_search_projects_snippets():
+    """lean 模式只取正文片段与长度"""
+    db = AsyncMock()
+    db.fetch.return_value = [_lean_row(uuid.uuid4(), '问', '答' * 10, 500)]
+    storage = MemoryStorage(db, search_config={'snippet_chars': 10})
+
+    results = asyncio.run(storage.search(np.ones(4096, dtype=np.float32), limit=5, lean=True))
+
+    query = db.fetch.await_args.args[0]
+    assert 'left(m.user_input, 10)' in query
+    assert "- 'tool_calls'" in query
+    assert results[0]['truncated'] is True
+    assert results[0]['metadata'] == {'tool_names': ['Read']}
+
+
+def test_get_many_keeps_input_order_and_validates_fields():
+    db = AsyncMock()
+    a, b = uuid.uuid4(), uuid.uuid4()
+    db.fetch.return_value = [{'id': b, 'assistant_response': 'B'}, {'id': a, 'assistant_response': 'A'}]
+    storage = MemoryStorage(db)
+
+    results = asyncio.run(storage.get_many([str(a), str(b), str(uuid.uuid4())], fields=['assistant_response']))
+
+    assert [r['assistant_response'] for r in results] == ['A', 'B']
+    assert 'id = ANY($1::uuid[])' in db.fetch.await_args.args[0]
+    with pytest.raises(ValueError):
+        asyncio.run(storage.get_many([str(a)], fields=['embedding']))
+
+
+def test_get_context_hydrates_only_truncated_tool_results():
+    """上下文只为被截断的工具结果获取完整正文"""
+    vectorizer = AsyncMock()
+    vectorizer.vectorize.return_value = np.ones(4096, dtype=np.float32)
+    manager = MemoryManager(AsyncMock(), vectorizer)
+    tool_id, chat_id = str(uuid.uuid4()), str(uuid.uuid4())
+    manager.storage.search_hybrid = AsyncMock(return_value=[
+        {'id': tool_id, 'created_at': 't', 'similarity': 0.9, 'metadata': {}, 'truncated': True,
+         'user_input': '', 'assistant_response': 'Tool execution result: 片段'},
+        {'id': chat_id, 'created_at': 't', 'similarity': 0.8, 'metadata': {}, 'truncated': True,
+         'user_input': '问题', 'assistant_response': '回答'},
+    ])
+    manager.storage.get_many = AsyncMock(return_value=[
+        {'id': tool_id, 'assistant_response': 'Tool execution result: 完整输出'}
+    ])
+
+    context = asyncio.run(manager.get_context('q'))
+
+    assert manager.storage.search_hybrid.await_args.kwargs['lean'] is True
+    manager.storage.get_many.assert_awaited_once_with([tool_id], fields=['assistant_response'])
+    assert '完整输出' in context
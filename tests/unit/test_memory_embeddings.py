@@ -0,0 +1,77 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试向量与记忆的纵向拆分（memory_embeddings）
+"""
+import asyncio
+import sys
+import uuid
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.manager import MemoryManager
+from sage_core.memory.storage import MemoryStorage
+
+
+def test_save_writes_vector_to_embeddings_table():
+    """memories 行不含向量，新记录的向量按模型写入 memory_embeddings"""
+    db = AsyncMock()
+    db.fetchrow.return_value = {'id': uuid.uuid4(), 'action': 'inserted'}
+    storage = MemoryStorage(db, embedding_model='m-1')
+
+    asyncio.run(storage.save('问', '答', np.ones(4096, dtype=np.float32), session_id='s1'))
+
+    query, *args = db.fetchrow.await_args.args
+    insert_memories = query.split('ON CONFLICT')[0]
+    assert 'embedding' not in insert_memories
+    assert "INSERT INTO memory_embeddings" in query and "WHERE action = 'inserted'" in query
+    assert args[11] == 'm-1'
+
+
+def test_exact_search_scopes_model_and_session():
+    """检索只扫描当前模型的向量，会话过滤经 memories 取ID"""
+    db = AsyncMock()
+    db.fetch.return_value = []
+    storage = MemoryStorage(db, embedding_model='m-1')
+
+    asyncio.run(storage.search(np.ones(4096, dtype=np.float32), limit=3, session_id='s1'))
+
+    query, *args = db.fetch.await_args.args
+    assert 'FROM memory_embeddings' in query
+    assert 'model = $3 AND memory_id IN (SELECT id FROM memories WHERE session_id = $4)' in query
+    assert 'm.time_window = n.time_window' in query
+    assert args[1:] == [3, 'm-1', 's1']
+
+
+def test_manager_uses_vectorizer_model():
+    vectorizer = MagicMock()
+    vectorizer.model_name = 'm-2'
+
+    manager = MemoryManager(MagicMock(), vectorizer)
+
+    assert manager.storage.embedding_model == 'm-2'
+
+
+def test_legacy_embeddings_copied_before_migration():
+    """迁移前 memories.embedding 仍存在时，启动时把未复制的存量向量复制到向量表"""
+    db = AsyncMock()
+    db.fetchval.return_value = True
+    db.execute.return_value = 'INSERT 0 5'
+    storage = MemoryStorage(db, embedding_model='m-1', embedding_version=2)
+
+    assert asyncio.run(storage.copy_legacy_embeddings(4096)) == 5
+    query, *args = db.execute.await_args.args
+    assert 'INSERT INTO memory_embeddings' in query and 'FROM memories m' in query
+    assert 'vector_dims(m.embedding) = $3' in query
+    assert args == ['m-1', 2, 4096]
+
+    # 迁移删除旧列后为空操作
+    db.reset_mock()
+    db.fetchval.return_value = False
+    assert asyncio.run(storage.copy_legacy_embeddings(4096)) == 0
+    db.execute.assert_not_awaited()
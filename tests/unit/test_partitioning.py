@@ -0,0 +1,64 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试按月分区相关的写入与最近记忆查询
+"""
+import asyncio
+import sys
+import uuid
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.manager import MemoryManager
+from sage_core.memory.storage import MemoryStorage
+
+
+def test_save_ensures_partition_once_per_month():
+    """同一月份内只检查一次分区"""
+    db = AsyncMock()
+    db.fetchrow.return_value = {'id': uuid.uuid4(), 'action': 'inserted'}
+    storage = MemoryStorage(db)
+
+    for text in ('a', 'b'):
+        asyncio.run(storage.save(text, '答', np.ones(4096, dtype=np.float32), session_id='s1'))
+
+    calls = [c.args[0] for c in db.execute.await_args_list]
+    assert calls == ['SELECT sage_ensure_memory_partitions()']
+    assert storage._partition_month == datetime.now(timezone.utc).strftime("%Y%m")
+
+
+def test_recent_memories_prunes_to_current_month():
+    """当月分区足够时不扫描历史分区"""
+    now = datetime.now(timezone.utc)
+    db = MagicMock()
+    db.fetch = AsyncMock(return_value=[
+        {'id': uuid.uuid4(), 'session_id': 's1', 'user_input': 'q', 'assistant_response': 'a',
+         'metadata': {}, 'created_at': now}
+    ])
+    manager = MemoryManager(db, vectorizer=MagicMock())
+
+    results = asyncio.run(manager._get_recent_memories(1))
+
+    assert len(results) == 1
+    query, limit, lower_bound = db.fetch.await_args.args
+    assert 'time_window >= $2' in query
+    assert lower_bound == now.strftime("%Y%m")
+    assert db.fetch.await_count == 1
+
+
+def test_recent_memories_falls_back_to_all_partitions():
+    """当月不足 limit 条时回退到全部分区"""
+    db = MagicMock()
+    db.fetch = AsyncMock(return_value=[])
+    manager = MemoryManager(db, vectorizer=MagicMock())
+
+    asyncio.run(manager._get_recent_memories(5))
+
+    assert db.fetch.await_count == 2
+    assert db.fetch.await_args.args[2] == ''
@@ -0,0 +1,104 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 SiliconFlow 调用的自适应限流
+"""
+import asyncio
+import os
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.utils import rate_limit
+from sage_core.utils.rate_limit import (
+    PRIORITY_BACKGROUND,
+    PRIORITY_INTERACTIVE,
+    AdaptiveRateLimiter,
+    current_priority,
+    get_rate_limiter,
+    parse_retry_after,
+    request_priority
+)
+
+
+def test_parse_retry_after():
+    assert parse_retry_after('3') == 3.0
+    assert parse_retry_after('-1') == 0.0
+    assert parse_retry_after(None) is None
+    assert parse_retry_after('soon') is None
+    assert parse_retry_after('Thu, 01 Jan 1970 00:00:00 GMT') == 0.0
+
+
+def test_interactive_requests_released_first():
+    """名额被占满时，排队的交互请求先于更早排队的后台请求放行"""
+    async def run():
+        limiter = AdaptiveRateLimiter('test', rate=1000, burst=1000, max_concurrency=1)
+        order = []
+
+        async def call(name, priority):
+            async with limiter.limit(priority):
+                order.append(name)
+                await asyncio.sleep(0)
+
+        await limiter.acquire()
+        tasks = [asyncio.create_task(call('background', PRIORITY_BACKGROUND))]
+        await asyncio.sleep(0)
+        with request_priority(PRIORITY_INTERACTIVE):
+            tasks.append(asyncio.create_task(call('interactive', None)))
+        await asyncio.sleep(0)
+        assert limiter.get_status()['queue_depth'] == 2
+
+        limiter.release()
+        await asyncio.gather(*tasks)
+        return order
+
+    assert asyncio.run(run()) == ['interactive', 'background']
+    assert current_priority() == rate_limit.PRIORITY_NORMAL
+
+
+def test_overload_halves_concurrency_and_honours_retry_after():
+    limiter = AdaptiveRateLimiter('test', rate=10, burst=10, max_concurrency=8)
+    limiter.record(httpx.Response(429, headers={'Retry-After': '2'}))
+    assert limiter.concurrency == 4
+    assert limiter.get_status()['blocked_for'] > 1.5
+
+    # 同一波 429 只减半一次
+    limiter.record(httpx.Response(503))
+    assert limiter.concurrency == 4
+    assert limiter.stats['throttled'] == 2
+    assert not limiter._try_take()
+
+    # 成功响应逐步恢复并发上限
+    limiter._blocked_until = 0
+    for _ in range(40):
+        limiter.record(httpx.Response(200))
+    assert limiter.concurrency == 8
+
+
+def test_timeout_counts_as_overload():
+    async def run():
+        limiter = AdaptiveRateLimiter('test', rate=10, burst=10, max_concurrency=4)
+        with pytest.raises(httpx.ReadTimeout):
+            async with limiter.limit():
+                raise httpx.ReadTimeout('timeout')
+        return limiter
+
+    limiter = asyncio.run(run())
+    assert limiter.concurrency == 2
+    assert limiter.in_flight == 0
+
+
+def test_rate_limiter_reads_env(monkeypatch):
+    monkeypatch.setattr(rate_limit, '_limiters', {})
+    with patch.dict(os.environ, {'SAGE_RATE_RERANK_RPS': '1.5', 'SAGE_RATE_RERANK_CONCURRENCY': ''}):
+        limiter = get_rate_limiter('rerank')
+    assert limiter.rate == 1.5
+    assert limiter.max_concurrency == 4
+    assert get_rate_limiter('rerank') is limiter
+    assert set(rate_limit.get_rate_limit_status()) == {'rerank'}
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试重排后端：本地交叉编码器、向量余弦后端与降级顺序
+"""
+import asyncio
+import sys
+import time
+from pathlib import Path
+from unittest.mock import patch
+
+import numpy as np
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.embedding_backends import EmbeddingBackend
+from sage_core.memory.rerank_backends import (
+    EmbeddingSimilarityBackend, LocalCrossEncoderBackend, RerankBackend, create_rerank_backends
+)
+from sage_core.memory.reranker import TextReranker
+from sage_core.memory.vectorizer import TextVectorizer
+
+
+class FailingRerankBackend(RerankBackend):
+    def __init__(self):
+        super().__init__('failing')
+        self.calls = 0
+
+    async def score(self, query, documents):
+        self.calls += 1
+        raise RuntimeError('API 不可用')
+
+
+class FailingEmbeddingBackend(EmbeddingBackend):
+    async def embed(self, texts):
+        raise RuntimeError('API 不可用')
+
+
+def _write_tiny_cross_encoder(path: Path) -> None:
+    """写出一个最小的交叉编码器：每个 token 一个权重，logit 为权重之和"""
+    onnx = pytest.importorskip('onnx')
+    tokenizers = pytest.importorskip('tokenizers')
+    from onnx import TensorProto, helper, numpy_helper
+
+    vocab = {'[PAD]': 0, '[UNK]': 1, '数据库': 2, '索引': 3, '天气': 4}
+    weights = np.array([[0.0], [0.0], [1.0], [2.0], [-3.0]], dtype=np.float32)
+    graph = helper.make_graph(
+        [helper.make_node('Gather', ['weights', 'input_ids'], ['token_logits']),
+         helper.make_node('ReduceSum', ['token_logits', 'axes'], ['logits'], keepdims=0)],
+        'tiny',
+        [helper.make_tensor_value_info('input_ids', TensorProto.INT64, ['batch', 'seq']),
+         helper.make_tensor_value_info('attention_mask', TensorProto.INT64, ['batch', 'seq'])],
+        [helper.make_tensor_value_info('logits', TensorProto.FLOAT, ['batch', 1])],
+        [numpy_helper.from_array(weights, 'weights'),
+         numpy_helper.from_array(np.array([1], dtype=np.int64), 'axes')]
+    )
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid('', 13)])
+    model.ir_version = 8
+    onnx.save(model, str(path / 'model.onnx'))
+
+    tokenizer = tokenizers.Tokenizer(tokenizers.models.WordLevel(vocab, unk_token='[UNK]'))
+    tokenizer.pre_tokenizer = tokenizers.pre_tokenizers.Whitespace()
+    tokenizer.save(str(path / 'tokenizer.json'))
+
+
+def test_local_cross_encoder_scores_in_batches(tmp_path):
+    pytest.importorskip('onnxruntime')
+    _write_tiny_cross_encoder(tmp_path)
+    backend = LocalCrossEncoderBackend(str(tmp_path), batch_size=2)
+    backend._loading.result()
+    documents = ['天气', '数据库 索引', '索引', '其他 天气 数据库']
+
+    scores = asyncio.run(backend.score('数据库', documents))
+    asyncio.run(backend.close())
+
+    expected = 1 / (1 + np.exp(-np.array([1.0 - 3.0, 1.0 + 1.0 + 2.0, 1.0 + 2.0, 1.0 - 3.0 + 1.0])))
+    assert backend.model_name == f"local/{tmp_path.name}"
+    assert np.allclose(scores, expected)
+
+
+def test_local_cross_encoder_rejects_while_loading(tmp_path):
+    pytest.importorskip('onnxruntime')
+    with patch.object(LocalCrossEncoderBackend, '_load', lambda self: time.sleep(0.5)):
+        backend = LocalCrossEncoderBackend(str(tmp_path))
+
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        asyncio.run(backend.score('q', ['a']))
+    assert time.perf_counter() - start < 0.1
+    asyncio.run(backend.close())
+
+
+def test_local_cross_encoder_latency_cap(tmp_path):
+    """超时的推理不会让下一次调用排队：线程被占满时直接失败"""
+    pytest.importorskip('onnxruntime')
+    _write_tiny_cross_encoder(tmp_path)
+    backend = LocalCrossEncoderBackend(str(tmp_path), workers=1, timeout=0.05)
+    backend._loading.result()
+    backend._score_sync = lambda query, documents: time.sleep(0.5) or [0.0] * len(documents)
+
+    with pytest.raises(TimeoutError):
+        asyncio.run(backend.score('q', ['a']))
+    start = time.perf_counter()
+    with pytest.raises(RuntimeError):
+        asyncio.run(backend.score('q', ['a']))
+    assert time.perf_counter() - start < 0.05
+
+    time.sleep(0.6)
+    del backend._score_sync
+    assert len(asyncio.run(backend.score('数据库', ['索引']))) == 1
+    asyncio.run(backend.close())
+
+
+def test_falls_back_to_embedding_similarity_for_chinese():
+    """API 不可用时用向量余弦打分：降级的 n-gram 哈希向量对中文同样有效"""
+    primary = FailingRerankBackend()
+    vectorizer = TextVectorizer(dimension=256, backend=FailingEmbeddingBackend('failing', 256))
+    reranker = TextReranker(backend=primary, fallbacks=[EmbeddingSimilarityBackend(vectorizer)])
+
+    documents = ['今天天气很好，适合出门', '为数据库查询建立合适的索引', '我喜欢吃苹果']
+    ranked = asyncio.run(reranker.rerank('数据库查询很慢，如何优化索引', documents, top_k=1))
+
+    assert ranked == ['为数据库查询建立合适的索引']
+    assert primary.calls == 1
+    assert reranker.stats['fallback_calls'] == 1
+    assert reranker.stats['api_calls'] == 0
+
+
+class HangingEmbeddingBackend(EmbeddingBackend):
+    async def embed(self, texts):
+        await asyncio.sleep(30)
+
+
+def test_embedding_similarity_bounded_by_timeout():
+    """向量化迟迟不返回时，按超时改用哈希向量打分"""
+    vectorizer = TextVectorizer(dimension=256, backend=HangingEmbeddingBackend('hanging', 256))
+    backend = EmbeddingSimilarityBackend(vectorizer, timeout=0.05)
+
+    start = time.perf_counter()
+    scores = asyncio.run(backend.score('数据库索引', ['为数据库建立索引', '今天天气很好']))
+
+    assert time.perf_counter() - start < 1
+    assert scores[0] > scores[1]
+
+
+class GatedEmbeddingBackend(EmbeddingBackend):
+    """放行前一直等待；放行后按文本返回固定向量"""
+
+    def __init__(self):
+        super().__init__('gated', 4)
+        self.ready = asyncio.Event()
+
+    async def embed(self, texts):
+        await self.ready.wait()
+        table = {'查询': [1, 0, 0, 0], '无关': [0, 1, 0, 0], '相关': [1, 0, 0, 0]}
+        return np.array([table[t] for t in texts], dtype=np.float32)
+
+
+def test_degraded_embedding_scores_not_cached():
+    """超时后的哈希向量分数不写入缓存，API 恢复后得到真实排序"""
+    async def run():
+        backend = GatedEmbeddingBackend()
+        vectorizer = TextVectorizer(dimension=4, backend=backend)
+        reranker = TextReranker(backend=EmbeddingSimilarityBackend(vectorizer, timeout=0.05))
+
+        await reranker.rerank('查询', ['无关', '相关'], return_scores=True)
+        backend.ready.set()
+        healthy = await reranker.rerank('查询', ['无关', '相关'], return_scores=True)
+        cached = await reranker.rerank('查询', ['无关', '相关'], return_scores=True)
+        return reranker, healthy, cached
+
+    reranker, healthy, cached = asyncio.run(run())
+    assert healthy == cached == [('相关', 1.0), ('无关', 0.0)]
+    assert reranker.stats['cache_hits'] == 1
+
+
+def test_fallback_backends_created_in_order():
+    vectorizer = TextVectorizer(dimension=8, backend=FailingEmbeddingBackend('failing', 8))
+    backends = create_rerank_backends(
+        {'backend': 'embedding', 'fallback': ['embedding', 'local']}, vectorizer
+    )
+    # 与主后端重复的跳过；未配置模型目录的本地后端记录警告后跳过
+    assert [type(b) for b in backends] == [EmbeddingSimilarityBackend]
+
+
+def test_simple_similarity_handles_chinese():
+    reranker = TextReranker(backend=FailingRerankBackend())
+    assert reranker._simple_similarity('数据库索引', '为数据库建立索引') > 0
+    assert reranker._simple_similarity('数据库索引', '今天天气很好') == 0.0
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试重排分数的内容寻址缓存
+"""
+import asyncio
+import json
+import sys
+from pathlib import Path
+from unittest.mock import patch
+
+import httpx
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.reranker import RerankerCache, TextReranker
+
+
+def test_keys_cover_full_document():
+    """前缀相同的文档不再共用缓存键"""
+    prefix = '相同的开头' * 20
+    assert RerankerCache.make_key('m', 'q', prefix + '甲') != RerankerCache.make_key('m', 'q', prefix + '乙')
+    assert RerankerCache.make_key('m', 'q', 'doc') == RerankerCache.make_key('m', 'q', 'doc')
+
+
+def test_ttl_and_lru_bounds():
+    cache = RerankerCache(max_size=2, ttl_minutes=1)
+    keys = [RerankerCache.make_key('m', 'q', str(i)) for i in range(3)]
+    with patch('sage_core.memory.reranker.time.time', return_value=100.0):
+        cache.set_many_sync({keys[0]: 0.1, keys[1]: 0.2})
+        cache.get_many_sync([keys[0]])
+        cache.set_many_sync({keys[2]: 0.3})
+        assert cache.get_many_sync(keys) == {keys[0]: 0.1, keys[2]: 0.3}
+    with patch('sage_core.memory.reranker.time.time', return_value=200.0):
+        assert cache.get_many_sync(keys) == {}
+
+    stats = cache.get_stats()
+    assert stats['evictions'] == 1
+    assert stats['expired'] == 2
+    assert stats['memory_hits'] == 3
+
+
+def test_disk_tier_shared_across_instances(tmp_path):
+    path = str(tmp_path / 'rerank.db')
+    key = RerankerCache.make_key('m', '查询', '文档')
+    writer = RerankerCache(path=path)
+    writer.set_many_sync({key: 0.75})
+    writer.close()
+
+    reader = RerankerCache(path=path)
+    assert reader.get_many_sync([key]) == {key: 0.75}
+    assert reader.get_stats()['disk_hits'] == 1
+    reader.close()
+
+
+def test_overlapping_candidates_only_score_new_documents():
+    requests_seen = []
+
+    async def handler(request):
+        payload = json.loads(request.content)
+        requests_seen.append(payload['documents'])
+        results = [{'index': i, 'relevance_score': len(doc) / 10} for i, doc in enumerate(payload['documents'])]
+        return httpx.Response(200, json={'results': results})
+
+    async def run():
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        reranker = TextReranker(api_key='test')
+        with patch('sage_core.memory.rerank_backends.get_http_client', return_value=client):
+            first = await reranker.rerank('q', ['a', 'bbb', 'cc'], return_scores=True)
+            second = await reranker.rerank('q', ['cc', 'dddd', 'a', 'dddd'], return_scores=True)
+            await reranker.rerank('q', ['bbb', 'a'])
+        await client.aclose()
+        return reranker, first, second
+
+    reranker, first, second = asyncio.run(run())
+    assert requests_seen == [['a', 'bbb', 'cc'], ['dddd']]
+    assert first == [('bbb', 0.3), ('cc', 0.2), ('a', 0.1)]
+    assert [doc for doc, _ in second] == ['dddd', 'dddd', 'cc', 'a']
+
+    stats = reranker.get_stats()
+    assert stats['api_calls'] == 2
+    assert stats['cache_hits'] == 1
+    assert stats['cache']['hit_rate'] == 4 / 9
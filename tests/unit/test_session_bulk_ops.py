@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试集合式的会话删除、合并与改换会话
+"""
+import asyncio
+import uuid
+from datetime import datetime, timezone
+
+
+def test_delete_session_batches_by_id_ranges(make_storage):
+    """按主键区间分批删除并累计删除数"""
+    boundary = uuid.uuid4()
+    storage, db = make_storage()
+    db.fetch.return_value = [{'id': boundary}]
+    db.execute.side_effect = ['DELETE 3', 'DELETE 2']
+
+    deleted = asyncio.run(storage.delete_session('s1', batch_size=3))
+
+    assert deleted == 5
+    assert db.fetch.await_args.args[1:] == ('s1', 3)
+    ranges = [call.args[2:] for call in db.execute.await_args_list]
+    assert ranges == [(None, boundary), (boundary, None)]
+    assert all('DELETE FROM memories' in call.args[0] for call in db.execute.await_args_list)
+
+
+def test_merge_sessions_moves_and_adjusts_stats(make_storage, fake_conn):
+    """合并在事务内改写 session_id 并调整统计"""
+    now = datetime.now(timezone.utc)
+    storage, _ = make_storage()
+    conn = fake_conn
+    conn.fetchrow.return_value = {'merged': 4, 'first_at': now, 'last_at': now, 'duplicates': 1}
+
+    result = asyncio.run(storage.merge_sessions('src', 'dst'))
+
+    assert result == {'merged': 4, 'duplicates': 1}
+    query, source, target, lower, upper = conn.fetchrow.await_args.args
+    assert 'UPDATE memories m' in query and 'DELETE FROM memories m' in query
+    assert (source, target, lower, upper) == ('src', 'dst', None, None)
+    stats_args = conn.execute.await_args.args
+    assert 'INSERT INTO sessions' in stats_args[0]
+    assert stats_args[1:4] == ('src', 'dst', 4)
+
+
+def test_merge_same_session_is_noop(make_storage, fake_conn):
+    storage, db = make_storage()
+    conn = fake_conn
+
+    assert asyncio.run(storage.merge_sessions('s1', 's1')) == {'merged': 0, 'duplicates': 0}
+    db.fetch.assert_not_awaited()
+    conn.fetchrow.assert_not_awaited()
+
+
+def test_update_session_id_moves_stats(make_storage, fake_conn):
+    """update 支持 session_id，并同步 sessions 统计"""
+    now = datetime.now(timezone.utc)
+    storage, _ = make_storage()
+    conn = fake_conn
+    conn.fetchrow.return_value = {'session_id': 'old', 'created_at': now}
+    conn.execute.return_value = 'UPDATE 1'
+
+    assert asyncio.run(storage.update(str(uuid.uuid4()), {'session_id': 'new'})) is True
+
+    update_call, stats_call = conn.execute.await_args_list
+    assert 'session_id = $1' in update_call.args[0]
+    assert stats_call.args[1:4] == ('old', 'new', 1)
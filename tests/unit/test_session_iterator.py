@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试会话记忆的键集分页遍历与流式导出
+"""
+import asyncio
+import json
+import sys
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, MagicMock
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.manager import MemoryManager
+from sage_core.memory.storage import MemoryStorage
+
+
+def _rows(count):
+    start = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    return [
+        {'id': uuid.uuid4(), 'session_id': 's1', 'user_input': f'问{i}', 'assistant_response': f'答{i}',
+         'metadata': {}, 'created_at': start + timedelta(minutes=i)}
+        for i in range(count)
+    ]
+
+
+async def _collect(iterator):
+    return [item async for item in iterator]
+
+
+def test_iter_session_memories_keyset_pages():
+    """按 (created_at, id) 游标逐页读取，最后一页不足 batch_size 时结束"""
+    rows = _rows(3)
+    db = MagicMock()
+    db.fetch = AsyncMock(side_effect=[rows[:2], rows[2:]])
+    storage = MemoryStorage(db)
+
+    memories = asyncio.run(_collect(storage.iter_session_memories('s1', batch_size=2)))
+
+    assert [m['user_input'] for m in memories] == ['问0', '问1', '问2']
+    first_call, second_call = db.fetch.await_args_list
+    assert first_call.args[1:] == ('s1', 2)
+    assert '(created_at, id) > ($3, $4)' in second_call.args[0]
+    assert second_call.args[1:] == ('s1', 2, rows[1]['created_at'], rows[1]['id'])
+
+
+def test_iter_session_memories_resumes_after_cursor():
+    """after 游标使用上一条记忆返回的 created_at / id 字符串"""
+    rows = _rows(1)
+    db = MagicMock()
+    db.fetch = AsyncMock(return_value=[])
+    storage = MemoryStorage(db)
+
+    cursor = (rows[0]['created_at'].isoformat(), str(rows[0]['id']))
+    asyncio.run(_collect(storage.iter_session_memories('s1', after=cursor)))
+
+    assert db.fetch.await_args.args[3:] == (rows[0]['created_at'], rows[0]['id'])
+
+
+def test_iter_export_session_jsonl_and_markdown():
+    rows = _rows(2)
+    db = MagicMock()
+    db.fetch = AsyncMock(return_value=rows)
+    db.fetchrow = AsyncMock(return_value={'total': 2, 'first_memory': None, 'last_memory': None})
+    manager = MemoryManager(db, vectorizer=MagicMock())
+
+    lines = asyncio.run(_collect(manager.iter_export_session('s1', 'jsonl')))
+    assert [json.loads(line)['assistant_response'] for line in lines] == ['答0', '答1']
+    assert all(line.endswith('\n') for line in lines)
+
+    markdown = asyncio.run(manager.export_session('s1', 'markdown'))
+    assert '记忆数量：2' in markdown
+    assert markdown.index('问0') < markdown.index('问1')
+
+
+def test_mcp_export_streams_chunks_to_file(tmp_path):
+    """MCP 导出工具逐块写入 iter_export_session 的输出"""
+    mcp_server = pytest.importorskip('sage_mcp_stdio_single')
+    chunks = ['{"user_input": "问0"}\n'.encode('utf-8'), '{"user_input": "问1"}\n'.encode('utf-8')]
+
+    class FakeCore:
+        async def iter_export_session(self, session_id, format):
+            assert (session_id, format) == ('s/1', 'jsonl')
+            for chunk in chunks:
+                yield chunk
+
+    result = asyncio.run(mcp_server.export_session_to_file(FakeCore(), 's/1', 'jsonl', str(tmp_path)))
+
+    path = Path(result['path'])
+    assert path.parent == tmp_path and path.name.startswith('s_1_') and path.suffix == '.jsonl'
+    assert path.read_bytes() == b''.join(chunks)
+    assert result['bytes'] == len(b''.join(chunks))
+    with pytest.raises(ValueError):
+        asyncio.run(mcp_server.export_session_to_file(FakeCore(), 's1', 'csv', str(tmp_path)))
@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试会话列表与统计读取触发器维护的 sessions 表
+"""
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.storage import MemoryStorage
+
+
+def test_list_sessions_reads_sessions_table_with_pagination():
+    """list_sessions 读取 sessions 并透传分页参数"""
+    now = datetime.now(timezone.utc)
+    db = AsyncMock()
+    db.fetch.return_value = [
+        {'session_id': 's1', 'memory_count': 3, 'created_at': now, 'last_active': now}
+    ]
+    storage = MemoryStorage(db)
+
+    sessions = asyncio.run(storage.list_sessions(limit=20, offset=40))
+
+    query, limit, offset = db.fetch.await_args.args
+    assert 'FROM sessions' in query
+    assert 'GROUP BY' not in query
+    assert (limit, offset) == (20, 40)
+    assert sessions[0]['session_id'] == 's1'
+    assert sessions[0]['memory_count'] == 3
+
+
+def test_get_statistics_reads_sessions_table():
+    """全局统计不再对 memories 做 COUNT(DISTINCT)"""
+    now = datetime.now(timezone.utc)
+    db = AsyncMock()
+    db.fetchrow.return_value = {
+        'total': 10, 'session_count': 2, 'first_memory': now, 'last_memory': now
+    }
+    storage = MemoryStorage(db)
+
+    stats = asyncio.run(storage.get_statistics())
+
+    query = db.fetchrow.await_args.args[0]
+    assert 'FROM sessions' in query
+    assert 'COUNT(DISTINCT' not in query
+    assert stats['total_memories'] == 10
+    assert stats['session_count'] == 2
+
+
+def test_get_statistics_unknown_session():
+    """sessions 中没有该会话时返回空统计"""
+    db = AsyncMock()
+    db.fetchrow.return_value = None
+    storage = MemoryStorage(db)
+
+    stats = asyncio.run(storage.get_statistics('missing'))
+
+    assert db.fetchrow.await_args.args[1] == 'missing'
+    assert stats == {'total_memories': 0, 'first_memory': None, 'last_memory': None}
+
+
+def test_session_page_params_validated():
+    """分页资源的 limit / offset 必须是整数，否则给出明确的错误"""
+    mcp_server = pytest.importorskip('sage_mcp_stdio_single')
+
+    assert mcp_server.parse_page_param({}, 'limit', 50, 1) == 50
+    assert mcp_server.parse_page_param({'offset': ['20']}, 'offset', 0, 0) == 20
+    with pytest.raises(ValueError, match='expected an integer'):
+        mcp_server.parse_page_param({'limit': ['ten']}, 'limit', 50, 1)
+    with pytest.raises(ValueError, match='must be >= 1'):
+        mcp_server.parse_page_param({'limit': ['0']}, 'limit', 50, 1)
@@ -0,0 +1,98 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 MemoryStorage.save 的单语句去重写入
+"""
+import asyncio
+import sys
+from datetime import datetime, timezone
+from pathlib import Path
+from unittest.mock import AsyncMock, patch
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.storage import MemoryStorage
+
+
+def _save(db, metadata=None):
+    storage = MemoryStorage(db)
+    return asyncio.run(storage.save("问题", "回答", np.ones(4096, dtype=np.float32),
+                                    metadata=metadata, session_id="s1"))
+
+
+def test_save_is_single_upsert_statement():
+    """去重与写入在一次往返中完成"""
+    db = AsyncMock()
+    db.fetchrow.return_value = {'id': 'new-id', 'action': 'inserted'}
+
+    assert _save(db, {'tool_calls': []}) == 'new-id'
+
+    db.fetchrow.assert_awaited_once()
+    query, *args = db.fetchrow.await_args.args
+    assert 'ON CONFLICT (session_id, content_hash, time_window)' in query
+    assert "metadata->'tool_calls' IS DISTINCT FROM" in query
+    # content_hash、time_window 与“是否提供元数据”标志作为独立参数
+    assert len(args[8]) == 64 and len(args[9]) == 10
+    assert args[10] is True
+
+
+def test_duplicate_returns_existing_id():
+    """冲突且无新信息时返回已有记录ID"""
+    db = AsyncMock()
+    db.fetchrow.return_value = {'id': 'old-id', 'action': 'duplicate'}
+
+    assert _save(db) == 'old-id'
+    assert db.fetchrow.await_args.args[11] is False
+
+
+def test_concurrent_duplicate_rereads_existing_row():
+    """并发写入导致语句未返回行时，重新读取已有记录"""
+    db = AsyncMock()
+    db.fetchrow.side_effect = [None, {'id': 'racer-id', 'action': 'duplicate'}]
+
+    assert _save(db) == 'racer-id'
+    assert db.fetchrow.await_count == 2
+
+
+class _JustAfterTheHour(datetime):
+    """固定当前时间为 11:01 UTC"""
+
+    @classmethod
+    def now(cls, tz=None):
+        return datetime(2026, 10, 16, 11, 1, tzinfo=timezone.utc)
+
+
+def test_previous_window_crosses_day_boundary():
+    assert MemoryStorage._previous_window('2026101611') == '2026101610'
+    assert MemoryStorage._previous_window('2026010100') == '2025123123'
+
+
+def test_duplicate_across_hour_boundary_checks_previous_bucket():
+    """10:59 保存、11:01 再次保存的相同内容：语句同时检查上一个小时桶，并返回其中的已有记录"""
+    db = AsyncMock()
+    db.fetchrow.return_value = {'id': 'old-id', 'action': 'duplicate'}
+
+    with patch('sage_core.memory.storage.datetime', _JustAfterTheHour):
+        assert _save(db) == 'old-id'
+
+    query, *args = db.fetchrow.await_args.args
+    assert args[9] == '2026101611'
+    assert args[14] == '2026101610'
+    assert 'p.time_window = $15' in query
+    assert 'time_window IN ($10, $15)' in query
+
+
+def test_save_many_stages_previous_bucket(make_storage, fake_conn):
+    storage, _ = make_storage()
+    fake_conn.fetch.return_value = []
+
+    with patch('sage_core.memory.storage.datetime', _JustAfterTheHour):
+        asyncio.run(storage.save_many([{'user_input': '问题', 'assistant_response': '回答',
+                                         'embedding': np.ones(4, dtype=np.float32), 'session_id': 's1'}]))
+
+    staged = fake_conn.copy_records_to_table.await_args.kwargs['records']
+    assert staged[0][-2:] == ('2026101611', '2026101610')
+    assert 'p.time_window = s.previous_window' in fake_conn.fetch.await_args.args[0]
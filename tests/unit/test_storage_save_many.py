@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 MemoryStorage.save_many 的 COPY 批量写入
+"""
+import asyncio
+import sys
+from pathlib import Path
+
+import numpy as np
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.storage import MemoryStorage
+
+
+def _map_staged(conn, existing=None):
+    """合并查询按 staged 行返回ID；existing 为已在库中的 staged 序号 -> 已有ID"""
+    existing = existing or {}
+
+    async def fetch(query, *args):
+        staged = conn.copy_records_to_table.await_args.kwargs['records']
+        return [
+            {'staged_id': row[0], 'memory_id': existing.get(i, row[0])}
+            for i, row in enumerate(staged)
+        ]
+
+    conn.fetch = fetch
+    return conn
+
+
+def _record(text, session_id='s1'):
+    return {'user_input': text, 'assistant_response': '回答',
+            'embedding': np.ones(4096, dtype=np.float32), 'session_id': session_id}
+
+
+def test_copy_stream_and_single_merge(make_storage, fake_conn):
+    """所有记录一次 COPY 写入临时表，返回与输入对齐的ID"""
+    storage, _ = make_storage()
+    conn = _map_staged(fake_conn)
+    ids = asyncio.run(storage.save_many([_record('a'), _record('b')]))
+
+    conn.copy_records_to_table.assert_awaited_once()
+    kwargs = conn.copy_records_to_table.await_args.kwargs
+    assert kwargs['columns'] == list(MemoryStorage._STAGING_COLUMNS)
+    assert len(kwargs['records']) == 2
+    assert len(set(ids)) == 2
+
+
+def test_in_batch_duplicates_are_staged_once(make_storage, fake_conn):
+    """批内重复只写入一次，并返回同一个ID"""
+    storage, _ = make_storage()
+    conn = _map_staged(fake_conn)
+    ids = asyncio.run(storage.save_many([_record('a'), _record('a'), _record('a', 's2')]))
+
+    assert len(conn.copy_records_to_table.await_args.kwargs['records']) == 2
+    assert ids[0] == ids[1] != ids[2]
+
+
+def test_existing_rows_map_to_existing_ids(make_storage, fake_conn):
+    """与库中记录冲突时返回已存在的ID"""
+    storage, _ = make_storage()
+    _map_staged(fake_conn, existing={0: 'old-id'})
+    ids = asyncio.run(storage.save_many([_record('a'), _record('b')]))
+
+    assert ids[0] == 'old-id'
+    assert ids[1] != 'old-id'
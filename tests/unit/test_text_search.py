@@ -0,0 +1,37 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 search_by_text 的全文检索查询构造
+"""
+import asyncio
+import sys
+from pathlib import Path
+from unittest.mock import AsyncMock
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.memory.storage import MemoryStorage
+
+
+def test_websearch_query_segments_cjk_into_phrases():
+    """中文按单字切分为相邻短语，英文词保持原样"""
+    assert MemoryStorage._to_websearch_query('数据库 索引') == '"数 据 库" "索 引"'
+    assert MemoryStorage._to_websearch_query('pg_trgm 索引') == '"pg_trgm" "索 引"'
+    assert MemoryStorage._to_websearch_query('say "hi"') == '"say" "hi"'
+    assert MemoryStorage._to_websearch_query('   ') == ''
+
+
+def test_search_by_text_uses_tsvector_and_trigram_predicates():
+    """使用 search_vector 与 ILIKE 并集，并按 ts_rank 排序"""
+    db = AsyncMock()
+    db.fetch.return_value = []
+    storage = MemoryStorage(db)
+
+    asyncio.run(storage.search_by_text('向量', limit=3, session_id='s1'))
+
+    query, *args = db.fetch.await_args.args
+    assert "search_vector @@ websearch_to_tsquery('simple', $1)" in query
+    assert 'ts_rank(search_vector' in query
+    assert 'AND session_id = $4' in query
+    assert args == ['"向 量"', '%向量%', 3, 's1']
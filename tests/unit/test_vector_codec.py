@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 pgvector 二进制编解码器
+"""
+import struct
+import sys
+from pathlib import Path
+
+import numpy as np
+import pytest
+
+# 添加项目路径
+sys.path.insert(0, str(Path(__file__).parent.parent.parent))
+
+from sage_core.database.codecs import encode_vector, decode_vector
+
+
+def test_roundtrip_preserves_float32_values():
+    """编码后再解码得到相同的 float32 向量"""
+    vector = np.random.default_rng(0).standard_normal(4096).astype(np.float32)
+    decoded = decode_vector(encode_vector(vector))
+
+    assert decoded.shape == (4096,)
+    np.testing.assert_array_equal(decoded, vector)
+
+
+def test_wire_format_matches_pgvector():
+    """二进制载荷为 uint16 维度 + uint16 保留位 + 大端 float32"""
+    payload = encode_vector([1.0, -2.5])
+
+    assert payload == struct.pack('>HHff', 2, 0, 1.0, -2.5)
+
+
+def test_accepts_text_literal():
+    """兼容旧的 '[...]' 文本参数"""
+    assert encode_vector('[1,2,3]') == encode_vector(np.array([1, 2, 3], dtype=np.float32))
+
+
+def test_rejects_multidimensional_input():
+    with pytest.raises(ValueError):
+        encode_vector(np.zeros((2, 2)))
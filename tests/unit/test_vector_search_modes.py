@@ -0,0 +1,51 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+测试 MemoryStorage.search 的检索模式选择
+"""
+import asyncio
+
+import numpy as np
+
+
+def test_exact_mode_uses_full_scan(make_storage):
+    """默认模式直接在完整 embedding 上排序"""
+    storage, db = make_storage({})
+    asyncio.run(storage.search(np.ones(4096, dtype=np.float32), limit=5))
+
+    db.fetch.assert_awaited_once()
+    db.fetch_with_settings.assert_not_awaited()
+    assert 'embedding_ann' not in db.fetch.await_args.args[0]
+
+
+def test_ann_mode_prefilters_on_reduced_column(make_storage):
+    """ANN 模式在降维列上召回候选并提高 ef_search"""
+    storage, db = make_storage({'mode': 'ann', 'ann_candidates': 100, 'hnsw_ef_search': 40})
+    asyncio.run(storage.search(np.ones(4096, dtype=np.float32), limit=5, session_id='s1'))
+
+    db.fetch.assert_not_awaited()
+    settings, query, *args = db.fetch_with_settings.await_args.args
+    assert settings == {'hnsw.ef_search': 100}
+    assert 'embedding_ann <=>' in query
+    assert 'subvector($1::vector, 1, 1024))::vector(1024)' in query
+    assert args[1:] == [100, 5, 'Qwen/Qwen3-Embedding-8B', 's1']
+
+
+def test_binary_mode_rescores_hamming_candidates(make_storage):
+    """binary 模式按 Hamming 距离取 N×k 个候选后精排"""
+    storage, db = make_storage({'mode': 'binary', 'binary_rescore_factor': 8})
+    asyncio.run(storage.search(np.ones(4096, dtype=np.float32), limit=5))
+
+    query, *args = db.fetch.await_args.args
+    assert 'embedding_bin <~> binary_quantize($1::vector)' in query
+    assert args[1:] == [40, 5, 'Qwen/Qwen3-Embedding-8B']
+
+
+def test_ann_ef_search_clamped_to_pgvector_limit(make_storage):
+    """候选数或 limit 超过 1000 时 ef_search 取 pgvector 上限"""
+    storage, db = make_storage({'mode': 'ann', 'ann_candidates': 2000, 'hnsw_ef_search': 40})
+    asyncio.run(storage.search(np.ones(4096, dtype=np.float32), limit=5))
+    assert db.fetch_with_settings.await_args.args[0] == {'hnsw.ef_search': 1000}
+
+    asyncio.run(storage.search_hybrid(np.ones(4096, dtype=np.float32), 'q', limit=1500))
+    assert db.fetch_with_settings.await_args.args[0] == {'hnsw.ef_search': 1000}